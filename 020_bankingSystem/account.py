@@ -3,10 +3,11 @@
 """
 
 from abc import ABC, abstractmethod
-from datetime import date
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from interfaces import Transactionable
 from transaction import Transaction
+from sliding_window import SlidingWindow
 from enums import TransactionType, AccountType, AccountStatus
 from exceptions import (
     InsufficientFundsException,
@@ -28,11 +29,26 @@ class Account(Transactionable, ABC):
         self._status = AccountStatus.ACTIVE
         self._daily_transaction_count = 0
         self._last_transaction_date = None
+        # Скользящие окна для проверки на мошенничество
+        self._hourly_window = SlidingWindow(timedelta(hours=1))
+        self._daily_window = SlidingWindow(timedelta(days=1))
+        # Банк, ведущий журнал операций счета (после открытия счета в банке)
+        self._bank = None
 
         if initial_balance > 0:
             transaction = Transaction(TransactionType.DEPOSIT, initial_balance, "Начальный баланс")
             transaction.set_balance_after(self._balance)
-            self._transaction_history.append(transaction)
+            self._record_transaction(transaction)
+
+    @classmethod
+    def get_last_number(cls):
+        """Последний выданный номер счета"""
+        return f"ACC{Account._account_counter - 1:08d}"
+
+    @classmethod
+    def advance_counter(cls, account_number):
+        """Следующие счета получат номера после account_number (после восстановления)"""
+        Account._account_counter = max(Account._account_counter, int(account_number[3:]) + 1)
 
     # Геттеры
     def get_account_number(self):
@@ -42,14 +58,28 @@ class Account(Transactionable, ABC):
         return float(self._balance)
 
     def get_transaction_history(self):
+        # История до последнего снимка банка подгружается при первом обращении
+        if self._bank is not None:
+            self._bank.load_history()
         return self._transaction_history
 
+    def get_hourly_window(self):
+        """Транзакции за последний час"""
+        return self._hourly_window
+
+    def get_daily_window(self):
+        """Транзакции за последние сутки"""
+        return self._daily_window
+
     def get_creation_date(self):
         return self._creation_date
 
     def get_status(self):
         return self._status
 
+    def set_bank(self, bank):
+        self._bank = bank
+
     # Абстрактные методы
     @abstractmethod
     def get_account_type(self):
@@ -76,6 +106,90 @@ class Account(Transactionable, ABC):
         if self._status == AccountStatus.SUSPENDED:
             raise AccountLockedException("Счет приостановлен")
 
+    def _record_transaction(self, transaction):
+        """Добавить транзакцию в историю и скользящие окна и записать в журнал банка"""
+        self._append_history(transaction)
+        if self._bank is not None:
+            self._bank.journal_transaction(self, transaction)
+
+    def _append_history(self, transaction):
+        self._transaction_history.append(transaction)
+        self._hourly_window.add(transaction.get_timestamp(), transaction.get_amount())
+        self._daily_window.add(transaction.get_timestamp(), transaction.get_amount())
+
+    # Журнал и снимки
+    def get_state(self):
+        """Изменяемое состояние счета (без истории) для журнала"""
+        return {
+            'balance': str(self._balance),
+            'status': self._status.name,
+            'daily_transaction_count': self._daily_transaction_count,
+            'last_transaction_date': self._last_transaction_date.isoformat() if self._last_transaction_date else None
+        }
+
+    def restore_state(self, state):
+        """Восстановить состояние, записанное get_state"""
+        self._balance = Decimal(state['balance'])
+        self._status = AccountStatus[state['status']]
+        self._daily_transaction_count = state['daily_transaction_count']
+        last_date = state['last_transaction_date']
+        self._last_transaction_date = date.fromisoformat(last_date) if last_date else None
+
+    def get_checkpoint(self):
+        """Точка отката: состояние счета и длина истории"""
+        return self.get_state(), len(self._transaction_history)
+
+    def rollback(self, checkpoint):
+        """Вернуть счет к точке get_checkpoint, если операция не попала в журнал"""
+        state, history_length = checkpoint
+        while len(self._transaction_history) > history_length:
+            self._transaction_history.pop()
+            self._hourly_window.remove_last()
+            self._daily_window.remove_last()
+        self.restore_state(state)
+
+    def restore_transaction(self, transaction, state):
+        """Повторить транзакцию из журнала: история, окна и состояние после нее"""
+        self._append_history(transaction)
+        self.restore_state(state)
+
+    def prepend_history(self, transactions):
+        """Добавить в начало истории транзакции до снимка, не меняя состояния и окон"""
+        self._transaction_history[:0] = transactions
+
+    def to_record(self, with_history=True):
+        """Счет для журнала; без истории - для снимка (с окнами проверки на мошенничество)"""
+        return {
+            'number': self._account_number,
+            'type': self.get_account_type().name,
+            'creation_date': self._creation_date.isoformat(),
+            'state': self.get_state(),
+            'transactions': [t.to_record() for t in self._transaction_history] if with_history else [],
+            # С историей окна восстанавливаются из ее транзакций
+            'window': [] if with_history else [[timestamp.isoformat(), str(amount)]
+                                               for timestamp, amount in self._daily_window.get_entries()]
+        }
+
+    @staticmethod
+    def from_record(record):
+        """Восстановить счет из журнала без выдачи нового номера"""
+        account_class = _ACCOUNT_CLASSES[AccountType[record['type']]]
+        account = account_class.__new__(account_class)
+        account._account_number = record['number']
+        account._creation_date = date.fromisoformat(record['creation_date'])
+        account._transaction_history = []
+        account._hourly_window = SlidingWindow(timedelta(hours=1))
+        account._daily_window = SlidingWindow(timedelta(days=1))
+        account._bank = None
+        for transaction_record in record['transactions']:
+            account._append_history(Transaction.from_record(transaction_record))
+        for timestamp, amount in record.get('window', []):
+            timestamp = datetime.fromisoformat(timestamp)
+            account._hourly_window.add(timestamp, amount)
+            account._daily_window.add(timestamp, amount)
+        account.restore_state(record['state'])
+        return account
+
     # Сброс дневного счетчика
     def _reset_daily_counter_if_needed(self):
         today = date.today()
@@ -96,7 +210,7 @@ class Account(Transactionable, ABC):
 
         transaction = Transaction(TransactionType.DEPOSIT, amount, description)
         transaction.set_balance_after(self._balance)
-        self._transaction_history.append(transaction)
+        self._record_transaction(transaction)
 
         return transaction
 
@@ -113,10 +227,11 @@ class Account(Transactionable, ABC):
 
         self._balance -= Decimal(str(amount))
         self._daily_transaction_count += 1
+        self._on_withdraw()
 
         transaction = Transaction(TransactionType.WITHDRAWAL, amount, description)
         transaction.set_balance_after(self._balance)
-        self._transaction_history.append(transaction)
+        self._record_transaction(transaction)
 
         return transaction
 
@@ -124,6 +239,10 @@ class Account(Transactionable, ABC):
         """Базовая проверка возможности снятия"""
         return self._balance >= Decimal(str(amount))
 
+    def _on_withdraw(self):
+        """Обновить состояние подкласса при снятии - до записи транзакции в журнал"""
+        pass
+
     def apply_interest(self):
         """Начисление процентов"""
         interest_rate = self.get_interest_rate()
@@ -136,7 +255,7 @@ class Account(Transactionable, ABC):
         transaction = Transaction(TransactionType.INTEREST, float(interest),
                                   f"Начисление процентов {interest_rate * 100:.2f}%")
         transaction.set_balance_after(self._balance)
-        self._transaction_history.append(transaction)
+        self._record_transaction(transaction)
 
         return float(interest)
 
@@ -149,7 +268,7 @@ class Account(Transactionable, ABC):
 
         transaction = Transaction(TransactionType.FEE, fee_amount, description)
         transaction.set_balance_after(self._balance)
-        self._transaction_history.append(transaction)
+        self._record_transaction(transaction)
 
         return True
 
@@ -162,7 +281,7 @@ class Account(Transactionable, ABC):
         print(f"Статус: {self._status.get_display_name()}")
         print(f"Дата открытия: {self._creation_date}")
         print(f"Процентная ставка: {self.get_interest_rate() * 100:.2f}%")
-        print(f"Всего транзакций: {len(self._transaction_history)}")
+        print(f"Всего транзакций: {len(self.get_transaction_history())}")
         print("---")
 
 
@@ -182,6 +301,18 @@ class SavingsAccount(Account):
     def get_account_type(self):
         return AccountType.SAVINGS
 
+    def get_state(self):
+        state = super().get_state()
+        state['withdrawal_count_this_month'] = self._withdrawal_count_this_month
+        state['last_withdrawal_month'] = list(self._last_withdrawal_month) if self._last_withdrawal_month else None
+        return state
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        self._withdrawal_count_this_month = state['withdrawal_count_this_month']
+        last_month = state['last_withdrawal_month']
+        self._last_withdrawal_month = tuple(last_month) if last_month else None
+
     def get_interest_rate(self):
         return self.INTEREST_RATE / 12  # Месячная ставка
 
@@ -210,11 +341,9 @@ class SavingsAccount(Account):
 
         return super()._can_withdraw(amount)
 
-    def withdraw(self, amount, description=""):
-        self._reset_withdrawal_counter_if_needed()
-        transaction = super().withdraw(amount, description)
+    def _on_withdraw(self):
+        # Счетчик попадает в состояние, записываемое вместе с транзакцией
         self._withdrawal_count_this_month += 1
-        return transaction
 
 
 class CheckingAccount(Account):
@@ -232,6 +361,15 @@ class CheckingAccount(Account):
     def get_account_type(self):
         return AccountType.CHECKING
 
+    def get_state(self):
+        state = super().get_state()
+        state['overdraft_protection'] = self._overdraft_protection
+        return state
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        self._overdraft_protection = state['overdraft_protection']
+
     def get_interest_rate(self):
         return self.INTEREST_RATE / 12
 
@@ -246,6 +384,8 @@ class CheckingAccount(Account):
 
     def set_overdraft_protection(self, enabled):
         self._overdraft_protection = enabled
+        if self._bank is not None:
+            self._bank.journal_account_state(self)
 
     def _can_withdraw(self, amount):
         amount_decimal = Decimal(str(amount))
@@ -289,6 +429,19 @@ class CreditAccount(Account):
     def get_account_type(self):
         return AccountType.CREDIT
 
+    def get_state(self):
+        state = super().get_state()
+        state['credit_limit'] = str(self._credit_limit)
+        state['debt'] = str(self._debt)
+        state['available_credit'] = str(self._available_credit)
+        return state
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        self._credit_limit = Decimal(state['credit_limit'])
+        self._debt = Decimal(state['debt'])
+        self._available_credit = Decimal(state['available_credit'])
+
     def get_interest_rate(self):
         return self.INTEREST_RATE / 12
 
@@ -329,7 +482,7 @@ class CreditAccount(Account):
 
         transaction = Transaction(TransactionType.LOAN_DISBURSEMENT, amount, description)
         transaction.set_balance_after(self._balance)
-        self._transaction_history.append(transaction)
+        self._record_transaction(transaction)
 
         return transaction
 
@@ -349,7 +502,7 @@ class CreditAccount(Account):
 
         transaction = Transaction(TransactionType.LOAN_PAYMENT, float(payment), description)
         transaction.set_balance_after(self._balance)
-        self._transaction_history.append(transaction)
+        self._record_transaction(transaction)
 
         return transaction
 
@@ -371,7 +524,7 @@ class CreditAccount(Account):
         transaction = Transaction(TransactionType.INTEREST, float(interest),
                                   f"Проценты на задолженность {interest_rate * 100:.2f}%")
         transaction.set_balance_after(self._balance)
-        self._transaction_history.append(transaction)
+        self._record_transaction(transaction)
 
         return float(interest)
 
@@ -382,3 +535,11 @@ class CreditAccount(Account):
         print(f"Задолженность: ${self._debt:.2f}")
         print(f"Доступный кредит: ${self._available_credit:.2f}")
         print(f"Минимальный платеж: ${self.calculate_minimum_payment():.2f}")
+
+
+# Классы счетов по типу (для восстановления из журнала)
+_ACCOUNT_CLASSES = {
+    AccountType.SAVINGS: SavingsAccount,
+    AccountType.CHECKING: CheckingAccount,
+    AccountType.CREDIT: CreditAccount
+}
@@ -2,15 +2,19 @@
 Класс банка с паттерном Singleton
 """
 
+from contextlib import contextmanager
 from datetime import date, datetime
 from decimal import Decimal
 from transaction import Transaction
+from account import Account
+from user import User
 from enums import TransactionType, TransactionStatus
 from exceptions import (
     InvalidTransactionException,
     AccountNotFoundException,
     FraudDetectedException,
-    InsufficientFundsException
+    InsufficientFundsException,
+    LedgerException
 )
 
 
@@ -24,50 +28,222 @@ class Bank:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self, bank_name="Центральный Банк"):
+    def __init__(self, bank_name="Центральный Банк", ledger=None):
         # Инициализация только один раз
         if Bank._initialized:
             return
 
         self._bank_name = bank_name
-        self._users = []
+        # Индексы: имя пользователя -> пользователь, номер счета -> счет
+        self._users = {}
+        self._accounts = {}
         self._all_transactions = []
         self._fraud_patterns = []
         self._daily_revenue = Decimal('0')
         self._foundation_date = date.today()
+        # Журнал операций (Ledger): без него состояние живет только в памяти
+        self._ledger = None
+        # История до снимка лежит в сегментах журнала и читается при первом обращении
+        self._history_loaded = True
 
         Bank._initialized = True
+        if ledger is not None:
+            self.open_ledger(ledger)
 
     def get_bank_name(self):
         return self._bank_name
 
+    def get_user_count(self):
+        return len(self._users)
+
+    # Журнал операций
+    def open_ledger(self, ledger):
+        """Восстановить состояние из снимка и журнала и записывать в него дальнейшие операции.
+
+        Читаются только снимок и журнал после него; история транзакций до
+        снимка подгружается из сегментов при первом обращении (load_history).
+        """
+        snapshot, operations = ledger.load()
+        if snapshot is not None:
+            self._restore_snapshot(snapshot)
+        for operation in operations:
+            self._apply_operation(operation)
+        self._restore_counters()
+        self._ledger = ledger
+        self._history_loaded = snapshot is None
+
+    def load_history(self):
+        """Дочитать историю транзакций до снимка из сегментов журнала (один раз)"""
+        if self._history_loaded or self._ledger is None:
+            return
+        self._history_loaded = True
+        account_history = {}
+        bank_history = []
+        for operation in self._ledger.iter_history():
+            kind = operation['op']
+            if kind == 'account_open':
+                account_history.setdefault(operation['account']['number'], []).extend(
+                    Transaction.from_record(record) for record in operation['account']['transactions'])
+            elif kind == 'transaction':
+                account_history.setdefault(operation['account'], []).append(
+                    Transaction.from_record(operation['transaction']))
+            elif kind == 'bank_transaction':
+                bank_history.append(Transaction.from_record(operation['transaction']))
+
+        # Закрытых к моменту снимка счетов в нем нет - их история не нужна
+        for account_number, transactions in account_history.items():
+            account = self._accounts.get(account_number)
+            if account is not None:
+                account.prepend_history(transactions)
+        self._all_transactions[:0] = bank_history
+
+    def close_ledger(self):
+        """Зафиксировать журнал на диске и закрыть его"""
+        if self._ledger is not None:
+            self._ledger.close()
+            self._ledger = None
+
+    def write_snapshot(self):
+        """Записать снимок всего состояния банка"""
+        if self._ledger is not None:
+            self._ledger.write_snapshot(self._snapshot_state)
+
+    def journal_user(self, user):
+        self._journal({'op': 'user', 'user': user.to_record()})
+
+    def journal_transaction(self, account, transaction):
+        self._journal({'op': 'transaction', 'account': account.get_account_number(),
+                       'transaction': transaction.to_record(), 'state': account.get_state()})
+
+    def journal_account_state(self, account):
+        self._journal({'op': 'account_state', 'account': account.get_account_number(),
+                       'state': account.get_state()})
+
+    def _journal(self, operation):
+        if self._ledger is None:
+            return
+        self._ledger.append(operation)
+        self._snapshot_if_needed()
+
+    @contextmanager
+    def _journal_group(self):
+        """Операции внутри блока попадают в журнал одной записью.
+
+        Снимок после блока вызывающий пишет сам (_snapshot_if_needed):
+        его ошибка не должна выглядеть как сбой уже записанной операции.
+        """
+        if self._ledger is None:
+            yield
+            return
+        with self._ledger.group():
+            yield
+
+    def _snapshot_if_needed(self):
+        if self._ledger is not None and self._ledger.needs_snapshot():
+            self.write_snapshot()
+
+    def _apply_operation(self, operation):
+        """Повторить операцию журнала (без записи в журнал)"""
+        kind = operation['op']
+        if kind == 'user':
+            user = self._users.get(operation['user']['username'])
+            if user:
+                user.restore(operation['user'])
+            else:
+                self._add_restored_user(User.from_record(operation['user']))
+        elif kind == 'account_open':
+            self._users[operation['username']].attach_account(Account.from_record(operation['account']))
+            # Номер закрытого позже счета не должен выдаваться повторно
+            Account.advance_counter(operation['account']['number'])
+        elif kind == 'account_close':
+            self._users[operation['username']].detach_account(operation['account'])
+        elif kind == 'transaction':
+            transaction = Transaction.from_record(operation['transaction'])
+            self._accounts[operation['account']].restore_transaction(transaction, operation['state'])
+            Transaction.advance_counter(transaction.get_transaction_id())
+        elif kind == 'account_state':
+            self._accounts[operation['account']].restore_state(operation['state'])
+        elif kind == 'bank_transaction':
+            self._all_transactions.append(Transaction.from_record(operation['transaction']))
+        elif kind == 'revenue':
+            self._daily_revenue = Decimal(operation['daily_revenue'])
+        else:
+            raise LedgerException(f"Неизвестная операция журнала: {kind}")
+
+    def _add_restored_user(self, user):
+        self._users[user.get_username()] = user
+        user.set_bank(self)
+
+    def _snapshot_state(self):
+        """Состояние без истории транзакций: история хранится в сегментах журнала"""
+        return {
+            'users': [dict(user.to_record(),
+                           accounts=[account.to_record(with_history=False) for account in user.get_accounts()])
+                      for user in self._users.values()],
+            'daily_revenue': str(self._daily_revenue),
+            'last_account_number': Account.get_last_number(),
+            'last_transaction_id': Transaction.get_last_id()
+        }
+
+    def _restore_snapshot(self, snapshot):
+        for record in snapshot['users']:
+            user = User.from_record(record)
+            self._add_restored_user(user)
+            for account_record in record['accounts']:
+                user.attach_account(Account.from_record(account_record))
+        self._daily_revenue = Decimal(snapshot['daily_revenue'])
+        Account.advance_counter(snapshot['last_account_number'])
+        Transaction.advance_counter(snapshot['last_transaction_id'])
+
+    def _restore_counters(self):
+        """Новые счета и транзакции получают номера после восстановленных"""
+        for account in self._accounts.values():
+            Account.advance_counter(account.get_account_number())
+            for transaction in account.get_transaction_history():
+                Transaction.advance_counter(transaction.get_transaction_id())
+        for transaction in self._all_transactions:
+            Transaction.advance_counter(transaction.get_transaction_id())
+
     # Управление пользователями
     def register_user(self, user):
         """Регистрация пользователя"""
         # Проверка уникальности username
-        for existing_user in self._users:
-            if existing_user.get_username() == user.get_username():
-                raise InvalidTransactionException(
-                    f"Пользователь {user.get_username()} уже зарегистрирован")
-
-        self._users.append(user)
+        if user.get_username() in self._users:
+            raise InvalidTransactionException(
+                f"Пользователь {user.get_username()} уже зарегистрирован")
+
+        with self._journal_group():
+            self._users[user.get_username()] = user
+            self.journal_user(user)
+            # Счета, открытые до регистрации, и все последующие попадают в индекс
+            for account in user.get_accounts():
+                self.index_account(account, user)
+            user.set_bank(self)
+        self._snapshot_if_needed()
         print(f"\n✓ Пользователь {user.get_username()} зарегистрирован")
         return user
 
     def find_user(self, username):
         """Поиск пользователя"""
-        for user in self._users:
-            if user.get_username() == username:
-                return user
-        return None
+        return self._users.get(username)
 
     def find_account(self, account_number):
         """Поиск счета среди всех пользователей"""
-        for user in self._users:
-            account = user.find_account(account_number)
-            if account:
-                return account
-        return None
+        return self._accounts.get(account_number)
+
+    def index_account(self, account, user):
+        """Добавить счет в индекс (вызывается пользователем при открытии счета)"""
+        self._accounts.setdefault(account.get_account_number(), account)
+        account.set_bank(self)
+        self._journal({'op': 'account_open', 'username': user.get_username(), 'account': account.to_record()})
+
+    def unindex_account(self, account, user):
+        """Убрать счет из индекса (вызывается пользователем при закрытии счета)"""
+        if self._accounts.get(account.get_account_number()) is account:
+            del self._accounts[account.get_account_number()]
+        account.set_bank(None)
+        self._journal({'op': 'account_close', 'username': user.get_username(),
+                       'account': account.get_account_number()})
 
     # Операции перевода
     def transfer(self, from_account_number, to_account_number, amount, description=""):
@@ -93,31 +269,42 @@ class Bank:
             raise FraudDetectedException(
                 "Обнаружена подозрительная активность. Транзакция заблокирована")
 
-        # Выполнение перевода
+        # Выполнение перевода: обе стороны попадают в журнал одной записью
+        from_checkpoint = from_account.get_checkpoint()
+        to_checkpoint = to_account.get_checkpoint()
+        transaction_count = len(self._all_transactions)
         try:
-            # Снятие со счета отправителя
-            from_account.withdraw(amount, f"Перевод на {to_account_number}")
-
-            # Зачисление на счет получателя
-            to_account.deposit(amount, f"Перевод от {from_account_number}")
-
-            # Создание транзакций для истории
-            transfer_out = Transaction(TransactionType.TRANSFER_OUT, amount,
-                                       f"Перевод на {to_account_number}: {description}")
-            transfer_out.set_from_account(from_account_number)
-            transfer_out.set_to_account(to_account_number)
-            self._all_transactions.append(transfer_out)
+            with self._journal_group():
+                # Снятие со счета отправителя
+                from_account.withdraw(amount, f"Перевод на {to_account_number}")
+
+                # Зачисление на счет получателя
+                to_account.deposit(amount, f"Перевод от {from_account_number}")
+
+                # Создание транзакций для истории
+                transfer_out = Transaction(TransactionType.TRANSFER_OUT, amount,
+                                           f"Перевод на {to_account_number}: {description}")
+                transfer_out.set_from_account(from_account_number)
+                transfer_out.set_to_account(to_account_number)
+                self._all_transactions.append(transfer_out)
+                self._journal({'op': 'bank_transaction', 'transaction': transfer_out.to_record()})
+
+        except Exception as e:
+            # В журнал перевод не попал - откатываем обе стороны и в памяти
+            from_account.rollback(from_checkpoint)
+            to_account.rollback(to_checkpoint)
+            del self._all_transactions[transaction_count:]
+            if isinstance(e, InsufficientFundsException):
+                print(f"\n✗ Ошибка перевода: {str(e)}")
+            raise
 
-            print(f"\n✓ Перевод выполнен успешно")
-            print(f"От: {from_account_number}")
-            print(f"На: {to_account_number}")
-            print(f"Сумма: ${amount:.2f}")
+        self._snapshot_if_needed()
+        print(f"\n✓ Перевод выполнен успешно")
+        print(f"От: {from_account_number}")
+        print(f"На: {to_account_number}")
+        print(f"Сумма: ${amount:.2f}")
 
-            return transfer_out
-
-        except InsufficientFundsException as e:
-            print(f"\n✗ Ошибка перевода: {str(e)}")
-            raise
+        return transfer_out
 
     def _detect_fraud(self, account, amount):
         """Обнаружение мошенничества"""
@@ -125,19 +312,13 @@ class Bank:
         if amount > 50000:
             return True
 
-        # Проверка 2: Много транзакций за короткий период
-        recent_transactions = [t for t in account.get_transaction_history()
-                               if (datetime.now() - t.get_timestamp()).seconds < 3600]
-
-        if len(recent_transactions) > 10:
+        # Проверка 2: Много транзакций за последний час
+        now = datetime.now()
+        if account.get_hourly_window().get_count(now) > 10:
             return True
 
-        # Проверка 3: Сумма транзакций за день превышает лимит
-        today_transactions = [t for t in account.get_transaction_history()
-                              if t.get_timestamp().date() == date.today()]
-
-        total_today = sum(t.get_amount() for t in today_transactions)
-        if total_today > 100000:
+        # Проверка 3: Сумма транзакций за сутки превышает лимит
+        if account.get_daily_window().get_total(now) > 100000:
             return True
 
         return False
@@ -188,7 +369,7 @@ class Bank:
         print(f"\n=== Начисление процентов ({self._bank_name}) ===")
         total_interest = 0
 
-        for user in self._users:
+        for user in self._users.values():
             for account in user.get_accounts():
                 try:
                     interest = account.apply_interest()
@@ -206,7 +387,7 @@ class Bank:
         print(f"\n=== Списание месячных комиссий ({self._bank_name}) ===")
         total_fees = 0
 
-        for user in self._users:
+        for user in self._users.values():
             for account in user.get_accounts():
                 try:
                     fee = account.get_monthly_fee()
@@ -219,6 +400,7 @@ class Bank:
 
         print(f"\nВсего списано комиссий: ${total_fees:.2f}")
         self._daily_revenue += Decimal(str(total_fees))
+        self._journal({'op': 'revenue', 'daily_revenue': str(self._daily_revenue)})
         return total_fees
 
     # Генерация выписки
@@ -288,15 +470,16 @@ class Bank:
     def display_statistics(self):
         """Отображение статистики банка"""
         total_users = len(self._users)
-        total_accounts = sum(len(u.get_accounts()) for u in self._users)
-        total_balance = sum(u.get_total_balance() for u in self._users)
+        total_accounts = sum(len(u.get_accounts()) for u in self._users.values())
+        total_balance = sum(u.get_total_balance() for u in self._users.values())
+        self.load_history()
         total_transactions = len(self._all_transactions)
 
         print(f"\n=== Статистика {self._bank_name} ===")
         print(f"Дата основания: {self._foundation_date}")
         print(f"\nПользователи:")
         print(f"  Всего: {total_users}")
-        print(f"  Активных: {sum(1 for u in self._users if not u.is_locked())}")
+        print(f"  Активных: {sum(1 for u in self._users.values() if not u.is_locked())}")
         print(f"\nСчета:")
         print(f"  Всего: {total_accounts}")
         print(f"  Общий баланс: ${total_balance:.2f}")
@@ -312,7 +495,7 @@ class Bank:
             return
 
         print(f"\n=== Все пользователи {self._bank_name} ===")
-        for user in self._users:
+        for user in self._users.values():
             status = "🔒" if user.is_locked() else "✓"
             print(f"{status} {user.get_username():20} | {user.get_full_name():30} | "
                   f"Счетов: {len(user.get_accounts()):>2} | Баланс: ${user.get_total_balance():>12.2f}")
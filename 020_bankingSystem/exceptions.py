@@ -36,3 +36,7 @@ class FraudDetectedException(BankingException):
 class AccountLockedException(BankingException):
     """Исключение когда счет заблокирован"""
     pass
+
+class LedgerException(BankingException):
+    """Исключение при ошибке журнала операций"""
+    pass
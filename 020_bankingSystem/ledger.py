@@ -0,0 +1,266 @@
+"""
+Журнал предзаписи (write-ahead log) банка со снимками состояния
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from exceptions import LedgerException
+
+
+class Ledger:
+    """Журнал операций банка в каталоге: journal.log, segments/ и snapshot.json.
+
+    Каждая запись журнала - строка "crc32 JSON" с номером и списком
+    операций, которые применяются только вместе (например, обе стороны
+    перевода). Запись возвращается вызывающему только после fsync:
+    это журнал предзаписи, и об успехе операции можно сообщать сразу
+    после append или group. fsync общий для пакета (групповая
+    фиксация): пока один поток сбрасывает буфер на диск, записи других
+    копятся и уходят следующим fsync, а их авторы ждут его вместе.
+
+    Снимок хранит только состояние (балансы, счетчики, окна проверки
+    на мошенничество), а не историю. Он пишется во временный файл и
+    атомарно заменяет прежний, после чего текущий журнал переносится в
+    сегмент segments/journal-<номер>.log. Сегменты - хранилище истории
+    транзакций: load читает только снимок и журнал после него, так что
+    время запуска не растет с возрастом банка, а историю по требованию
+    отдает iter_history. Оборванная последняя строка журнала
+    отбрасывается.
+    """
+
+    JOURNAL_FILE = "journal.log"
+    SNAPSHOT_FILE = "snapshot.json"
+    SEGMENTS_DIR = "segments"
+    DEFAULT_SNAPSHOT_INTERVAL = 10000
+
+    def __init__(self, directory, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        self._directory = directory
+        self._journal_path = os.path.join(directory, self.JOURNAL_FILE)
+        self._snapshot_path = os.path.join(directory, self.SNAPSHOT_FILE)
+        self._segments_dir = os.path.join(directory, self.SEGMENTS_DIR)
+        self._snapshot_interval = snapshot_interval
+        self._sequence = 0
+        # Номер снимка, с которого восстановлено состояние: до него - история
+        self._history_sequence = 0
+        # Номер последней записи, уже сброшенной на диск
+        self._durable_sequence = 0
+        self._entries_since_snapshot = 0
+        self._buffer = []
+        self._committing = False
+        self._group = None
+        self._group_depth = 0
+        self._condition = threading.Condition()
+        self._journal = None
+
+    def get_directory(self):
+        return self._directory
+
+    def get_sequence(self):
+        """Номер последней записи"""
+        return self._sequence
+
+    def load(self):
+        """Прочитать снимок и журнал после него и открыть журнал на запись.
+
+        Возвращает (снимок или None, операции после снимка - для повтора).
+        Сегменты с историей не читаются - см. iter_history.
+        """
+        os.makedirs(self._segments_dir, exist_ok=True)
+        snapshot = None
+        if os.path.exists(self._snapshot_path):
+            try:
+                with open(self._snapshot_path, encoding='utf-8') as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError) as e:
+                raise LedgerException(f"Снимок {self._snapshot_path} поврежден: {str(e)}")
+            self._sequence = snapshot['sequence']
+
+        snapshot_sequence = self._history_sequence = self._sequence
+        operations = []
+        journal_size = 0
+        journal_in_snapshot = False
+        if os.path.exists(self._journal_path):
+            with open(self._journal_path, 'rb') as file:
+                for line in file:
+                    entry = self._parse_line(line)
+                    if entry is None:
+                        # Оборванная при сбое запись: все после нее не фиксировалось
+                        break
+                    if entry['sequence'] <= snapshot_sequence:
+                        # Сбой между записью снимка и переносом журнала: весь
+                        # журнал уже в снимке, доделываем перенос в сегмент
+                        journal_in_snapshot = True
+                        break
+                    journal_size += len(line)
+                    self._sequence = entry['sequence']
+                    self._entries_since_snapshot += 1
+                    operations.extend(entry['operations'])
+            if journal_in_snapshot:
+                self._move_journal_to_segment(snapshot_sequence)
+
+        self._durable_sequence = self._sequence
+        self._journal = open(self._journal_path, 'ab')
+        # Хвост после оборванной записи отрезается, чтобы новые записи шли за целыми
+        self._journal.truncate(journal_size)
+        return snapshot, operations
+
+    def iter_history(self):
+        """Операции из сегментов до снимка, прочитанного load, по порядку - для истории транзакций.
+
+        Записи после него уже повторены из журнала при загрузке, даже если
+        с тех пор новый снимок перенес их в сегмент.
+        """
+        if not os.path.isdir(self._segments_dir):
+            return
+        for name in sorted(os.listdir(self._segments_dir)):
+            with open(os.path.join(self._segments_dir, name), 'rb') as file:
+                for line in file:
+                    entry = self._parse_line(line)
+                    if entry is None:
+                        break
+                    if entry['sequence'] > self._history_sequence:
+                        return
+                    yield from entry['operations']
+
+    @staticmethod
+    def _parse_line(line):
+        if not line.endswith(b"\n"):
+            return None
+        checksum, _, payload = line[:-1].partition(b" ")
+        try:
+            if int(checksum, 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def append(self, operation):
+        """Добавить операцию; вне group - вернуть управление после fsync ее записи"""
+        if self._group is not None:
+            self._group.append(operation)
+        else:
+            self._write_entry([operation])
+
+    @contextmanager
+    def group(self):
+        """Операции внутри блока записываются одной записью и применяются вместе.
+
+        Запись делается только при нормальном выходе из блока, и блок
+        завершается после ее fsync. Операции блока, прерванного
+        исключением, отбрасываются; изменения в памяти откатывает
+        вызывающий.
+        """
+        if self._group_depth == 0:
+            self._group = []
+        start = len(self._group)
+        self._group_depth += 1
+        try:
+            yield
+        except BaseException:
+            del self._group[start:]
+            raise
+        finally:
+            self._group_depth -= 1
+            if self._group_depth == 0:
+                operations, self._group = self._group, None
+        if self._group_depth == 0 and operations:
+            self._write_entry(operations)
+
+    def _write_entry(self, operations):
+        with self._condition:
+            self._sequence += 1
+            self._entries_since_snapshot += 1
+            payload = json.dumps({'sequence': self._sequence, 'operations': operations},
+                                 ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            self._buffer.append(b"%08x %s\n" % (zlib.crc32(payload), payload))
+            self._wait_durable(self._sequence)
+
+    def needs_snapshot(self):
+        """Пора ли записать снимок (не внутри группы операций)"""
+        return self._group is None and self._entries_since_snapshot >= self._snapshot_interval
+
+    def sync(self):
+        """Дождаться, пока все добавленные операции окажутся на диске"""
+        with self._condition:
+            self._wait_durable(self._sequence)
+
+    def _wait_durable(self, sequence):
+        """Групповая фиксация (под self._condition): ждать fsync записи с номером sequence.
+
+        Если диск свободен, поток сам сбрасывает весь накопленный буфер -
+        вместе со своей записью уходят записи других потоков. Иначе он
+        ждет текущий fsync и, если его запись туда не попала, следующий.
+        """
+        while self._durable_sequence < sequence:
+            if self._committing:
+                self._condition.wait()
+                continue
+            self._committing = True
+            lines, self._buffer = self._buffer, []
+            last_sequence = self._sequence
+            self._condition.release()
+            try:
+                self._journal.write(b"".join(lines))
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            except OSError as e:
+                self._condition.acquire()
+                self._buffer[:0] = lines
+                self._committing = False
+                self._condition.notify_all()
+                raise LedgerException(f"Ошибка записи журнала: {str(e)}")
+            self._condition.acquire()
+            self._durable_sequence = last_sequence
+            self._committing = False
+            self._condition.notify_all()
+
+    def write_snapshot(self, get_state):
+        """Записать снимок состояния банка и перенести журнал в сегмент.
+
+        get_state вызывается под блокировкой журнала, когда все записи уже
+        на диске, поэтому номер снимка точно соответствует состоянию.
+        """
+        with self._condition:
+            # Пока шел fsync, другие потоки могли добавить записи - ждем и их
+            while self._buffer or self._committing:
+                self._wait_durable(self._sequence)
+            state = dict(get_state(), sequence=self._sequence, created=time.time())
+            temporary_path = self._snapshot_path + ".tmp"
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                json.dump(state, file, ensure_ascii=False, separators=(',', ':'))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_path, self._snapshot_path)
+            self._fsync_directory(self._directory)
+            # Сбой до переноса не страшен: load доделает перенос по номеру снимка
+            self._journal.close()
+            self._move_journal_to_segment(self._sequence)
+            self._journal = open(self._journal_path, 'ab')
+            self._fsync_directory(self._directory)
+            self._entries_since_snapshot = 0
+
+    def _move_journal_to_segment(self, sequence):
+        os.replace(self._journal_path, os.path.join(self._segments_dir, f"journal-{sequence:012d}.log"))
+        self._fsync_directory(self._segments_dir)
+
+    @staticmethod
+    def _fsync_directory(directory):
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        descriptor = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def close(self):
+        """Зафиксировать буфер и закрыть журнал"""
+        if self._journal is None:
+            return
+        self.sync()
+        self._journal.close()
+        self._journal = None
@@ -3,6 +3,7 @@
 """
 
 from bank import Bank
+from ledger import Ledger
 from user import User
 from account import SavingsAccount, CheckingAccount, CreditAccount
 from exceptions import (
@@ -12,12 +13,17 @@ from exceptions import (
 )
 from utils import validate_email, validate_password_strength, parse_date
 
+# Каталог журнала операций: состояние банка переживает перезапуск
+LEDGER_DIR = "bank_ledger"
+
 
 class BankingSystemUI:
     def __init__(self):
-        self._bank = Bank("Freedom-банк")
+        self._bank = Bank("Freedom-банк", Ledger(LEDGER_DIR))
         self._current_user = None
-        self._initialize_sample_data()
+        # Примерные данные - только при первом запуске, дальше состояние берется из журнала
+        if self._bank.get_user_count() == 0:
+            self._initialize_sample_data()
 
     def _initialize_sample_data(self):
         """Инициализация примерных данных"""
@@ -354,7 +360,10 @@ class BankingSystemUI:
 
 def main():
     app = BankingSystemUI()
-    app.run()
+    try:
+        app.run()
+    finally:
+        Bank().close_ledger()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+"""
+Скользящее окно транзакций для обнаружения мошенничества
+"""
+
+from collections import deque
+from decimal import Decimal
+from datetime import datetime
+
+
+class SlidingWindow:
+    """Число и сумма транзакций за последний промежуток времени.
+
+    Транзакции добавляются в порядке времени, устаревшие снимаются с
+    начала очереди при добавлении и запросе, поэтому каждая операция
+    стоит O(1) амортизированно и не зависит от длины истории счета.
+    """
+
+    def __init__(self, duration):
+        self._duration = duration
+        self._entries = deque()
+        self._total = Decimal('0')
+
+    def get_duration(self):
+        return self._duration
+
+    def add(self, timestamp, amount):
+        """Учесть транзакцию"""
+        amount = Decimal(str(amount))
+        self._entries.append((timestamp, amount))
+        self._total += amount
+        self._expire(timestamp)
+
+    def get_entries(self):
+        """Транзакции окна (время, сумма) по порядку - для снимка состояния"""
+        return list(self._entries)
+
+    def remove_last(self):
+        """Убрать последнюю добавленную транзакцию (при откате операции)"""
+        if self._entries:
+            _, amount = self._entries.pop()
+            self._total -= amount
+
+    def get_count(self, now=None):
+        """Число транзакций в окне на момент now"""
+        self._expire(now or datetime.now())
+        return len(self._entries)
+
+    def get_total(self, now=None):
+        """Сумма транзакций в окне на момент now"""
+        self._expire(now or datetime.now())
+        return float(self._total)
+
+    def _expire(self, now):
+        start = now - self._duration
+        while self._entries and self._entries[0][0] <= start:
+            _, amount = self._entries.popleft()
+            self._total -= amount
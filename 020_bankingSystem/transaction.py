@@ -22,6 +22,16 @@ class Transaction:
         self._from_account = None
         self._to_account = None
 
+    @classmethod
+    def get_last_id(cls):
+        """Последний выданный номер транзакции"""
+        return f"TXN{Transaction._transaction_counter - 1}"
+
+    @classmethod
+    def advance_counter(cls, transaction_id):
+        """Следующие транзакции получат номера после transaction_id (после восстановления)"""
+        Transaction._transaction_counter = max(Transaction._transaction_counter, int(transaction_id[3:]) + 1)
+
     # Геттеры
     def get_transaction_id(self):
         return self._transaction_id
@@ -92,3 +102,32 @@ class Transaction:
             'description': self._description,
             'status': self._status.get_display_name()
         }
+
+    def to_record(self):
+        """Преобразование в словарь для журнала (без потерь, в отличие от to_dict)"""
+        return {
+            'id': self._transaction_id,
+            'type': self._type.name,
+            'amount': str(self._amount),
+            'timestamp': self._timestamp.isoformat(),
+            'description': self._description,
+            'status': self._status.name,
+            'balance_after': str(self._balance_after) if self._balance_after is not None else None,
+            'from_account': self._from_account,
+            'to_account': self._to_account
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        """Восстановление транзакции из журнала без выдачи нового номера"""
+        transaction = cls.__new__(cls)
+        transaction._transaction_id = record['id']
+        transaction._type = TransactionType[record['type']]
+        transaction._amount = Decimal(record['amount'])
+        transaction._timestamp = datetime.fromisoformat(record['timestamp'])
+        transaction._description = record['description']
+        transaction._status = TransactionStatus[record['status']]
+        transaction._balance_after = Decimal(record['balance_after']) if record['balance_after'] is not None else None
+        transaction._from_account = record['from_account']
+        transaction._to_account = record['to_account']
+        return transaction
@@ -21,6 +21,9 @@ class User(Authenticable):
         self._full_name = full_name
         self._email = email
         self._accounts = []
+        self._accounts_by_number = {}
+        # Банк, в котором зарегистрирован пользователь (ведет индекс счетов)
+        self._bank = None
         self._is_authenticated = False
         self._registration_date = datetime.now()
         self._last_login = None
@@ -40,6 +43,9 @@ class User(Authenticable):
     def get_accounts(self):
         return self._accounts
 
+    def set_bank(self, bank):
+        self._bank = bank
+
     def is_locked(self):
         return self._is_locked
 
@@ -66,6 +72,8 @@ class User(Authenticable):
 
             if self._failed_login_attempts >= 3:
                 self._is_locked = True
+                if self._bank is not None:
+                    self._bank.journal_user(self)
                 raise AuthenticationException("Аккаунт заблокирован после 3 неудачных попыток")
 
             raise AuthenticationException(
@@ -100,6 +108,8 @@ class User(Authenticable):
             raise InvalidPasswordException("Пароль должен содержать минимум 8 символов")
 
         self._password_hash = self._hash_password(new_password)
+        if self._bank is not None:
+            self._bank.journal_user(self)
         print("\n✓ Пароль успешно изменен")
         return True
 
@@ -110,25 +120,70 @@ class User(Authenticable):
     # Методы работы со счетами
     def add_account(self, account):
         """Добавление счета пользователю"""
-        self._accounts.append(account)
+        self.attach_account(account)
         print(f"\n✓ Счет {account.get_account_number()} добавлен")
 
     def remove_account(self, account_number):
         """Удаление счета"""
-        for i, account in enumerate(self._accounts):
-            if account.get_account_number() == account_number:
-                removed = self._accounts.pop(i)
-                print(f"\n✓ Счет {account_number} удален")
-                return removed
+        removed = self.detach_account(account_number)
+        print(f"\n✓ Счет {account_number} удален")
+        return removed
+
+    def attach_account(self, account):
+        """Добавить счет без сообщения (также при восстановлении из журнала)"""
+        self._accounts.append(account)
+        self._accounts_by_number.setdefault(account.get_account_number(), account)
+        if self._bank is not None:
+            self._bank.index_account(account, self)
+
+    def detach_account(self, account_number):
+        """Убрать счет без сообщения"""
+        removed = self._accounts_by_number.pop(account_number, None)
+        if removed is None:
+            raise AccountNotFoundException(f"Счет {account_number} не найден")
 
-        raise AccountNotFoundException(f"Счет {account_number} не найден")
+        self._accounts.remove(removed)
+        if self._bank is not None:
+            self._bank.unindex_account(removed, self)
+        return removed
 
     def find_account(self, account_number):
         """Поиск счета по номеру"""
-        for account in self._accounts:
-            if account.get_account_number() == account_number:
-                return account
-        return None
+        return self._accounts_by_number.get(account_number)
+
+    def to_record(self):
+        """Данные пользователя (без счетов) для журнала и снимка"""
+        return {
+            'username': self._username,
+            'password_hash': self._password_hash,
+            'full_name': self._full_name,
+            'email': self._email,
+            'registration_date': self._registration_date.isoformat(),
+            'failed_login_attempts': self._failed_login_attempts,
+            'is_locked': self._is_locked
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        """Восстановить пользователя из журнала (пароль хранится только хешем)"""
+        user = cls.__new__(cls)
+        user._username = record['username']
+        user._accounts = []
+        user._accounts_by_number = {}
+        user._bank = None
+        user._is_authenticated = False
+        user._last_login = None
+        user.restore(record)
+        return user
+
+    def restore(self, record):
+        """Обновить данные, записанные to_record"""
+        self._password_hash = record['password_hash']
+        self._full_name = record['full_name']
+        self._email = record['email']
+        self._registration_date = datetime.fromisoformat(record['registration_date'])
+        self._failed_login_attempts = record['failed_login_attempts']
+        self._is_locked = record['is_locked']
 
     def get_total_balance(self):
         """Общий баланс по всем счетам"""
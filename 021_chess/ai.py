@@ -3,24 +3,184 @@
 """
 
 import random
-from enums import PlayerType, PieceType
+import threading
+from bitboard import BitBoard
+from enums import PlayerType
+from move import unpack_move
+from parallel_search import ParallelSearchEngine
+from search import SearchEngine, MAX_PLY
 
 
 class ChessAI:
-    """ИИ для шахмат"""
-
-    def __init__(self, difficulty=PlayerType.AI_MEDIUM):
+    """ИИ для шахмат.
+
+    На сложном уровне ИИ умеет обдумывать ход во время хода соперника:
+    start_pondering предсказывает ответ соперника и в фоновом потоке
+    ищет ход в позиции после него. Если соперник сыграл предсказанный
+    ход, get_best_move продолжает этот поиск с обычным лимитом времени,
+    иначе ищет заново, но с таблицей транспозиций, заполненной обдумыванием.
+    """
+
+    DEFAULT_TIME_LIMIT = 5.0
+    # Лимит узлов для предсказания ответа, если его нет в таблице транспозиций
+    PREDICTION_NODES = 2000
+
+    def __init__(self, difficulty=PlayerType.AI_MEDIUM, time_limit=DEFAULT_TIME_LIMIT,
+                 max_depth=MAX_PLY, max_nodes=None, book=None, tablebase=None, workers=1,
+                 info_callback=None):
         self._difficulty = difficulty
+        # Несколько процессов ищут сообща через общую таблицу транспозиций
+        if workers > 1:
+            self._engine = ParallelSearchEngine(workers, max_depth=max_depth, time_limit=time_limit,
+                                                max_nodes=max_nodes, tablebase=tablebase,
+                                                info_callback=info_callback)
+        else:
+            self._engine = SearchEngine(max_depth=max_depth, time_limit=time_limit, max_nodes=max_nodes,
+                                        tablebase=tablebase, info_callback=info_callback)
+        # Строки info (IterationInfo) получает и поиск во время обдумывания
+        self._info_callback = info_callback
+        self._last_stats = None
+        self._book = book
+        # Фоновое обдумывание: поток, его движок, ожидаемая позиция и результат
+        self._ponder_thread = None
+        self._ponder_engine = None
+        self._ponder_root = None
+        self._ponder_key = None
+        self._ponder_move = None
+        self._ponder_result = None
+
+    def get_engine(self):
+        return self._engine
+
+    def get_book(self):
+        return self._book
+
+    def get_last_stats(self):
+        """Статистика поиска, давшего последний ход, или None (книга, простые уровни)"""
+        return self._last_stats
+
+    def close(self):
+        """Остановить обдумывание и процессы параллельного поиска"""
+        self.stop_pondering()
+        if isinstance(self._engine, ParallelSearchEngine):
+            self._engine.close()
+
+    def get_ponder_move(self):
+        """Предсказанный ход соперника, если идет обдумывание"""
+        return self._ponder_move if self.is_pondering() else None
+
+    def is_pondering(self):
+        return self._ponder_thread is not None
+
+    def start_pondering(self, game, color):
+        """Начать обдумывание хода цвета color, пока ходит соперник.
+
+        Повторный вызов в той же позиции ничего не делает. Доступно
+        только сложному уровню: остальные не используют поиск.
+        """
+        if self._difficulty != PlayerType.AI_HARD:
+            return
+        board = game.get_board()
+        if self._ponder_thread is not None:
+            if self._ponder_root == board.get_hash():
+                return
+            self.stop_pondering()
+
+        opponent = color.opposite()
+        if board.side_to_move != opponent:
+            return
+        history = list(game.get_position_history())
+        ponder_move = self._predict_reply(board, opponent, history)
+        if ponder_move is None:
+            return
+
+        # Поток работает со своей копией: доска партии меняется ходом соперника
+        ponder_board = BitBoard.from_board(board)
+        ponder_board.make_move(*ponder_move)
+        self._ponder_engine = SearchEngine(max_depth=self._engine.get_max_depth(), time_limit=None,
+                                           table=self._engine.get_table(),
+                                           tablebase=self._engine.get_tablebase(),
+                                           info_callback=self._info_callback)
+        self._ponder_root = board.get_hash()
+        self._ponder_key = ponder_board.get_hash()
+        self._ponder_move = ponder_move
+        self._ponder_result = None
+        self._ponder_thread = threading.Thread(target=self._ponder,
+                                               args=(ponder_board, color, history),
+                                               daemon=True)
+        self._ponder_thread.start()
+
+    def stop_pondering(self):
+        """Прервать обдумывание и дождаться фонового потока"""
+        if self._ponder_thread is None:
+            return
+        self._ponder_engine.stop()
+        self._ponder_thread.join()
+        self._clear_pondering()
+
+    def _clear_pondering(self):
+        self._ponder_thread = None
+        self._ponder_engine = None
+        self._ponder_root = None
+        self._ponder_key = None
+        self._ponder_move = None
+
+    def _ponder(self, board, color, history):
+        self._ponder_result = self._ponder_engine.search(board, color, history)
+
+    def _predict_reply(self, board, color, history):
+        """Ожидаемый ход соперника: из таблицы транспозиций или коротким поиском"""
+        legal_moves = board.get_legal_moves(color)
+        if not legal_moves:
+            return None
+        entry = self._engine.get_table().probe(board.get_hash())
+        table_move = unpack_move(entry[3]) if entry else None
+        if table_move in legal_moves:
+            return table_move
+        engine = SearchEngine(max_nodes=self.PREDICTION_NODES, table=self._engine.get_table(),
+                              tablebase=self._engine.get_tablebase())
+        return engine.search(board, color, history)
+
+    def _finish_pondering(self, game, color):
+        """Ход из обдумывания, если соперник сыграл предсказанный ход, иначе None"""
+        if self._ponder_thread is None:
+            return None
+        board = game.get_board()
+        if self._ponder_key != board.get_hash() or board.side_to_move != color:
+            self.stop_pondering()
+            return None
+
+        # Угадали: обдумывание становится обычным поиском с лимитом времени
+        self._ponder_engine.set_time_limit(self._engine.get_time_limit())
+        self._ponder_thread.join()
+        move = self._ponder_result
+        self._last_stats = self._ponder_engine.get_stats()
+        self._clear_pondering()
+        return move if move in game._get_legal_moves(color) else None
 
     def get_best_move(self, game, color):
         """Получить лучший ход"""
+        self._last_stats = None
         if self._difficulty == PlayerType.AI_EASY:
             return self._get_random_move(game, color)
-        elif self._difficulty == PlayerType.AI_MEDIUM:
+
+        book_move = self._get_book_move(game, color)
+        if book_move:
+            self.stop_pondering()
+            return book_move
+        if self._difficulty == PlayerType.AI_MEDIUM:
             return self._get_medium_move(game, color)
         else:
             return self._get_hard_move(game, color)
 
+    def _get_book_move(self, game, color):
+        """Ход из дебютной книги, если позиция в ней есть"""
+        board = game.get_board()
+        if self._book is None or board.side_to_move != color:
+            return None
+        move = self._book.choose_move(board)
+        return move[:2] if move else None
+
     def _get_random_move(self, game, color):
         """Случайный ход (легкий уровень)"""
         legal_moves = game._get_legal_moves(color)
@@ -47,46 +207,18 @@ class ChessAI:
         return best_move
 
     def _get_hard_move(self, game, color):
-        """Сложный уровень - минимакс с альфа-бета отсечением"""
-        # Упрощенная реализация
-        return self._minimax(game, color, depth=3)
+        """Сложный уровень - альфа-бета поиск с итеративным углублением"""
+        move = self._finish_pondering(game, color)
+        if move is not None:
+            return move
+        move = self._engine.search(game.get_board(), color, game.get_position_history())
+        self._last_stats = self._engine.get_stats()
+        return move
 
     def _evaluate_move(self, game, from_pos, to_pos, color):
-        """Оценка хода"""
-        score = 0
-
-        piece = game._board.get_piece(*from_pos)
-        target = game._board.get_piece(*to_pos)
-
-        # Взятие фигуры
-        if target:
-            score += self._get_piece_value(target) * 10
-
-        # Контроль центра
-        center_squares = [(3, 3), (3, 4), (4, 3), (4, 4)]
-        if to_pos in center_squares:
-            score += 5
-
-        # Развитие фигур
-        if piece.get_type() in [PieceType.KNIGHT, PieceType.BISHOP]:
-            if not piece.has_moved():
-                score += 3
-
+        """Оценка хода: оценка позиции после него"""
+        board = game.get_board()
+        undo = board.make_move(from_pos, to_pos)
+        score = board.get_evaluation(color)
+        board.unmake_move(undo)
         return score
-
-    def _get_piece_value(self, piece):
-        """Получить ценность фигуры"""
-        values = {
-            PieceType.PAWN: 1,
-            PieceType.KNIGHT: 3,
-            PieceType.BISHOP: 3,
-            PieceType.ROOK: 5,
-            PieceType.QUEEN: 9,
-            PieceType.KING: 0
-        }
-        return values.get(piece.get_type(), 0)
-
-    def _minimax(self, game, color, depth):
-        """Алгоритм минимакс (упрощенный)"""
-        # Базовая реализация для демонстрации
-        return self._get_medium_move(game, color)
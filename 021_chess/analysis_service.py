@@ -0,0 +1,366 @@
+"""
+Сервис пакетного анализа позиций: asyncio, пул процессов и кэш результатов
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ai import ChessAI
+from bitboard import BitBoard
+from enums import PieceColor, PlayerType
+from exceptions import ChessException, InvalidNotationException, InvalidMoveException
+from game import ChessGame
+from player import Player
+from search import MAX_PLY
+from tablebase import Tablebase
+from utils import parse_uci_move, move_to_uci
+
+DEFAULT_TIME = 1.0
+DEFAULT_CACHE_SIZE = 100000
+
+# ИИ процесса пула по лимитам (секунды, глубина): таблица транспозиций
+# переживает задания, что ускоряет анализ позиций одной партии
+_worker_ais = {}
+_worker_tablebase = None
+
+
+def _init_worker(tablebase_dir):
+    global _worker_tablebase
+    _worker_tablebase = Tablebase(tablebase_dir) if tablebase_dir else None
+
+
+def analyze_position(task):
+    """Проанализировать позицию (выполняется в процессе пула).
+
+    task - кортеж (начальный FEN, ходы [(откуда, куда, превращение)],
+    лимит времени в секундах или None, глубина). Возвращает словарь
+    с лучшим ходом, оценкой, глубиной, узлами, временем и вариантом.
+    """
+    fen, moves, time_limit, depth = task
+    game = ChessGame.from_fen(fen, Player("Белые", PieceColor.WHITE), Player("Черные", PieceColor.BLACK),
+                              BitBoard)
+    game.replay_moves(moves)
+    color = game.get_current_turn()
+
+    limits = (time_limit, depth)
+    if limits not in _worker_ais:
+        _worker_ais[limits] = ChessAI(PlayerType.AI_HARD, time_limit=time_limit, max_depth=depth,
+                                      tablebase=_worker_tablebase)
+    ai = _worker_ais[limits]
+
+    move = ai.get_best_move(game, color)
+    result = {'bestmove': move_to_uci(*move) if move else None, 'depth': 0, 'nodes': 0, 'time': 0,
+              'score_cp': None, 'mate': None, 'pv': []}
+    if move is None:
+        # Мат или пат: оценка известна без поиска
+        if game.get_board().is_in_check(color):
+            result['mate'] = 0
+        else:
+            result['score_cp'] = 0
+        return result
+
+    stats = ai.get_last_stats()
+    if stats is not None:
+        result['nodes'] = stats.get_nodes()
+        result['time'] = int(stats.get_elapsed() * 1000)
+        iterations = stats.get_iterations()
+        if iterations:
+            last = iterations[-1]
+            result['depth'] = last.get_depth()
+            result['pv'] = [move_to_uci(*pv_move) for pv_move in last.get_pv()]
+            if last.get_mate_in() is not None:
+                result['mate'] = last.get_mate_in()
+            else:
+                result['score_cp'] = last.get_score()
+    return result
+
+
+def parse_position(fen, uci_moves):
+    """Разобрать позицию задания: (ключ Зобриста, ключ истории, ходы).
+
+    Ключ истории - хеш множества уже сыгранных позиций: поиск считает
+    повтор любой из них ничьей, поэтому от него зависит результат.
+    Ошибки - InvalidNotationException/InvalidMoveException.
+    """
+    board = BitBoard.from_fen(fen)
+    moves = []
+    played = set()
+    for text in uci_moves:
+        move = parse_uci_move(text)
+        if move is None:
+            raise InvalidNotationException(f"Некорректный ход: {text}")
+        if move[:2] not in board.get_legal_moves(board.side_to_move):
+            raise InvalidMoveException(f"Нелегальный ход: {text}")
+        played.add(board.get_hash())
+        board.make_move(*move)
+        moves.append(move)
+    return board.get_hash(), hash(frozenset(played)), moves
+
+
+def format_result(job_id, result):
+    """Строка ответа: result <id> bestmove <ход> depth .. score .. nodes .. time .. cached .. pv .."""
+    parts = [f"result {job_id}", f"bestmove {result['bestmove'] or '(none)'}", f"depth {result['depth']}"]
+    if result['mate'] is not None:
+        parts.append(f"score mate {result['mate']}")
+    elif result['score_cp'] is not None:
+        parts.append(f"score cp {result['score_cp']}")
+    parts.append(f"nodes {result['nodes']}")
+    parts.append(f"time {result['time']}")
+    parts.append(f"cached {int(result.get('cached', False))}")
+    if result['pv']:
+        parts.append("pv " + " ".join(result['pv']))
+    return " ".join(parts)
+
+
+class AnalysisService:
+    """Очередь заданий анализа и пул процессов с ИИ.
+
+    Задания ставятся в общую очередь asyncio и разбираются
+    диспетчерами, по одному на процесс пула. Результаты кэшируются по
+    ключу Зобриста позиции, истории партии и лимитам (LRU), а
+    одинаковые задания, пришедшие во время анализа, ждут один и тот же
+    результат.
+    """
+
+    def __init__(self, workers=None, tablebase_dir=None, cache_size=DEFAULT_CACHE_SIZE,
+                 default_time=DEFAULT_TIME):
+        self._workers = workers or os.cpu_count() or 1
+        self._tablebase_dir = tablebase_dir
+        self._cache_size = cache_size
+        self._default_time = default_time
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._queue = None
+        self._executor = None
+        self._dispatchers = []
+        self._running = 0
+        self._completed = 0
+        self._cache_hits = 0
+
+    def get_stats(self):
+        """Состояние сервиса: очередь, задания в работе, кэш"""
+        return {
+            'workers': self._workers,
+            'queued': self._queue.qsize() if self._queue else 0,
+            'running': self._running,
+            'completed': self._completed,
+            'cached': len(self._cache),
+            'cache_hits': self._cache_hits
+        }
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=self._workers, initializer=_init_worker,
+                                             initargs=(self._tablebase_dir,))
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self._workers)]
+
+    async def close(self):
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def submit(self, fen=ChessGame.STANDARD_START_FEN, moves=(), depth=None, movetime=None):
+        """Проанализировать позицию после ходов (UCI) из fen и вернуть словарь результата.
+
+        depth - глубина, movetime - время в миллисекундах; без обоих
+        лимитов берется время по умолчанию.
+        """
+        key, history_key, parsed_moves = parse_position(fen, moves)
+        time_limit = movetime / 1000 if movetime else None
+        if time_limit is None and depth is None:
+            time_limit = self._default_time
+        cache_key = (key, history_key, time_limit, depth)
+
+        if cache_key in self._cache:
+            self._cache.move_to_end(cache_key)
+            self._cache_hits += 1
+            return dict(self._cache[cache_key], cached=True)
+
+        future = self._pending.get(cache_key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[cache_key] = future
+            await self._queue.put((cache_key, (fen, parsed_moves, time_limit, depth or MAX_PLY)))
+        # Ожидающих может быть несколько: отмена одного не отменяет анализ
+        return dict(await asyncio.shield(future))
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            cache_key, task = await self._queue.get()
+            future = self._pending[cache_key]
+            self._running += 1
+            try:
+                result = await loop.run_in_executor(self._executor, analyze_position, task)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                self._store(cache_key, result)
+                future.set_result(result)
+            finally:
+                self._running -= 1
+                self._completed += 1
+                del self._pending[cache_key]
+                self._queue.task_done()
+
+    def _store(self, cache_key, result):
+        self._cache[cache_key] = result
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    async def handle_connection(self, reader, send):
+        """Обслужить один поток команд до quit или конца ввода.
+
+        Команды (по строке):
+          analyze <id> [depth N] [movetime MS] (startpos | fen <FEN>) [moves <ход> ...]
+          isready, stats, quit
+        Результаты приходят по мере готовности строками result/error с id задания.
+        """
+        jobs = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode('utf-8', errors='replace').split()
+            if not command:
+                continue
+            if command[0] == "quit":
+                break
+            if command[0] == "isready":
+                send("readyok")
+            elif command[0] == "stats":
+                send("stats " + " ".join(f"{name} {value}" for name, value in self.get_stats().items()))
+            elif command[0] == "analyze" and len(command) > 1:
+                job = asyncio.create_task(self._run_job(command[1], command[2:], send))
+                jobs.add(job)
+                job.add_done_callback(jobs.discard)
+            else:
+                send(f"error - неизвестная команда: {' '.join(command)}")
+
+        # Конец ввода не отменяет уже принятые задания
+        if jobs:
+            await asyncio.gather(*jobs)
+
+    async def _run_job(self, job_id, arguments, send):
+        try:
+            fen, moves, depth, movetime = _parse_analyze(arguments)
+            result = await self.submit(fen, moves, depth, movetime)
+        except (ChessException, ValueError) as e:
+            send(f"error {job_id} {str(e)}")
+        except Exception as e:
+            send(f"error {job_id} ошибка анализа: {str(e)}")
+        else:
+            send(format_result(job_id, result))
+
+    async def serve_unix(self, path):
+        """Принимать подключения на Unix-сокете"""
+        async def on_connect(reader, writer):
+            def send(line):
+                writer.write((line + "\n").encode('utf-8'))
+            try:
+                await self.handle_connection(reader, send)
+                await writer.drain()
+            finally:
+                writer.close()
+
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(on_connect, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def serve_stdio(self):
+        """Читать команды из stdin и писать ответы в stdout"""
+        await self.handle_connection(_StdinReader(), _send_stdout)
+
+
+class _StdinReader:
+    """Построчное чтение stdin в потоке: stdin может быть файлом, а не каналом"""
+
+    async def readline(self):
+        return await asyncio.get_running_loop().run_in_executor(None, sys.stdin.buffer.readline)
+
+
+def _send_stdout(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def _parse_analyze(arguments):
+    """Аргументы analyze: (FEN, ходы, глубина, время в мс)"""
+    depth = movetime = None
+    fen = None
+    moves = []
+    index = 0
+    while index < len(arguments):
+        word = arguments[index]
+        if word == "depth" and index + 1 < len(arguments):
+            depth = int(arguments[index + 1])
+            index += 2
+        elif word == "movetime" and index + 1 < len(arguments):
+            movetime = int(arguments[index + 1])
+            index += 2
+        elif word == "startpos":
+            fen = ChessGame.STANDARD_START_FEN
+            index += 1
+        elif word == "fen":
+            # FEN занимает до шести полей, до слова moves
+            end = arguments.index("moves", index) if "moves" in arguments[index:] else len(arguments)
+            fen = " ".join(arguments[index + 1:end])
+            index = end
+        elif word == "moves":
+            moves = arguments[index + 1:]
+            break
+        else:
+            raise InvalidNotationException(f"Неизвестный параметр: {word}")
+    if fen is None:
+        raise InvalidNotationException("Не задана позиция: startpos или fen")
+    if depth is not None and not 0 < depth <= MAX_PLY:
+        raise InvalidNotationException(f"Глубина вне диапазона 1-{MAX_PLY}: {depth}")
+    return fen, moves, depth, movetime
+
+
+async def _run(args):
+    service = AnalysisService(args.workers, args.tablebases, args.cache_size, args.time)
+    await service.start()
+    try:
+        if args.socket:
+            await service.serve_unix(args.socket)
+        else:
+            await service.serve_stdio()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервис пакетного анализа шахматных позиций")
+    parser.add_argument("--socket", default=None, help="путь к Unix-сокету (по умолчанию - stdin/stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="процессов анализа (по умолчанию - все ядра)")
+    parser.add_argument("--time", type=float, default=DEFAULT_TIME,
+                        help="секунд на позицию, если в задании нет лимитов")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="результатов в кэше")
+    parser.add_argument("--tablebases", default=None, help="каталог эндшпильных таблиц")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
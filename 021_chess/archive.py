@@ -0,0 +1,228 @@
+"""
+Компактный двоичный архив шахматных партий
+"""
+
+import os
+import struct
+import time
+from exceptions import SaveGameException
+from game import ChessGame
+from player import Player
+from enums import PieceColor, PieceType, PlayerType, GameStatus
+
+
+# Ход в 16 битах: биты 0-5 - откуда, 6-11 - куда, 12-14 - фигура превращения
+_PROMOTION_CODES = {
+    None: 0,
+    PieceType.KNIGHT: 1,
+    PieceType.BISHOP: 2,
+    PieceType.ROOK: 3,
+    PieceType.QUEEN: 4
+}
+_PROMOTIONS_BY_CODE = {code: piece_type for piece_type, code in _PROMOTION_CODES.items()}
+
+_STATUSES = list(GameStatus)
+_PLAYER_TYPES = list(PlayerType)
+
+# Заголовок записи: статус, типы игроков, рейтинги, время сохранения, число ходов
+_RECORD_HEADER = struct.Struct('<BBBhhIH')
+# Запись индекса: смещение записи в файле данных и ее длина
+_INDEX_ENTRY = struct.Struct('<QI')
+_STRING_LENGTH = struct.Struct('<H')
+
+
+def encode_move(from_pos, to_pos, promotion_piece=None):
+    """Упаковать ход в 16 бит"""
+    from_square = from_pos[0] * 8 + from_pos[1]
+    to_square = to_pos[0] * 8 + to_pos[1]
+    return from_square | (to_square << 6) | (_PROMOTION_CODES[promotion_piece] << 12)
+
+
+def decode_move(code):
+    """Распаковать ход из 16 бит: (откуда, куда, превращение)"""
+    from_square = code & 63
+    to_square = (code >> 6) & 63
+    return ((from_square >> 3, from_square & 7), (to_square >> 3, to_square & 7),
+            _PROMOTIONS_BY_CODE[(code >> 12) & 7])
+
+
+class GameArchive:
+    """Архив партий из двух файлов: данные и индекс.
+
+    Партии только дописываются в конец файла данных. Индекс хранит для
+    каждой партии смещение и длину записи фиксированным размером, так что
+    номер партии - это номер записи индекса, и любая партия читается
+    одним seek без просмотра остальных.
+    """
+
+    DATA_SUFFIX = ".dat"
+    INDEX_SUFFIX = ".idx"
+
+    def __init__(self, path):
+        self._data_path = path + self.DATA_SUFFIX
+        self._index_path = path + self.INDEX_SUFFIX
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        for filepath in (self._data_path, self._index_path):
+            if not os.path.exists(filepath):
+                open(filepath, 'wb').close()
+
+    def __len__(self):
+        return os.path.getsize(self._index_path) // _INDEX_ENTRY.size
+
+    def append_game(self, game):
+        """Дописать партию и вернуть ее номер"""
+        return self.append_games([game])[0]
+
+    def append_games(self, games):
+        """Дописать несколько партий за одно открытие файлов"""
+        return self.append_records(self._game_record(game) for game in games)
+
+    def append_records(self, records):
+        """Дописать партии в виде записей (как у read_record), не переигрывая ходы"""
+        game_ids = []
+        with open(self._data_path, 'ab') as data_file, open(self._index_path, 'ab') as index_file:
+            data_file.seek(0, os.SEEK_END)
+            offset = data_file.tell()
+            game_id = index_file.seek(0, os.SEEK_END) // _INDEX_ENTRY.size
+
+            for game_record in records:
+                record = self._encode_record(game_record)
+                data_file.write(record)
+                # Индекс пишется после данных: при сбое останется лишь недописанный хвост данных
+                index_file.write(_INDEX_ENTRY.pack(offset, len(record)))
+                offset += len(record)
+                game_ids.append(game_id)
+                game_id += 1
+
+            data_file.flush()
+            index_file.flush()
+        return game_ids
+
+    def read_record(self, game_id):
+        """Прочитать запись партии по номеру в виде словаря"""
+        if not 0 <= game_id < len(self):
+            raise SaveGameException(f"Партия не найдена в архиве: {game_id}")
+
+        with open(self._index_path, 'rb') as index_file:
+            index_file.seek(game_id * _INDEX_ENTRY.size)
+            offset, length = _INDEX_ENTRY.unpack(index_file.read(_INDEX_ENTRY.size))
+
+        with open(self._data_path, 'rb') as data_file:
+            data_file.seek(offset)
+            return self._decode_record(data_file.read(length))
+
+    def load_game(self, game_id):
+        """Восстановить партию из архива"""
+        return self.build_game(self.read_record(game_id))
+
+    def iter_records(self, with_moves=True):
+        """Последовательно прочитать все записи (номер, запись) без загрузки архива в память.
+
+        При with_moves=False ходы не распаковываются (в записи остается
+        только их число 'move_count') - этого достаточно для списка партий.
+        """
+        with open(self._index_path, 'rb') as index_file, open(self._data_path, 'rb') as data_file:
+            game_id = 0
+            while True:
+                entry = index_file.read(_INDEX_ENTRY.size)
+                if len(entry) < _INDEX_ENTRY.size:
+                    break
+                offset, length = _INDEX_ENTRY.unpack(entry)
+                data_file.seek(offset)
+                yield game_id, self._decode_record(data_file.read(length), with_moves)
+                game_id += 1
+
+    @staticmethod
+    def build_game(record):
+        """Создать ChessGame по записи архива, переиграв ходы"""
+        white_player = GameArchive._build_player(record['white_player'], PieceColor.WHITE)
+        black_player = GameArchive._build_player(record['black_player'], PieceColor.BLACK)
+
+        if record['start_fen']:
+            game = ChessGame.from_fen(record['start_fen'], white_player, black_player)
+        else:
+            game = ChessGame(white_player, black_player)
+        game.replay_moves(record['moves'])
+
+        status = record['status']
+        if status not in [GameStatus.IN_PROGRESS, GameStatus.CHECK]:
+            game._status = status
+        return game
+
+    @staticmethod
+    def _build_player(player_data, color):
+        player = Player(player_data['name'], color, player_data['type'])
+        player.update_rating(player_data['rating'] - player.get_rating())
+        return player
+
+    @staticmethod
+    def _game_record(game):
+        players = []
+        for player in (game.get_white_player(), game.get_black_player()):
+            players.append({'name': player.get_name(), 'rating': player.get_rating(),
+                            'type': player.get_player_type()})
+        return {
+            'white_player': players[0],
+            'black_player': players[1],
+            'status': game.get_status(),
+            'start_fen': game.get_start_fen(),
+            'moves': [(move.get_from_pos(), move.get_to_pos(), move.get_promotion_piece())
+                      for move in game.get_move_history()]
+        }
+
+    def _encode_record(self, record):
+        white_player = record['white_player']
+        black_player = record['black_player']
+        moves = record['moves']
+
+        # Стандартную начальную позицию не храним
+        start_fen = record['start_fen'] or ""
+        if start_fen == ChessGame.STANDARD_START_FEN:
+            start_fen = ""
+
+        parts = [_RECORD_HEADER.pack(
+            _STATUSES.index(record['status']),
+            _PLAYER_TYPES.index(white_player['type']),
+            _PLAYER_TYPES.index(black_player['type']),
+            white_player['rating'],
+            black_player['rating'],
+            record.get('saved_at') or int(time.time()),
+            len(moves)
+        )]
+        for text in (white_player['name'], black_player['name'], start_fen):
+            encoded = text.encode('utf-8')
+            parts.append(_STRING_LENGTH.pack(len(encoded)))
+            parts.append(encoded)
+
+        codes = [encode_move(from_pos, to_pos, promotion_piece) for from_pos, to_pos, promotion_piece in moves]
+        parts.append(struct.pack(f'<{len(codes)}H', *codes))
+        return b"".join(parts)
+
+    def _decode_record(self, data, with_moves=True):
+        status, white_type, black_type, white_rating, black_rating, saved_at, move_count = \
+            _RECORD_HEADER.unpack_from(data)
+        offset = _RECORD_HEADER.size
+
+        strings = []
+        for _ in range(3):
+            (length,) = _STRING_LENGTH.unpack_from(data, offset)
+            offset += _STRING_LENGTH.size
+            strings.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+        white_name, black_name, start_fen = strings
+
+        record = {
+            'white_player': {'name': white_name, 'rating': white_rating, 'type': _PLAYER_TYPES[white_type]},
+            'black_player': {'name': black_name, 'rating': black_rating, 'type': _PLAYER_TYPES[black_type]},
+            'status': _STATUSES[status],
+            'start_fen': start_fen,
+            'saved_at': saved_at,
+            'move_count': move_count
+        }
+        if with_moves:
+            codes = struct.unpack_from(f'<{move_count}H', data, offset)
+            record['moves'] = [decode_move(code) for code in codes]
+        return record
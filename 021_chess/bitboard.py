@@ -0,0 +1,894 @@
+"""
+Шахматная доска на битбордах
+"""
+
+from board import (Board, ALL_CASTLING_RIGHTS, WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+                   _CASTLING_KEEP, KNIGHT_OFFSETS, KING_OFFSETS)
+from piece import Pawn, Knight, Bishop, Rook, Queen, King
+from enums import PieceColor, PieceType
+from exceptions import InvalidPositionException
+from move import MOVE_POSITIONS
+from zobrist import PIECE_KEYS
+from evaluation import MIDGAME_SCORES, ENDGAME_SCORES, PHASE_WEIGHTS
+
+
+# Клетка кодируется числом row * 8 + col: a8 = 0, h8 = 7, a1 = 56, h1 = 63
+SQUARE_POSITIONS = [(square >> 3, square & 7) for square in range(64)]
+
+FULL_MASK = (1 << 64) - 1
+
+ROW_MASKS = [0xFF << (8 * row) for row in range(8)]
+COL_MASKS = [0x0101010101010101 << col for col in range(8)]
+
+# Фигура на доске - небольшое число: цвет * 6 + тип (белые 0-5, черные 6-11)
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+_TYPES = list(PieceType)
+_COLORS = [PieceColor.WHITE, PieceColor.BLACK]
+_WHITE = PieceColor.WHITE
+
+PIECE_CODES = {(color, piece_type): color_index * 6 + type_index
+               for color_index, color in enumerate(_COLORS)
+               for type_index, piece_type in enumerate(_TYPES)}
+_CODE_COLORS = [color for color in _COLORS for _ in _TYPES]
+_CODE_TYPES = _TYPES * 2
+_TYPE_INDEX = {piece_type: index for index, piece_type in enumerate(_TYPES)}
+_PIECE_CLASSES = [Pawn, Knight, Bishop, Rook, Queen, King]
+
+# Слагаемые хеша и оценки по коду фигуры и клетке
+_PIECE_HASH = [PIECE_KEYS[_CODE_COLORS[code]][_CODE_TYPES[code]] for code in range(12)]
+_MIDGAME = [MIDGAME_SCORES[_CODE_COLORS[code]][_CODE_TYPES[code]] for code in range(12)]
+_ENDGAME = [ENDGAME_SCORES[_CODE_COLORS[code]][_CODE_TYPES[code]] for code in range(12)]
+_PHASE = [PHASE_WEIGHTS[_CODE_TYPES[code]] for code in range(12)]
+
+# Права на рокировку каждого цвета (см. board.WHITE_KINGSIDE и др.)
+_CASTLING_MASKS = [WHITE_KINGSIDE | WHITE_QUEENSIDE, BLACK_KINGSIDE | BLACK_QUEENSIDE]
+
+# Какие права на рокировку остаются, если ход начинается или заканчивается на клетке
+_CASTLING_KEEP_SQUARES = [_CASTLING_KEEP[row][col] for row, col in SQUARE_POSITIONS]
+
+
+def square_index(row, col):
+    """Номер клетки по координатам"""
+    return row * 8 + col
+
+
+def lowest_square(bitboard):
+    """Номер младшей установленной клетки"""
+    return (bitboard & -bitboard).bit_length() - 1
+
+
+def iterate_squares(bitboard):
+    """Перебрать номера всех установленных клеток"""
+    while bitboard:
+        low_bit = bitboard & -bitboard
+        yield low_bit.bit_length() - 1
+        bitboard ^= low_bit
+
+
+def _build_step_attacks(offsets):
+    """Таблица атак для фигур, ходящих на фиксированные смещения"""
+    table = []
+    for square in range(64):
+        row, col = SQUARE_POSITIONS[square]
+        mask = 0
+        for dr, dc in offsets:
+            new_row, new_col = row + dr, col + dc
+            if 0 <= new_row < 8 and 0 <= new_col < 8:
+                mask |= 1 << square_index(new_row, new_col)
+        table.append(mask)
+    return table
+
+
+def _build_ray(direction):
+    """Маски лучей из каждой клетки в заданном направлении (без самой клетки)"""
+    dr, dc = direction
+    table = []
+    for square in range(64):
+        row, col = SQUARE_POSITIONS[square]
+        mask = 0
+        new_row, new_col = row + dr, col + dc
+        while 0 <= new_row < 8 and 0 <= new_col < 8:
+            mask |= 1 << square_index(new_row, new_col)
+            new_row += dr
+            new_col += dc
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _build_step_attacks(KNIGHT_OFFSETS)
+KING_ATTACKS = _build_step_attacks(KING_OFFSETS)
+
+# Клетки, которые бьет пешка данного цвета, стоящая на клетке
+PAWN_ATTACKS = {
+    PieceColor.WHITE: _build_step_attacks([(-1, -1), (-1, 1)]),
+    PieceColor.BLACK: _build_step_attacks([(1, -1), (1, 1)])
+}
+_PAWN_ATTACKS = [PAWN_ATTACKS[PieceColor.WHITE], PAWN_ATTACKS[PieceColor.BLACK]]
+
+# Луч задается таблицей масок и признаком роста номеров клеток вдоль него:
+# для растущих лучей ближайший блокер - младший бит, для убывающих - старший
+ROOK_RAYS = [
+    (_build_ray((1, 0)), True),
+    (_build_ray((0, 1)), True),
+    (_build_ray((-1, 0)), False),
+    (_build_ray((0, -1)), False)
+]
+
+BISHOP_RAYS = [
+    (_build_ray((1, 1)), True),
+    (_build_ray((1, -1)), True),
+    (_build_ray((-1, 1)), False),
+    (_build_ray((-1, -1)), False)
+]
+
+
+def _build_between():
+    """Маски клеток строго между двумя клетками одной линии (0, если не на линии)"""
+    table = [[0] * 64 for _ in range(64)]
+    for ray_table, _ in ROOK_RAYS + BISHOP_RAYS:
+        for square in range(64):
+            for target in iterate_squares(ray_table[square]):
+                table[square][target] = ray_table[square] & ~ray_table[target] & ~(1 << target)
+    return table
+
+
+BETWEEN = _build_between()
+
+
+def _build_lines():
+    """Маски всей линии через две клетки (0, если не на одной линии)"""
+    table = [[0] * 64 for _ in range(64)]
+    for forward, backward in ((ROOK_RAYS[0], ROOK_RAYS[2]), (ROOK_RAYS[1], ROOK_RAYS[3]),
+                              (BISHOP_RAYS[0], BISHOP_RAYS[3]), (BISHOP_RAYS[1], BISHOP_RAYS[2])):
+        for square in range(64):
+            line = forward[0][square] | backward[0][square] | (1 << square)
+            for target in iterate_squares(line ^ (1 << square)):
+                table[square][target] = line
+    return table
+
+
+_LINE_THROUGH = _build_lines()
+_ROOK_LINES = [ROOK_RAYS[0][0][square] | ROOK_RAYS[1][0][square] | ROOK_RAYS[2][0][square]
+               | ROOK_RAYS[3][0][square] for square in range(64)]
+_BISHOP_LINES = [BISHOP_RAYS[0][0][square] | BISHOP_RAYS[1][0][square] | BISHOP_RAYS[2][0][square]
+                 | BISHOP_RAYS[3][0][square] for square in range(64)]
+
+
+def _sliding_attacks(square, occupied, rays):
+    """Атаки дальнобойной фигуры с учетом блокирующих фигур (поиском по лучам)"""
+    attacks = 0
+    for ray_table, increasing in rays:
+        ray = ray_table[square]
+        blockers = ray & occupied
+        if blockers:
+            if increasing:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= ray_table[blocker]
+        attacks |= ray
+    return attacks
+
+
+def _build_line_attacks(rays):
+    """Атаки вдоль линии из двух встречных лучей для каждой расстановки блокеров.
+
+    Возвращает маски значимых клеток линии (без крайних: фигура на краю
+    ничего не заслоняет) и словари "значимые блокеры -> атаки" по клеткам.
+    """
+    masks = []
+    tables = []
+    for square in range(64):
+        relevant = 0
+        for ray_table, increasing in rays:
+            ray = ray_table[square]
+            if ray:
+                edge = ray.bit_length() - 1 if increasing else (ray & -ray).bit_length() - 1
+                relevant |= ray ^ (1 << edge)
+        table = {}
+        subset = 0
+        while True:
+            table[subset] = _sliding_attacks(square, subset, rays)
+            subset = (subset - relevant) & relevant
+            if not subset:
+                break
+        masks.append(relevant)
+        tables.append(table)
+    return masks, tables
+
+
+# Атаки дальнобойных фигур - по линиям (горизонталь, вертикаль, две диагонали):
+# значимые блокеры линии выбираются маской и сразу дают ответ из словаря
+_RANK_MASKS, _RANK_ATTACKS = _build_line_attacks([ROOK_RAYS[1], ROOK_RAYS[3]])
+_FILE_MASKS, _FILE_ATTACKS = _build_line_attacks([ROOK_RAYS[0], ROOK_RAYS[2]])
+_DIAGONAL_MASKS, _DIAGONAL_ATTACKS = _build_line_attacks([BISHOP_RAYS[0], BISHOP_RAYS[3]])
+_ANTI_DIAGONAL_MASKS, _ANTI_DIAGONAL_ATTACKS = _build_line_attacks([BISHOP_RAYS[1], BISHOP_RAYS[2]])
+
+
+def rook_attacks(square, occupied):
+    """Атаки ладьи с клетки"""
+    return (_RANK_ATTACKS[square][occupied & _RANK_MASKS[square]]
+            | _FILE_ATTACKS[square][occupied & _FILE_MASKS[square]])
+
+
+def bishop_attacks(square, occupied):
+    """Атаки слона с клетки"""
+    return (_DIAGONAL_ATTACKS[square][occupied & _DIAGONAL_MASKS[square]]
+            | _ANTI_DIAGONAL_ATTACKS[square][occupied & _ANTI_DIAGONAL_MASKS[square]])
+
+
+def _piece(code):
+    """Объект фигуры по коду (только на границе API: доска хранит коды)"""
+    return _PIECE_CLASSES[code % 6](_CODE_COLORS[code])
+
+
+# Списки кодов ходов по маске целей: перебор битов маски в Python дороже
+# поиска в словаре, а наборы целей в партиях повторяются. Ключ - маска целей
+# и клетка, откуда идут все ходы (0-63), или сдвиг до клетки хода для пешек,
+# которые ходят всей маской сразу (64 + 32 + сдвиг)
+_MOVE_CODES = {}
+_MOVE_CODES_LIMIT = 1 << 18
+
+
+def _move_codes(from_square, targets):
+    """Коды ходов с клетки на каждую клетку маски (список не изменять)"""
+    key = targets << 7 | from_square
+    codes = _MOVE_CODES.get(key)
+    if codes is None:
+        from_code = from_square << 6
+        codes = _remember_codes(key, [from_code | square for square in iterate_squares(targets)])
+    return codes
+
+
+def _shift_codes(targets, step):
+    """Коды ходов на каждую клетку маски с клетки на step дальше (список не изменять)"""
+    key = targets << 7 | (96 + step)
+    codes = _MOVE_CODES.get(key)
+    if codes is None:
+        codes = _remember_codes(key, [(square + step) << 6 | square for square in iterate_squares(targets)])
+    return codes
+
+
+def _remember_codes(key, codes):
+    if len(_MOVE_CODES) >= _MOVE_CODES_LIMIT:
+        _MOVE_CODES.clear()
+    _MOVE_CODES[key] = codes
+    return codes
+
+
+class BitUndoInfo:
+    """Запись для отмены хода BitBoard.make_move.
+
+    Ход делается на копиях масок и клеток, поэтому запись хранит
+    прежние списки целиком, и отмена только возвращает их на место.
+    Фигуры взятия и превращения создаются объектами лишь по запросу.
+    """
+
+    __slots__ = ('pieces', 'occupancy', 'mailbox', 'en_passant_target', 'castling_rights',
+                 'pieces_hash', 'midgame_score', 'endgame_score', 'phase', 'moved',
+                 'captured_code', 'promoted_code', '_captured_piece', '_promoted')
+
+    def __init__(self, pieces, occupancy, mailbox, en_passant_target, castling_rights,
+                 pieces_hash, midgame_score, endgame_score, phase, moved, captured_code):
+        self.pieces = pieces
+        self.occupancy = occupancy
+        self.mailbox = mailbox
+        self.en_passant_target = en_passant_target
+        self.castling_rights = castling_rights
+        self.pieces_hash = pieces_hash
+        self.midgame_score = midgame_score
+        self.endgame_score = endgame_score
+        self.phase = phase
+        self.moved = moved
+        self.captured_code = captured_code
+        self.promoted_code = None
+        self._captured_piece = None
+        self._promoted = None
+
+    @property
+    def captured_piece(self):
+        """Взятая фигура (один и тот же объект при каждом запросе) или None"""
+        if self._captured_piece is None and self.captured_code is not None:
+            self._captured_piece = _piece(self.captured_code)
+        return self._captured_piece
+
+    @property
+    def promoted(self):
+        """Фигура, в которую превратилась пешка, или None"""
+        if self._promoted is None and self.promoted_code is not None:
+            self._promoted = _piece(self.promoted_code)
+        return self._promoted
+
+
+class BitBoard(Board):
+    """Доска, хранящая позицию в 64-битных масках по типам и цветам фигур.
+
+    Позиция - двенадцать масок фигур (код фигуры: цвет * 6 + тип), две
+    маски занятых клеток по цветам и список из 64 кодов для ответа "что
+    стоит на клетке". Генерация ходов, проверка атак, make_move и
+    unmake_move работают только с ними и предвычисленными таблицами;
+    объекты Piece создаются лишь на границе API (get_piece, remove_piece,
+    взятая и превращенная фигуры в записи отмены).
+    """
+
+    def __init__(self, setup=True):
+        self._pieces = [0] * 12
+        self._occupancy = [0, 0]
+        self._mailbox = [None] * 64
+        self._captured_pieces = {PieceColor.WHITE: [], PieceColor.BLACK: []}
+        self.en_passant_target = None
+        self.castling_rights = 0
+        self.side_to_move = PieceColor.WHITE
+        self._pieces_hash = 0
+        self._midgame_score = 0
+        self._endgame_score = 0
+        self._phase = 0
+        if setup:
+            self._initialize_board()
+            self.castling_rights = ALL_CASTLING_RIGHTS
+
+    @classmethod
+    def from_board(cls, board):
+        """Создать битборд-доску с той же позицией, что и обычная доска"""
+        if isinstance(board, BitBoard):
+            return board.clone()
+        new_board = cls(setup=False)
+        for row in range(8):
+            for col in range(8):
+                piece = board.get_piece(row, col)
+                if piece is not None:
+                    new_board._put(row * 8 + col, PIECE_CODES[(piece.get_color(), piece.get_type())])
+        new_board.en_passant_target = board.en_passant_target
+        new_board.castling_rights = board.castling_rights
+        new_board.side_to_move = board.side_to_move
+        return new_board
+
+    def _place(self, row, col, piece):
+        square = row * 8 + col
+        if self._mailbox[square] is not None:
+            self._take(square)
+        if piece is not None:
+            self._put(square, PIECE_CODES[(piece.get_color(), piece.get_type())])
+
+    def _lift(self, row, col):
+        square = row * 8 + col
+        if self._mailbox[square] is None:
+            return None
+        return _piece(self._take(square))
+
+    def _put(self, square, code):
+        bit = 1 << square
+        self._pieces[code] |= bit
+        self._occupancy[code >= 6] |= bit
+        self._mailbox[square] = code
+        self._pieces_hash ^= _PIECE_HASH[code][square]
+        self._midgame_score += _MIDGAME[code][square]
+        self._endgame_score += _ENDGAME[code][square]
+        self._phase += _PHASE[code]
+
+    def _take(self, square):
+        code = self._mailbox[square]
+        mask = ~(1 << square)
+        self._pieces[code] &= mask
+        self._occupancy[code >= 6] &= mask
+        self._mailbox[square] = None
+        self._pieces_hash ^= _PIECE_HASH[code][square]
+        self._midgame_score -= _MIDGAME[code][square]
+        self._endgame_score -= _ENDGAME[code][square]
+        self._phase -= _PHASE[code]
+        return code
+
+    def get_piece(self, row, col):
+        if not self._is_valid_position(row, col):
+            raise InvalidPositionException(f"Некорректная позиция: ({row}, {col})")
+        code = self._mailbox[row * 8 + col]
+        return None if code is None else _piece(code)
+
+    def get_piece_at(self, square):
+        code = self._mailbox[square]
+        return None if code is None else _piece(code)
+
+    def get_piece_type_at(self, square):
+        code = self._mailbox[square]
+        return None if code is None else _CODE_TYPES[code]
+
+    def is_empty(self, row, col):
+        if not self._is_valid_position(row, col):
+            raise InvalidPositionException(f"Некорректная позиция: ({row}, {col})")
+        return self._mailbox[row * 8 + col] is None
+
+    def get_bitboard(self, color, piece_type):
+        """Маска фигур указанного цвета и типа"""
+        return self._pieces[PIECE_CODES[(color, piece_type)]]
+
+    def get_occupancy(self, color=None):
+        """Маска занятых клеток (всех или одного цвета)"""
+        if color is None:
+            return self._occupancy[0] | self._occupancy[1]
+        return self._occupancy[color is not _WHITE]
+
+    def _can_capture_en_passant(self):
+        us = self.side_to_move is not _WHITE
+        target = self.en_passant_target
+        return bool(_PAWN_ATTACKS[us ^ 1][target[0] * 8 + target[1]] & self._pieces[us * 6 + PAWN])
+
+    def find_king(self, color):
+        kings = self._pieces[KING if color is _WHITE else 6 + KING]
+        if not kings:
+            return None
+        return SQUARE_POSITIONS[kings.bit_length() - 1]
+
+    def is_square_attacked(self, position, by_color):
+        return self._is_attacked(position[0] * 8 + position[1], by_color is not _WHITE,
+                                 self._occupancy[0] | self._occupancy[1])
+
+    def is_in_check(self, color):
+        us = color is not _WHITE
+        kings = self._pieces[us * 6 + KING]
+        if not kings:
+            return False
+        return self._is_attacked(kings.bit_length() - 1, us ^ 1, self._occupancy[0] | self._occupancy[1])
+
+    def _is_attacked(self, square, them, occupied):
+        # Обратный поиск: смотрим из атакуемой клетки ходами каждой фигуры
+        pieces = self._pieces
+        base = them * 6
+        if _PAWN_ATTACKS[them ^ 1][square] & pieces[base + PAWN] \
+                or KNIGHT_ATTACKS[square] & pieces[base + KNIGHT] \
+                or KING_ATTACKS[square] & pieces[base + KING]:
+            return True
+        queens = pieces[base + QUEEN]
+        rooks = pieces[base + ROOK] | queens
+        if rooks and (_RANK_ATTACKS[square][occupied & _RANK_MASKS[square]]
+                      | _FILE_ATTACKS[square][occupied & _FILE_MASKS[square]]) & rooks:
+            return True
+        bishops = pieces[base + BISHOP] | queens
+        if bishops and (_DIAGONAL_ATTACKS[square][occupied & _DIAGONAL_MASKS[square]]
+                        | _ANTI_DIAGONAL_ATTACKS[square][occupied & _ANTI_DIAGONAL_MASKS[square]]) & bishops:
+            return True
+        return False
+
+    def get_all_possible_moves(self, color):
+        return [MOVE_POSITIONS[code] for code in self.get_all_possible_move_codes(color)]
+
+    def get_legal_moves(self, color):
+        return [MOVE_POSITIONS[code] for code in self.get_legal_move_codes(color)]
+
+    def get_capture_moves(self, color):
+        return [MOVE_POSITIONS[code] for code in self.get_capture_move_codes(color)]
+
+    def get_all_possible_move_codes(self, color):
+        """Псевдолегальные ходы цвета в виде кодов (см. move.pack_move)"""
+        us = color is not _WHITE
+        pieces = self._pieces
+        base = us * 6
+        own = self._occupancy[us]
+        occupied = own | self._occupancy[us ^ 1]
+        moves = []
+
+        self._add_pawn_moves(moves, us, pieces[base + PAWN], FULL_MASK)
+        if self.en_passant_target:
+            target = self.en_passant_target
+            to_square = target[0] * 8 + target[1]
+            captured_square = to_square + 8 if us == 0 else to_square - 8
+            if pieces[(us ^ 1) * 6 + PAWN] >> captured_square & 1:
+                for from_square in iterate_squares(_PAWN_ATTACKS[us ^ 1][to_square] & pieces[base + PAWN]):
+                    moves.append(from_square << 6 | to_square)
+        for square in iterate_squares(pieces[base + KNIGHT]):
+            self._add_targets(moves, square, KNIGHT_ATTACKS[square] & ~own)
+        for square in iterate_squares(pieces[base + BISHOP]):
+            self._add_targets(moves, square, bishop_attacks(square, occupied) & ~own)
+        for square in iterate_squares(pieces[base + ROOK]):
+            self._add_targets(moves, square, rook_attacks(square, occupied) & ~own)
+        for square in iterate_squares(pieces[base + QUEEN]):
+            targets = rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+            self._add_targets(moves, square, targets & ~own)
+        for square in iterate_squares(pieces[base + KING]):
+            self._add_targets(moves, square, KING_ATTACKS[square] & ~own)
+            if not self._is_attacked(square, us ^ 1, occupied):
+                self._add_castling_moves(moves, us, square, occupied)
+        return moves
+
+    def get_legal_move_codes(self, color):
+        """Легальные ходы цвета в виде кодов.
+
+        Шахи и связки считаются по маскам один раз для позиции: при
+        двойном шахе ходит только король, при одиночном остальные фигуры
+        берут шахующую или закрываются, связанная фигура остается на
+        линии связки. Взятие на проходе проверяется маской занятых клеток
+        после хода, так как убирает с линии сразу две пешки.
+        """
+        us = color is not _WHITE
+        them = us ^ 1
+        pieces = self._pieces
+        base = us * 6
+        enemy_base = them * 6
+        kings = pieces[base + KING]
+        if not kings:
+            return self.get_all_possible_move_codes(color)
+
+        own = self._occupancy[us]
+        enemy = self._occupancy[them]
+        occupied = own | enemy
+        king_square = kings.bit_length() - 1
+        enemy_queens = pieces[enemy_base + QUEEN]
+        # Дальнобойные фигуры противника на общих с королем линиях
+        enemy_rooks = (pieces[enemy_base + ROOK] | enemy_queens) & _ROOK_LINES[king_square]
+        enemy_bishops = (pieces[enemy_base + BISHOP] | enemy_queens) & _BISHOP_LINES[king_square]
+
+        checkers = (_PAWN_ATTACKS[us][king_square] & pieces[enemy_base + PAWN]
+                    | KNIGHT_ATTACKS[king_square] & pieces[enemy_base + KNIGHT])
+        pinners = 0
+        if enemy_rooks:
+            checkers |= (_RANK_ATTACKS[king_square][occupied & _RANK_MASKS[king_square]]
+                         | _FILE_ATTACKS[king_square][occupied & _FILE_MASKS[king_square]]) & enemy_rooks
+            pinners = (_RANK_ATTACKS[king_square][enemy & _RANK_MASKS[king_square]]
+                       | _FILE_ATTACKS[king_square][enemy & _FILE_MASKS[king_square]]) & enemy_rooks
+        if enemy_bishops:
+            checkers |= (_DIAGONAL_ATTACKS[king_square][occupied & _DIAGONAL_MASKS[king_square]]
+                         | _ANTI_DIAGONAL_ATTACKS[king_square][occupied & _ANTI_DIAGONAL_MASKS[king_square]]) \
+                & enemy_bishops
+            pinners |= (_DIAGONAL_ATTACKS[king_square][enemy & _DIAGONAL_MASKS[king_square]]
+                        | _ANTI_DIAGONAL_ATTACKS[king_square][enemy & _ANTI_DIAGONAL_MASKS[king_square]]) \
+                & enemy_bishops
+
+        moves = []
+        move_codes = _MOVE_CODES
+
+        targets = KING_ATTACKS[king_square] & ~own
+        if targets:
+            # Поля под боем пешек, коней и короля противника отсекаются маской сразу,
+            # для дальнобойных фигур король снимается с доски, чтобы не заслонял луч
+            enemy_pawns = pieces[enemy_base + PAWN]
+            if us:
+                danger = ((enemy_pawns & ~COL_MASKS[0]) >> 9) | ((enemy_pawns & ~COL_MASKS[7]) >> 7)
+            else:
+                danger = ((enemy_pawns & ~COL_MASKS[0]) << 7) | ((enemy_pawns & ~COL_MASKS[7]) << 9)
+            enemy_king = pieces[enemy_base + KING]
+            if enemy_king:
+                danger |= KING_ATTACKS[enemy_king.bit_length() - 1]
+            enemy_knights = pieces[enemy_base + KNIGHT]
+            while enemy_knights:
+                bit = enemy_knights & -enemy_knights
+                enemy_knights ^= bit
+                danger |= KNIGHT_ATTACKS[bit.bit_length() - 1]
+            targets &= ~danger
+
+            all_rooks = pieces[enemy_base + ROOK] | enemy_queens
+            all_bishops = pieces[enemy_base + BISHOP] | enemy_queens
+            king_code = king_square << 6
+            without_king = occupied ^ kings
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                square = bit.bit_length() - 1
+                if all_rooks and (_RANK_ATTACKS[square][without_king & _RANK_MASKS[square]]
+                                  | _FILE_ATTACKS[square][without_king & _FILE_MASKS[square]]) & all_rooks:
+                    continue
+                if all_bishops and (_DIAGONAL_ATTACKS[square][without_king & _DIAGONAL_MASKS[square]]
+                                    | _ANTI_DIAGONAL_ATTACKS[square][without_king & _ANTI_DIAGONAL_MASKS[square]]) \
+                        & all_bishops:
+                    continue
+                moves.append(king_code | square)
+
+        if checkers & (checkers - 1):
+            # Двойной шах: ходит только король
+            return moves
+
+        # Связки: дальнобойные фигуры противника, от которых короля
+        # отделяет ровно одна своя фигура
+        pinned = 0
+        pinners &= ~checkers
+        while pinners:
+            bit = pinners & -pinners
+            pinners ^= bit
+            blockers = BETWEEN[king_square][bit.bit_length() - 1] & occupied
+            if blockers & own and not blockers & (blockers - 1):
+                pinned |= blockers
+
+        if checkers:
+            evasions = checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+        else:
+            evasions = FULL_MASK
+            if self.castling_rights & _CASTLING_MASKS[us]:
+                self._add_castling_moves(moves, us, king_square, occupied)
+        targets_mask = evasions & ~own
+
+        # Ходы фигур: маска целей превращается в коды поиском в словаре
+        free = ~pinned
+        movers = pieces[base + KNIGHT] & free
+        while movers:
+            bit = movers & -movers
+            movers ^= bit
+            square = bit.bit_length() - 1
+            targets = KNIGHT_ATTACKS[square] & targets_mask
+            if targets:
+                codes = move_codes.get(targets << 7 | square)
+                moves += codes if codes is not None else _move_codes(square, targets)
+        queens = pieces[base + QUEEN]
+        movers = (pieces[base + BISHOP] | queens) & free
+        while movers:
+            bit = movers & -movers
+            movers ^= bit
+            square = bit.bit_length() - 1
+            targets = (_DIAGONAL_ATTACKS[square][occupied & _DIAGONAL_MASKS[square]]
+                       | _ANTI_DIAGONAL_ATTACKS[square][occupied & _ANTI_DIAGONAL_MASKS[square]]) & targets_mask
+            if targets:
+                codes = move_codes.get(targets << 7 | square)
+                moves += codes if codes is not None else _move_codes(square, targets)
+        movers = (pieces[base + ROOK] | queens) & free
+        while movers:
+            bit = movers & -movers
+            movers ^= bit
+            square = bit.bit_length() - 1
+            targets = (_RANK_ATTACKS[square][occupied & _RANK_MASKS[square]]
+                       | _FILE_ATTACKS[square][occupied & _FILE_MASKS[square]]) & targets_mask
+            if targets:
+                codes = move_codes.get(targets << 7 | square)
+                moves += codes if codes is not None else _move_codes(square, targets)
+
+        pawns = pieces[base + PAWN]
+        if pinned:
+            # Связанная фигура ходит только вдоль линии от короля через нее, конь - никак
+            mailbox = self._mailbox
+            for square in iterate_squares(pinned):
+                line = _LINE_THROUGH[king_square][square]
+                piece_type = mailbox[square] - base
+                if piece_type == PAWN:
+                    self._add_pawn_moves(moves, us, 1 << square, evasions & line)
+                    continue
+                if piece_type == BISHOP or piece_type == QUEEN:
+                    self._add_targets(moves, square, bishop_attacks(square, occupied) & targets_mask & line)
+                if piece_type == ROOK or piece_type == QUEEN:
+                    self._add_targets(moves, square, rook_attacks(square, occupied) & targets_mask & line)
+        if pawns:
+            # Ходы пешек - сдвигом всей маски (то же, что _add_pawn_moves, без вызова)
+            movers = pawns & free
+            empty = ~occupied
+            if us:
+                single = (movers << 8) & empty
+                double = ((single & ROW_MASKS[2]) << 8) & empty & evasions
+                left = ((movers & ~COL_MASKS[0]) << 7) & enemy & evasions
+                right = ((movers & ~COL_MASKS[7]) << 9) & enemy & evasions
+                step = -8
+            else:
+                single = (movers >> 8) & empty
+                double = ((single & ROW_MASKS[5]) >> 8) & empty & evasions
+                left = ((movers & ~COL_MASKS[0]) >> 9) & enemy & evasions
+                right = ((movers & ~COL_MASKS[7]) >> 7) & enemy & evasions
+                step = 8
+            single &= evasions
+            for targets, shift in ((single, step), (double, 2 * step), (left, step + 1), (right, step - 1)):
+                if targets:
+                    codes = move_codes.get(targets << 7 | (96 + shift))
+                    moves += codes if codes is not None else _shift_codes(targets, shift)
+            if self.en_passant_target:
+                self._add_en_passant(moves, us, pawns, king_square, occupied)
+        return moves
+
+    def get_capture_move_codes(self, color):
+        """Взятия цвета (псевдолегальные, включая взятие на проходе) в виде кодов"""
+        us = color is not _WHITE
+        pieces = self._pieces
+        base = us * 6
+        enemy = self._occupancy[us ^ 1]
+        occupied = self._occupancy[us] | enemy
+        moves = []
+
+        pawn_targets = enemy
+        if self.en_passant_target:
+            target = self.en_passant_target
+            pawn_targets |= 1 << (target[0] * 8 + target[1])
+        attacks = _PAWN_ATTACKS[us]
+        for square in iterate_squares(pieces[base + PAWN]):
+            self._add_targets(moves, square, attacks[square] & pawn_targets)
+        for square in iterate_squares(pieces[base + KNIGHT]):
+            self._add_targets(moves, square, KNIGHT_ATTACKS[square] & enemy)
+        queens = pieces[base + QUEEN]
+        for square in iterate_squares(pieces[base + BISHOP] | queens):
+            self._add_targets(moves, square, bishop_attacks(square, occupied) & enemy)
+        for square in iterate_squares(pieces[base + ROOK] | queens):
+            self._add_targets(moves, square, rook_attacks(square, occupied) & enemy)
+        for square in iterate_squares(pieces[base + KING]):
+            self._add_targets(moves, square, KING_ATTACKS[square] & enemy)
+        return moves
+
+    @staticmethod
+    def _add_targets(moves, from_square, targets):
+        from_code = from_square << 6
+        append = moves.append
+        while targets:
+            low_bit = targets & -targets
+            append(from_code | (low_bit.bit_length() - 1))
+            targets ^= low_bit
+
+    def _add_pawn_moves(self, moves, us, pawns, allowed):
+        """Ходы и взятия пешек (без взятия на проходе) на клетки из маски allowed"""
+        if not pawns:
+            return
+        enemy = self._occupancy[us ^ 1]
+        empty = ~(self._occupancy[us] | enemy)
+
+        # Ходы считаем сдвигом всей маски пешек сразу
+        if us:
+            single = (pawns << 8) & empty
+            double = ((single & ROW_MASKS[2]) << 8) & empty & allowed
+            left = ((pawns & ~COL_MASKS[0]) << 7) & enemy & allowed
+            right = ((pawns & ~COL_MASKS[7]) << 9) & enemy & allowed
+            step, left_step, right_step = -8, -7, -9
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & ROW_MASKS[5]) >> 8) & empty & allowed
+            left = ((pawns & ~COL_MASKS[0]) >> 9) & enemy & allowed
+            right = ((pawns & ~COL_MASKS[7]) >> 7) & enemy & allowed
+            step, left_step, right_step = 8, 9, 7
+        single &= allowed
+
+        if single:
+            moves += _shift_codes(single, step)
+        if double:
+            moves += _shift_codes(double, 2 * step)
+        if left:
+            moves += _shift_codes(left, left_step)
+        if right:
+            moves += _shift_codes(right, right_step)
+
+    def _add_en_passant(self, moves, us, pawns, king_square, occupied):
+        """Легальные взятия на проходе: шах проверяется по маскам после хода"""
+        target = self.en_passant_target
+        to_square = target[0] * 8 + target[1]
+        captured_square = to_square + 8 if us == 0 else to_square - 8
+        captured_bit = 1 << captured_square
+        pieces = self._pieces
+        enemy_base = (us ^ 1) * 6
+        if not pieces[enemy_base + PAWN] & captured_bit:
+            return
+        enemy_queens = pieces[enemy_base + QUEEN]
+        enemy_rooks = pieces[enemy_base + ROOK] | enemy_queens
+        enemy_bishops = pieces[enemy_base + BISHOP] | enemy_queens
+        steppers = (_PAWN_ATTACKS[us][king_square] & pieces[enemy_base + PAWN] & ~captured_bit
+                    | KNIGHT_ATTACKS[king_square] & pieces[enemy_base + KNIGHT])
+
+        for from_square in iterate_squares(_PAWN_ATTACKS[us ^ 1][to_square] & pawns):
+            after = occupied ^ (1 << from_square) ^ captured_bit | (1 << to_square)
+            if steppers or rook_attacks(king_square, after) & enemy_rooks \
+                    or bishop_attacks(king_square, after) & enemy_bishops:
+                continue
+            moves.append(from_square << 6 | to_square)
+
+    def _add_castling_moves(self, moves, us, king_square, occupied):
+        """Рокировки, если король не под шахом (проверяет вызывающий)"""
+        row_offset = 56 if us == 0 else 0
+        if king_square != row_offset + 4:
+            return
+        rights = self.castling_rights >> (2 * us)
+        rooks = self._pieces[us * 6 + ROOK]
+        them = us ^ 1
+
+        # Королевская: f и g пусты, ладья на h, f и g не под боем
+        if rights & 1 and not occupied & (0b11 << (row_offset + 5)) and rooks >> (row_offset + 7) & 1:
+            if not self._is_attacked(row_offset + 5, them, occupied) \
+                    and not self._is_attacked(row_offset + 6, them, occupied):
+                moves.append(king_square << 6 | (row_offset + 6))
+
+        # Ферзевая: b, c и d пусты, ладья на a, c и d не под боем
+        if rights & 2 and not occupied & (0b111 << (row_offset + 1)) and rooks >> row_offset & 1:
+            if not self._is_attacked(row_offset + 3, them, occupied) \
+                    and not self._is_attacked(row_offset + 2, them, occupied):
+                moves.append(king_square << 6 | (row_offset + 2))
+
+    def make_move(self, from_pos, to_pos, promotion_piece=None):
+        """Сделать ход на месте и вернуть запись для unmake_move.
+
+        Ход не проверяется на корректность. Маски и клетки меняются в
+        копиях, прежние списки уходят в запись отмены.
+        """
+        from_square = from_pos[0] * 8 + from_pos[1]
+        to_square = to_pos[0] * 8 + to_pos[1]
+        old_mailbox = self._mailbox
+        moved = old_mailbox[from_square]
+        captured = old_mailbox[to_square]
+        pieces_hash = self._pieces_hash
+        midgame = self._midgame_score
+        endgame = self._endgame_score
+        phase = self._phase
+        undo = BitUndoInfo(self._pieces, self._occupancy, old_mailbox, self.en_passant_target,
+                           self.castling_rights, pieces_hash, midgame, endgame, phase, moved, captured)
+
+        pieces = self._pieces = self._pieces[:]
+        occupancy = self._occupancy = self._occupancy[:]
+        mailbox = self._mailbox = old_mailbox[:]
+        us = moved >= 6
+        them = us ^ 1
+        from_bit = 1 << from_square
+        to_bit = 1 << to_square
+
+        if captured is not None:
+            pieces[captured] ^= to_bit
+            occupancy[them] ^= to_bit
+            pieces_hash ^= _PIECE_HASH[captured][to_square]
+            midgame -= _MIDGAME[captured][to_square]
+            endgame -= _ENDGAME[captured][to_square]
+            phase -= _PHASE[captured]
+
+        placed = moved
+        piece_type = moved - 6 * us
+        self.en_passant_target = None
+        if piece_type == PAWN:
+            if captured is None and (from_square ^ to_square) & 7:
+                # Взятие на проходе: побитая пешка стоит рядом, а не на клетке хода
+                captured_square = (from_square & 56) | (to_square & 7)
+                captured = mailbox[captured_square]
+                if captured is not None:
+                    undo.captured_code = captured
+                    captured_bit = 1 << captured_square
+                    pieces[captured] ^= captured_bit
+                    occupancy[them] ^= captured_bit
+                    mailbox[captured_square] = None
+                    pieces_hash ^= _PIECE_HASH[captured][captured_square]
+                    midgame -= _MIDGAME[captured][captured_square]
+                    endgame -= _ENDGAME[captured][captured_square]
+                    phase -= _PHASE[captured]
+            elif to_square - from_square in (16, -16):
+                self.en_passant_target = SQUARE_POSITIONS[(from_square + to_square) >> 1]
+            if to_square < 8 or to_square >= 56:
+                placed = 6 * us + _TYPE_INDEX[promotion_piece or PieceType.QUEEN]
+                undo.promoted_code = placed
+                phase += _PHASE[placed]
+        elif piece_type == KING and to_square - from_square in (2, -2):
+            if to_square > from_square:
+                rook_from, rook_to = from_square + 3, from_square + 1
+            else:
+                rook_from, rook_to = from_square - 4, from_square - 1
+            rook = moved - KING + ROOK
+            rook_bits = (1 << rook_from) | (1 << rook_to)
+            pieces[rook] ^= rook_bits
+            occupancy[us] ^= rook_bits
+            mailbox[rook_from] = None
+            mailbox[rook_to] = rook
+            pieces_hash ^= _PIECE_HASH[rook][rook_from] ^ _PIECE_HASH[rook][rook_to]
+            midgame += _MIDGAME[rook][rook_to] - _MIDGAME[rook][rook_from]
+            endgame += _ENDGAME[rook][rook_to] - _ENDGAME[rook][rook_from]
+
+        pieces[moved] ^= from_bit
+        pieces[placed] ^= to_bit
+        occupancy[us] ^= from_bit | to_bit
+        mailbox[from_square] = None
+        mailbox[to_square] = placed
+        self._pieces_hash = pieces_hash ^ _PIECE_HASH[moved][from_square] ^ _PIECE_HASH[placed][to_square]
+        self._midgame_score = midgame - _MIDGAME[moved][from_square] + _MIDGAME[placed][to_square]
+        self._endgame_score = endgame - _ENDGAME[moved][from_square] + _ENDGAME[placed][to_square]
+        self._phase = phase
+
+        if self.castling_rights:
+            self.castling_rights &= _CASTLING_KEEP_SQUARES[from_square] & _CASTLING_KEEP_SQUARES[to_square]
+        self.side_to_move = _COLORS[them]
+        return undo
+
+    def unmake_move(self, undo):
+        """Отменить ход по записи, полученной из make_move"""
+        self._pieces = undo.pieces
+        self._occupancy = undo.occupancy
+        self._mailbox = undo.mailbox
+        self.en_passant_target = undo.en_passant_target
+        self.castling_rights = undo.castling_rights
+        self._pieces_hash = undo.pieces_hash
+        self._midgame_score = undo.midgame_score
+        self._endgame_score = undo.endgame_score
+        self._phase = undo.phase
+        self.side_to_move = _CODE_COLORS[undo.moved]
+
+    def clone(self):
+        """Создать копию доски"""
+        new_board = self.__class__(setup=False)
+        new_board._pieces = self._pieces[:]
+        new_board._occupancy = self._occupancy[:]
+        new_board._mailbox = self._mailbox[:]
+        new_board.en_passant_target = self.en_passant_target
+        new_board.castling_rights = self.castling_rights
+        new_board.side_to_move = self.side_to_move
+        new_board._pieces_hash = self._pieces_hash
+        new_board._midgame_score = self._midgame_score
+        new_board._endgame_score = self._endgame_score
+        new_board._phase = self._phase
+        return new_board
@@ -2,33 +2,248 @@
 Шахматная доска
 """
 
+import sys
 from piece import Pawn, Knight, Bishop, Rook, Queen, King
+from move import pack_move
 from enums import PieceColor, PieceType
-from exceptions import InvalidPositionException
+from utils import notation_to_position, position_to_notation
+from exceptions import InvalidPositionException, InvalidNotationException
+from zobrist import PIECE_KEYS, CASTLING_KEYS, EN_PASSANT_KEYS, SIDE_KEY
+from evaluation import MIDGAME_SCORES, ENDGAME_SCORES, PHASE_WEIGHTS, tapered_score
+
+
+# Права на рокировку хранятся битовой маской
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING_RIGHTS = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+
+# Какие права остаются, если ход начинается или заканчивается на клетке
+_CASTLING_KEEP = [[ALL_CASTLING_RIGHTS] * 8 for _ in range(8)]
+_CASTLING_KEEP[7][4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+_CASTLING_KEEP[7][7] &= ~WHITE_KINGSIDE
+_CASTLING_KEEP[7][0] &= ~WHITE_QUEENSIDE
+_CASTLING_KEEP[0][4] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+_CASTLING_KEEP[0][7] &= ~BLACK_KINGSIDE
+_CASTLING_KEEP[0][0] &= ~BLACK_QUEENSIDE
+
+FEN_PIECE_CLASSES = {
+    'p': Pawn,
+    'n': Knight,
+    'b': Bishop,
+    'r': Rook,
+    'q': Queen,
+    'k': King
+}
+
+_FEN_LETTERS = {
+    PieceType.PAWN: 'p',
+    PieceType.KNIGHT: 'n',
+    PieceType.BISHOP: 'b',
+    PieceType.ROOK: 'r',
+    PieceType.QUEEN: 'q',
+    PieceType.KING: 'k'
+}
+
+_INITIAL_BACK_RANK = [PieceType.ROOK, PieceType.KNIGHT, PieceType.BISHOP, PieceType.QUEEN,
+                      PieceType.KING, PieceType.BISHOP, PieceType.KNIGHT, PieceType.ROOK]
+
+_FEN_CASTLING = {
+    'K': WHITE_KINGSIDE,
+    'Q': WHITE_QUEENSIDE,
+    'k': BLACK_KINGSIDE,
+    'q': BLACK_QUEENSIDE
+}
+
+KNIGHT_OFFSETS = [
+    (-2, -1), (-2, 1), (-1, -2), (-1, 2),
+    (1, -2), (1, 2), (2, -1), (2, 1)
+]
+
+KING_OFFSETS = [
+    (-1, -1), (-1, 0), (-1, 1),
+    (0, -1), (0, 1),
+    (1, -1), (1, 0), (1, 1)
+]
+
+_ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+_BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+def _build_targets(offsets):
+    """Для каждой клетки - список клеток на заданных смещениях в пределах доски"""
+    return [[[(row + dr, col + dc) for dr, dc in offsets if 0 <= row + dr < 8 and 0 <= col + dc < 8]
+             for col in range(8)] for row in range(8)]
+
+
+def _build_rays(directions):
+    """Для каждой клетки - лучи (списки клеток от ближней к дальней) по направлениям"""
+    rays = [[[] for _ in range(8)] for _ in range(8)]
+    for row in range(8):
+        for col in range(8):
+            for dr, dc in directions:
+                ray = []
+                new_row, new_col = row + dr, col + dc
+                while 0 <= new_row < 8 and 0 <= new_col < 8:
+                    ray.append((new_row, new_col))
+                    new_row += dr
+                    new_col += dc
+                if ray:
+                    rays[row][col].append(ray)
+    return rays
+
+
+# Таблицы для обратного поиска атак: смотрим из атакуемой клетки
+_KNIGHT_TARGETS = _build_targets(KNIGHT_OFFSETS)
+_KING_TARGETS = _build_targets(KING_OFFSETS)
+_ROOK_RAYS = _build_rays(_ROOK_DIRECTIONS)
+_BISHOP_RAYS = _build_rays(_BISHOP_DIRECTIONS)
+
+PROMOTION_CLASSES = {
+    PieceType.QUEEN: Queen,
+    PieceType.ROOK: Rook,
+    PieceType.BISHOP: Bishop,
+    PieceType.KNIGHT: Knight
+}
+
+
+class UndoInfo:
+    """Все, что нужно для отмены хода, сделанного Board.make_move"""
+
+    __slots__ = ('from_pos', 'to_pos', 'piece', 'captured_piece', 'captured_pos',
+                 'en_passant_target', 'castling_rights', 'had_moved', 'rook_cols', 'promoted')
+
+    def __init__(self, from_pos, to_pos, piece, captured_piece, en_passant_target,
+                 castling_rights, had_moved):
+        self.from_pos = from_pos
+        self.to_pos = to_pos
+        self.piece = piece
+        self.captured_piece = captured_piece
+        self.captured_pos = to_pos
+        self.en_passant_target = en_passant_target
+        self.castling_rights = castling_rights
+        self.had_moved = had_moved
+        self.rook_cols = None
+        self.promoted = None
 
 
 class Board:
     """Шахматная доска 8x8"""
 
-    def __init__(self):
+    def __init__(self, setup=True):
         self._board = [[None for _ in range(8)] for _ in range(8)]
         self._captured_pieces = {PieceColor.WHITE: [], PieceColor.BLACK: []}
         self.en_passant_target = None
-        self._initialize_board()
+        self.castling_rights = 0
+        self.side_to_move = PieceColor.WHITE
+        # Хеш расстановки, позиции королей и слагаемые оценки обновляются в _place/_lift
+        self._pieces_hash = 0
+        self._king_positions = {PieceColor.WHITE: None, PieceColor.BLACK: None}
+        self._midgame_score = 0
+        self._endgame_score = 0
+        self._phase = 0
+        if setup:
+            self._initialize_board()
+            self.castling_rights = ALL_CASTLING_RIGHTS
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Создать доску по FEN (расстановка, очередь хода, рокировки, взятие на проходе)"""
+        fields = fen.split()
+        if len(fields) < 4:
+            raise InvalidNotationException(f"Некорректный FEN: {fen}")
+        placement, side, castling, en_passant = fields[:4]
+
+        board = cls(setup=False)
+        rows = placement.split('/')
+        if len(rows) != 8:
+            raise InvalidNotationException(f"Некорректная расстановка в FEN: {placement}")
+
+        for row, row_data in enumerate(rows):
+            col = 0
+            for char in row_data:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                piece_class = FEN_PIECE_CLASSES.get(char.lower())
+                if not piece_class or col > 7:
+                    raise InvalidNotationException(f"Некорректная расстановка в FEN: {placement}")
+                color = PieceColor.WHITE if char.isupper() else PieceColor.BLACK
+                piece = piece_class(color)
+                # Фигуры не на исходных полях считаем уже ходившими
+                if not cls._is_initial_square(piece, row, col):
+                    piece.set_moved()
+                board._place(row, col, piece)
+                col += 1
+            if col != 8:
+                raise InvalidNotationException(f"Некорректная расстановка в FEN: {placement}")
+
+        if side not in ('w', 'b'):
+            raise InvalidNotationException(f"Некорректная очередь хода в FEN: {side}")
+        board.side_to_move = PieceColor.WHITE if side == 'w' else PieceColor.BLACK
+
+        if castling != '-':
+            for char in castling:
+                if char not in _FEN_CASTLING:
+                    raise InvalidNotationException(f"Некорректные права рокировки в FEN: {castling}")
+                board.castling_rights |= _FEN_CASTLING[char]
+
+        if en_passant != '-':
+            target = notation_to_position(en_passant)
+            if target is None:
+                raise InvalidNotationException(f"Некорректное поле взятия на проходе в FEN: {en_passant}")
+            board.en_passant_target = target
+
+        return board
+
+    def to_fen(self, halfmove_clock=0, fullmove_number=1):
+        """Записать позицию в FEN (счетчики ходов хранит партия)"""
+        rows = []
+        for row in range(8):
+            row_data = ""
+            empty = 0
+            for col in range(8):
+                piece = self.get_piece(row, col)
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row_data += str(empty)
+                    empty = 0
+                letter = _FEN_LETTERS[piece.get_type()]
+                row_data += letter.upper() if piece.get_color() == PieceColor.WHITE else letter
+            if empty:
+                row_data += str(empty)
+            rows.append(row_data)
+
+        side = 'w' if self.side_to_move == PieceColor.WHITE else 'b'
+        castling = "".join(char for char, right in _FEN_CASTLING.items() if self.castling_rights & right) or '-'
+        en_passant = position_to_notation(self.en_passant_target) if self.en_passant_target else '-'
+
+        return f"{'/'.join(rows)} {side} {castling} {en_passant} {halfmove_clock} {fullmove_number}"
+
+    @staticmethod
+    def _is_initial_square(piece, row, col):
+        """Стоит ли фигура на своем поле из начальной расстановки"""
+        white = piece.get_color() == PieceColor.WHITE
+        if piece.get_type() == PieceType.PAWN:
+            return row == (6 if white else 1)
+        return row == (7 if white else 0) and _INITIAL_BACK_RANK[col] == piece.get_type()
 
     def _initialize_board(self):
         """Начальная расстановка фигур"""
         # Пешки
         for col in range(8):
-            self._board[1][col] = Pawn(PieceColor.BLACK)
-            self._board[6][col] = Pawn(PieceColor.WHITE)
+            self._place(1, col, Pawn(PieceColor.BLACK))
+            self._place(6, col, Pawn(PieceColor.WHITE))
 
         # Остальные фигуры
         piece_order = [Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook]
 
         for col, piece_class in enumerate(piece_order):
-            self._board[0][col] = piece_class(PieceColor.BLACK)
-            self._board[7][col] = piece_class(PieceColor.WHITE)
+            self._place(0, col, piece_class(PieceColor.BLACK))
+            self._place(7, col, piece_class(PieceColor.WHITE))
 
     def get_piece(self, row, col):
         """Получить фигуру на позиции"""
@@ -36,18 +251,91 @@ class Board:
             raise InvalidPositionException(f"Некорректная позиция: ({row}, {col})")
         return self._board[row][col]
 
+    def get_piece_at(self, square):
+        """Фигура на клетке row * 8 + col (без проверки границ, для поиска)"""
+        return self._board[square >> 3][square & 7]
+
+    def get_piece_type_at(self, square):
+        """Тип фигуры на клетке row * 8 + col или None (без проверки границ, для поиска)"""
+        piece = self._board[square >> 3][square & 7]
+        return piece.get_type() if piece is not None else None
+
     def set_piece(self, row, col, piece):
         """Установить фигуру на позицию"""
         if not self._is_valid_position(row, col):
             raise InvalidPositionException(f"Некорректная позиция: ({row}, {col})")
-        self._board[row][col] = piece
+        self._place(row, col, piece)
 
     def remove_piece(self, row, col):
         """Убрать фигуру с позиции"""
-        piece = self.get_piece(row, col)
-        self._board[row][col] = None
+        if not self._is_valid_position(row, col):
+            raise InvalidPositionException(f"Некорректная позиция: ({row}, {col})")
+        return self._lift(row, col)
+
+    def _place(self, row, col, piece):
+        """Поставить фигуру без проверок (точка расширения для наследников)"""
+        if self._board[row][col] is not None:
+            # Наследники сами снимают старую фигуру в своем _place
+            Board._lift(self, row, col)
+        if piece is not None:
+            self._board[row][col] = piece
+            color, piece_type, square = piece.get_color(), piece.get_type(), row * 8 + col
+            self._pieces_hash ^= PIECE_KEYS[color][piece_type][square]
+            self._midgame_score += MIDGAME_SCORES[color][piece_type][square]
+            self._endgame_score += ENDGAME_SCORES[color][piece_type][square]
+            self._phase += PHASE_WEIGHTS[piece_type]
+            if piece_type == PieceType.KING:
+                self._king_positions[color] = (row, col)
+
+    def _lift(self, row, col):
+        """Снять фигуру без проверок (точка расширения для наследников)"""
+        piece = self._board[row][col]
+        if piece is not None:
+            color, piece_type, square = piece.get_color(), piece.get_type(), row * 8 + col
+            self._pieces_hash ^= PIECE_KEYS[color][piece_type][square]
+            self._midgame_score -= MIDGAME_SCORES[color][piece_type][square]
+            self._endgame_score -= ENDGAME_SCORES[color][piece_type][square]
+            self._phase -= PHASE_WEIGHTS[piece_type]
+            if piece_type == PieceType.KING:
+                self._king_positions[color] = None
+            self._board[row][col] = None
         return piece
 
+    def get_evaluation(self, color):
+        """Оценка позиции в сантипешках с точки зрения цвета.
+
+        Материал и таблицы полей суммируются при каждой перестановке
+        фигур, поэтому оценка не требует обхода доски.
+        """
+        score = tapered_score(self._midgame_score, self._endgame_score, self._phase)
+        return score if color == PieceColor.WHITE else -score
+
+    def get_hash(self):
+        """Ключ Зобриста текущей позиции.
+
+        Расстановка фигур хешируется инкрементально, а очередь хода,
+        права на рокировку и взятие на проходе добавляются при запросе.
+        Поле для взятия на проходе учитывается, только если взятие
+        действительно возможно, чтобы повторения позиций совпадали.
+        """
+        key = self._pieces_hash ^ CASTLING_KEYS[self.castling_rights]
+        if self.side_to_move == PieceColor.BLACK:
+            key ^= SIDE_KEY
+        if self.en_passant_target and self._can_capture_en_passant():
+            key ^= EN_PASSANT_KEYS[self.en_passant_target[1]]
+        return key
+
+    def _can_capture_en_passant(self):
+        target_row, target_col = self.en_passant_target
+        pawn_row = target_row + 1 if self.side_to_move == PieceColor.WHITE else target_row - 1
+        for col in (target_col - 1, target_col + 1):
+            if 0 <= col < 8:
+                piece = self._board[pawn_row][col]
+                if piece is not None and piece.get_type() == PieceType.PAWN \
+                        and piece.get_color() == self.side_to_move:
+                    return True
+        return False
+
     def is_empty(self, row, col):
         """Проверка, пуста ли клетка"""
         return self.get_piece(row, col) is None
@@ -58,32 +346,46 @@ class Board:
 
     def find_king(self, color):
         """Найти короля указанного цвета"""
-        for row in range(8):
-            for col in range(8):
-                piece = self._board[row][col]
-                if piece and piece.get_type() == PieceType.KING and piece.get_color() == color:
-                    return (row, col)
-        return None
+        return self._king_positions[color]
 
     def is_square_attacked(self, position, by_color):
-        """Проверка, атакована ли клетка фигурами указанного цвета"""
-        for row in range(8):
-            for col in range(8):
-                piece = self._board[row][col]
-                if piece and piece.get_color() == by_color:
-                    if piece.get_type() == PieceType.KING:
-                        # Для короля проверяем только соседние клетки
-                        king_moves = [
-                            (row - 1, col - 1), (row - 1, col), (row - 1, col + 1),
-                            (row, col - 1), (row, col + 1),
-                            (row + 1, col - 1), (row + 1, col), (row + 1, col + 1)
-                        ]
-                        if position in king_moves:
-                            return True
-                    else:
-                        possible_moves = piece.get_possible_moves(self, (row, col))
-                        if position in possible_moves:
-                            return True
+        """Проверка, атакована ли клетка фигурами указанного цвета.
+
+        Поиск обратный: из самой клетки проверяем поля, с которых ее
+        могли бы бить пешка, конь и король, и лучи до первой фигуры.
+        """
+        row, col = position
+        board = self._board
+
+        # Белая пешка бьет вверх (к ряду 0), поэтому стоит на ряд ниже клетки
+        pawn_row = row + 1 if by_color == PieceColor.WHITE else row - 1
+        if 0 <= pawn_row < 8:
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8:
+                    piece = board[pawn_row][pawn_col]
+                    if piece is not None and piece.get_type() == PieceType.PAWN and piece.get_color() == by_color:
+                        return True
+
+        for target_row, target_col in _KNIGHT_TARGETS[row][col]:
+            piece = board[target_row][target_col]
+            if piece is not None and piece.get_type() == PieceType.KNIGHT and piece.get_color() == by_color:
+                return True
+
+        for target_row, target_col in _KING_TARGETS[row][col]:
+            piece = board[target_row][target_col]
+            if piece is not None and piece.get_type() == PieceType.KING and piece.get_color() == by_color:
+                return True
+
+        for rays, attacker_type in ((_ROOK_RAYS, PieceType.ROOK), (_BISHOP_RAYS, PieceType.BISHOP)):
+            for ray in rays[row][col]:
+                for target_row, target_col in ray:
+                    piece = board[target_row][target_col]
+                    if piece is None:
+                        continue
+                    if piece.get_color() == by_color and piece.get_type() in (attacker_type, PieceType.QUEEN):
+                        return True
+                    break
+
         return False
 
     def is_in_check(self, color):
@@ -105,39 +407,256 @@ class Board:
                         moves.append(((row, col), move))
         return moves
 
+    def get_legal_moves(self, color):
+        """Получить только легальные ходы цвета.
+
+        Шахи и связки считаются один раз для позиции, после чего ходы
+        отбираются без пробного выполнения: при двойном шахе ходит только
+        король, при одиночном - ход должен взять шахующую фигуру или
+        закрыться, связанная фигура остается на линии связки. Король не
+        может встать на битое поле. Пробным ходом проверяется лишь взятие
+        на проходе, которое убирает с линии сразу две пешки.
+        """
+        moves = self.get_all_possible_moves(color)
+        king_pos = self._king_positions[color]
+        if king_pos is None:
+            return moves
+
+        checkers, evasions, pins = self._find_checks_and_pins(king_pos, color)
+        opponent = color.opposite()
+        board = self._board
+        king_row, king_col = king_pos
+        king = board[king_row][king_col]
+        legal_moves = []
+
+        for move in moves:
+            from_pos, to_pos = move
+            if from_pos == king_pos:
+                # Убираем короля, чтобы он не заслонял от дальнобойной фигуры поле за собой
+                board[king_row][king_col] = None
+                attacked = self.is_square_attacked(to_pos, opponent)
+                board[king_row][king_col] = king
+                if not attacked:
+                    legal_moves.append(move)
+                continue
+
+            if checkers > 1:
+                continue
+
+            from_row, from_col = from_pos
+            to_row, to_col = to_pos
+            if from_col != to_col and board[to_row][to_col] is None \
+                    and board[from_row][from_col].get_type() == PieceType.PAWN:
+                undo = self.make_move(from_pos, to_pos)
+                in_check = self.is_in_check(color)
+                self.unmake_move(undo)
+                if not in_check:
+                    legal_moves.append(move)
+                continue
+
+            if from_pos in pins and to_pos not in pins[from_pos]:
+                continue
+            if checkers and to_pos not in evasions:
+                continue
+            legal_moves.append(move)
+
+        return legal_moves
+
+    def _find_checks_and_pins(self, king_pos, color):
+        """Шахи и связки для короля цвета.
+
+        Возвращает число шахующих фигур, клетки, на которые можно пойти,
+        чтобы взять шахующую фигуру или закрыться от нее, и словарь
+        связанных фигур: клетка фигуры -> клетки линии связки.
+        """
+        row, col = king_pos
+        board = self._board
+        opponent = color.opposite()
+        checkers = 0
+        evasions = set()
+        pins = {}
+
+        pawn_row = row + 1 if opponent == PieceColor.WHITE else row - 1
+        if 0 <= pawn_row < 8:
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8:
+                    piece = board[pawn_row][pawn_col]
+                    if piece is not None and piece.get_type() == PieceType.PAWN and piece.get_color() == opponent:
+                        checkers += 1
+                        evasions.add((pawn_row, pawn_col))
+
+        for target_row, target_col in _KNIGHT_TARGETS[row][col]:
+            piece = board[target_row][target_col]
+            if piece is not None and piece.get_type() == PieceType.KNIGHT and piece.get_color() == opponent:
+                checkers += 1
+                evasions.add((target_row, target_col))
+
+        for rays, attacker_type in ((_ROOK_RAYS, PieceType.ROOK), (_BISHOP_RAYS, PieceType.BISHOP)):
+            for ray in rays[row][col]:
+                blocker = None
+                for index, (target_row, target_col) in enumerate(ray):
+                    piece = board[target_row][target_col]
+                    if piece is None:
+                        continue
+                    if piece.get_color() == color:
+                        if blocker is not None:
+                            break
+                        blocker = (target_row, target_col)
+                        continue
+                    if piece.get_type() in (attacker_type, PieceType.QUEEN):
+                        if blocker is None:
+                            checkers += 1
+                            evasions.update(ray[:index + 1])
+                        else:
+                            pins[blocker] = set(ray[:index + 1])
+                    break
+
+        return checkers, evasions, pins
+
+    def get_capture_moves(self, color):
+        """Получить все возможные взятия для цвета (включая взятие на проходе)"""
+        captures = []
+        for from_pos, to_pos in self.get_all_possible_moves(color):
+            if self._board[to_pos[0]][to_pos[1]] is not None:
+                captures.append((from_pos, to_pos))
+            elif to_pos == self.en_passant_target and from_pos[1] != to_pos[1] \
+                    and self._board[from_pos[0]][from_pos[1]].get_type() == PieceType.PAWN:
+                captures.append((from_pos, to_pos))
+        return captures
+
+    def get_legal_move_codes(self, color):
+        """Легальные ходы цвета в виде кодов (см. move.pack_move)"""
+        return [pack_move(move) for move in self.get_legal_moves(color)]
+
+    def get_capture_move_codes(self, color):
+        """Взятия цвета в виде кодов"""
+        return [pack_move(move) for move in self.get_capture_moves(color)]
+
     def capture_piece(self, piece):
         """Добавить фигуру в список захваченных"""
         self._captured_pieces[piece.get_color()].append(piece)
 
+    def release_captured_piece(self, piece):
+        """Убрать фигуру из списка захваченных (при отмене хода)"""
+        self._captured_pieces[piece.get_color()].remove(piece)
+
     def get_captured_pieces(self, color):
         """Получить захваченные фигуры"""
         return self._captured_pieces[color]
 
-    def display(self):
-        """Отобразить доску"""
-        print("\n    a  b  c  d  e  f  g  h")
-        print("  ┌─────────────────────────┐")
-
+    def render_lines(self):
+        """Строки изображения доски (без перевода строки в конце)"""
+        lines = ["", "    a  b  c  d  e  f  g  h", "  ┌─────────────────────────┐"]
         for row in range(8):
-            print(f"{8 - row} │", end="")
+            cells = []
             for col in range(8):
-                piece = self._board[row][col]
+                piece = self.get_piece(row, col)
                 if piece:
-                    print(f" {piece.get_symbol()} ", end="")
-                else:
+                    cells.append(f" {piece.get_symbol()} ")
+                elif (row + col) % 2 == 0:
                     # Шахматная раскраска
-                    if (row + col) % 2 == 0:
-                        print(" · ", end="")
-                    else:
-                        print("   ", end="")
-            print(f"│ {8 - row}")
+                    cells.append(" · ")
+                else:
+                    cells.append("   ")
+            lines.append(f"{8 - row} │{''.join(cells)}│ {8 - row}")
+        lines += ["  └─────────────────────────┘", "    a  b  c  d  e  f  g  h", ""]
+        return lines
+
+    def display(self):
+        """Отобразить доску одной записью в stdout"""
+        sys.stdout.write("\n".join(self.render_lines()) + "\n")
+
+    def has_castling_right(self, color, kingside):
+        """Сохранилось ли право на рокировку"""
+        if color == PieceColor.WHITE:
+            right = WHITE_KINGSIDE if kingside else WHITE_QUEENSIDE
+        else:
+            right = BLACK_KINGSIDE if kingside else BLACK_QUEENSIDE
+        return bool(self.castling_rights & right)
+
+    def make_move(self, from_pos, to_pos, promotion_piece=None):
+        """Сделать ход на месте и вернуть запись для unmake_move.
+
+        Ход не проверяется на корректность. Рокировка, взятие на проходе и
+        превращение распознаются по самому ходу.
+        """
+        from_row, from_col = from_pos
+        to_row, to_col = to_pos
+        board = self._board
+
+        piece = board[from_row][from_col]
+        captured = board[to_row][to_col]
+        undo = UndoInfo(from_pos, to_pos, piece, captured, self.en_passant_target,
+                        self.castling_rights, piece.has_moved())
+        piece_type = piece.get_type()
+
+        if captured is not None:
+            self._lift(to_row, to_col)
+        elif piece_type == PieceType.PAWN and from_col != to_col:
+            # Взятие на проходе: побитая пешка стоит рядом, а не на клетке хода
+            undo.captured_pos = (from_row, to_col)
+            undo.captured_piece = self._lift(from_row, to_col)
+
+        self._lift(from_row, from_col)
+
+        if piece_type == PieceType.PAWN and (to_row == 0 or to_row == 7):
+            promoted = PROMOTION_CLASSES[promotion_piece or PieceType.QUEEN](piece.get_color())
+            undo.promoted = promoted
+            self._place(to_row, to_col, promoted)
+        else:
+            self._place(to_row, to_col, piece)
+        piece.set_moved()
+
+        if piece_type == PieceType.KING and abs(to_col - from_col) == 2:
+            rook_cols = (7, 5) if to_col > from_col else (0, 3)
+            undo.rook_cols = rook_cols
+            rook = self._lift(from_row, rook_cols[0])
+            self._place(from_row, rook_cols[1], rook)
+            rook.set_moved()
+
+        if piece_type == PieceType.PAWN and abs(to_row - from_row) == 2:
+            self.en_passant_target = ((from_row + to_row) // 2, from_col)
+        else:
+            self.en_passant_target = None
+
+        if self.castling_rights:
+            self.castling_rights &= _CASTLING_KEEP[from_row][from_col] & _CASTLING_KEEP[to_row][to_col]
+
+        self.side_to_move = piece.get_color().opposite()
+        return undo
+
+    def unmake_move(self, undo):
+        """Отменить ход по записи, полученной из make_move"""
+        from_row, from_col = undo.from_pos
+        to_row, to_col = undo.to_pos
+        piece = undo.piece
+
+        if undo.rook_cols:
+            rook = self._lift(from_row, undo.rook_cols[1])
+            self._place(from_row, undo.rook_cols[0], rook)
+            rook.restore_moved(False)
+
+        self._lift(to_row, to_col)
+        self._place(from_row, from_col, piece)
+        piece.restore_moved(undo.had_moved)
+
+        if undo.captured_piece is not None:
+            self._place(*undo.captured_pos, undo.captured_piece)
 
-        print("  └─────────────────────────┘")
-        print("    a  b  c  d  e  f  g  h\n")
+        self.en_passant_target = undo.en_passant_target
+        self.castling_rights = undo.castling_rights
+        self.side_to_move = piece.get_color()
 
     def clone(self):
         """Создать копию доски"""
-        new_board = Board()
-        new_board._board = [[self._board[row][col] for col in range(8)] for row in range(8)]
+        new_board = self.__class__(setup=False)
+        new_board._board = [row[:] for row in self._board]
         new_board.en_passant_target = self.en_passant_target
+        new_board.castling_rights = self.castling_rights
+        new_board.side_to_move = self.side_to_move
+        new_board._pieces_hash = self._pieces_hash
+        new_board._king_positions = dict(self._king_positions)
+        new_board._midgame_score = self._midgame_score
+        new_board._endgame_score = self._endgame_score
+        new_board._phase = self._phase
         return new_board
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+Дебютная книга: позиции, ходы из них и веса ходов
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from archive import GameArchive, encode_move, decode_move
+from board import Board
+from enums import PieceColor, GameStatus
+from exceptions import OpeningBookException
+from pgn import PGN_SUFFIX, read_pgn
+from utils import move_to_uci
+
+# Запись книги: ключ Зобриста позиции, ход в 16 битах (как в архиве), вес хода
+_ENTRY = struct.Struct('<QHH')
+_MAX_WEIGHT = 0xFFFF
+
+# Вес хода по итогу партии для стороны, сделавшей ход
+_WIN_WEIGHT = 2
+_DRAW_WEIGHT = 1
+
+
+class OpeningBook:
+    """Книга в виде файла записей фиксированного размера, отсортированных по ключу.
+
+    Файл отображается в память, а ходы позиции находятся двоичным
+    поиском, поэтому книга не загружается целиком и ее страницы
+    разделяются между процессами, открывшими один файл.
+    """
+
+    DEFAULT_MAX_PLIES = 24
+
+    def __init__(self, path):
+        self._path = path
+        try:
+            self._file = open(path, 'rb')
+        except OSError as e:
+            raise OpeningBookException(f"Не удалось открыть книгу {path}: {str(e)}")
+
+        size = os.fstat(self._file.fileno()).st_size
+        if size % _ENTRY.size:
+            self._file.close()
+            raise OpeningBookException(f"Поврежденный файл книги: {path}")
+        # Пустой файл отобразить нельзя, но это корректная пустая книга
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._size = size // _ENTRY.size
+
+    def __len__(self):
+        return self._size
+
+    def get_path(self):
+        return self._path
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def get_moves(self, key):
+        """Ходы позиции с весами: [((откуда, куда, превращение), вес)], по убыванию веса"""
+        data = self._data
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if _ENTRY.unpack_from(data, middle * _ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        for index in range(low, self._size):
+            entry_key, move_code, weight = _ENTRY.unpack_from(data, index * _ENTRY.size)
+            if entry_key != key:
+                break
+            moves.append((decode_move(move_code), weight))
+        return moves
+
+    def choose_move(self, board, rng=random):
+        """Случайный книжный ход для стороны, чья очередь, с вероятностью по весу.
+
+        Возвращает (откуда, куда, превращение) или None, если позиции нет
+        в книге. Ходы, нелегальные в позиции (коллизия ключей), пропускаются.
+        """
+        moves = self.get_moves(board.get_hash())
+        if not moves:
+            return None
+
+        legal_moves = set(board.get_legal_moves(board.side_to_move))
+        candidates = [(move, weight) for move, weight in moves if move[:2] in legal_moves]
+        if not candidates:
+            return None
+        return rng.choices([move for move, _ in candidates],
+                           weights=[weight for _, weight in candidates])[0]
+
+
+def _result_weights(status):
+    """Веса ходов белых и черных по итогу партии"""
+    if status == GameStatus.CHECKMATE_WHITE:
+        return {PieceColor.WHITE: _WIN_WEIGHT, PieceColor.BLACK: 0}
+    if status == GameStatus.CHECKMATE_BLACK:
+        return {PieceColor.WHITE: 0, PieceColor.BLACK: _WIN_WEIGHT}
+    return {PieceColor.WHITE: _DRAW_WEIGHT, PieceColor.BLACK: _DRAW_WEIGHT}
+
+
+def build_book(records, path, max_plies=OpeningBook.DEFAULT_MAX_PLIES):
+    """Собрать книгу из записей архива (см. GameArchive.iter_records).
+
+    Из каждой партии берутся первые max_plies полуходов. Выигравшая
+    сторона получает за ход двойной вес, ничья - одинарный, ходы
+    проигравшей стороны в книгу не попадают. Возвращает число позиций.
+    """
+    weights = {}
+    for record in records:
+        result_weights = _result_weights(record['status'])
+        board = Board.from_fen(record['start_fen']) if record['start_fen'] else Board()
+
+        for from_pos, to_pos, promotion in record['moves'][:max_plies]:
+            weight = result_weights[board.side_to_move]
+            if weight:
+                position_moves = weights.setdefault(board.get_hash(), {})
+                code = encode_move(from_pos, to_pos, promotion)
+                position_moves[code] = position_moves.get(code, 0) + weight
+            board.make_move(from_pos, to_pos, promotion)
+
+    entries = []
+    for key in sorted(weights):
+        position_moves = sorted(weights[key].items(), key=lambda item: item[1], reverse=True)
+        for code, weight in position_moves:
+            entries.append(_ENTRY.pack(key, code, min(weight, _MAX_WEIGHT)))
+
+    # Пишем во временный файл и подменяем: открытые книги продолжают читать старый
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, 'wb') as book_file:
+            book_file.write(b"".join(entries))
+        os.replace(temp_path, path)
+    except OSError as e:
+        raise OpeningBookException(f"Ошибка записи книги {path}: {str(e)}")
+    return len(weights)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Дебютная книга шахматного ИИ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="собрать книгу из архива партий")
+    build_parser.add_argument("archive", help="путь к архиву без расширения, например saved_games/archive, "
+                                              "или файл .pgn")
+    build_parser.add_argument("book", help="файл книги")
+    build_parser.add_argument("--plies", type=int, default=OpeningBook.DEFAULT_MAX_PLIES,
+                              help="сколько первых полуходов партии брать")
+
+    probe_parser = subparsers.add_parser("probe", help="показать книжные ходы позиции")
+    probe_parser.add_argument("book", help="файл книги")
+    probe_parser.add_argument("--fen", default=None, help="позиция (по умолчанию - начальная)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.archive.endswith(PGN_SUFFIX):
+            # Базы PGN читаются потоком, некорректные партии пропускаются
+            with open(args.archive, 'r', encoding='utf-8', errors='replace') as pgn_file:
+                positions = build_book(read_pgn(pgn_file, skip_invalid=True), args.book, args.plies)
+            print(f"Позиций в книге: {positions}")
+        else:
+            archive = GameArchive(args.archive)
+            records = (record for _, record in archive.iter_records())
+            positions = build_book(records, args.book, args.plies)
+            print(f"Партий: {len(archive)}, позиций в книге: {positions}")
+    else:
+        book = OpeningBook(args.book)
+        board = Board.from_fen(args.fen) if args.fen else Board()
+        moves = book.get_moves(board.get_hash())
+        total = sum(weight for _, weight in moves)
+        for (from_pos, to_pos, promotion), weight in moves:
+            print(f"  {move_to_uci(from_pos, to_pos, promotion)}: {weight} ({weight / total:.0%})")
+        if not moves:
+            print("  Позиции нет в книге")
+        book.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -29,3 +29,11 @@ class InvalidNotationException(ChessException):
 class SaveGameException(ChessException):
     """Ошибка сохранения игры"""
     pass
+
+class OpeningBookException(ChessException):
+    """Ошибка дебютной книги"""
+    pass
+
+class TablebaseException(ChessException):
+    """Ошибка эндшпильных таблиц"""
+    pass
@@ -2,30 +2,75 @@
 Класс шахматной игры
 """
 
+import sys
 from board import Board
 from move import Move
 from enums import GameStatus, PieceColor, MoveType, PieceType
-from exceptions import InvalidMoveException, GameOverException, KingInCheckException
-from piece import Queen, Rook, Bishop, Knight
+from tablebase import DRAW
+from exceptions import InvalidMoveException, GameOverException, KingInCheckException, InvalidNotationException
 
 
 class ChessGame:
     """Шахматная партия"""
 
-    def __init__(self, white_player, black_player):
-        self._board = Board()
+    STANDARD_START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+    def __init__(self, white_player, black_player, board=None):
+        # Можно передать другую реализацию доски с тем же API (например, BitBoard)
+        self._board = board if board is not None else Board()
         self._white_player = white_player
         self._black_player = black_player
-        self._current_turn = PieceColor.WHITE
+        self._current_turn = self._board.side_to_move
         self._move_history = []
         self._status = GameStatus.IN_PROGRESS
         self._move_count = 0
+        self._fullmove_number = 1
         self._fifty_move_counter = 0
+        # Хеши всех позиций партии и число повторений каждой из них
         self._position_history = []
+        self._position_counts = {}
+        self._undo_stack = []
+        self._state_history = []
+        self._start_fen = self._board.to_fen()
+        self._tablebase = None
+        self._record_position()
+
+    @classmethod
+    def from_fen(cls, fen, white_player, black_player, board_class=Board):
+        """Начать партию с позиции, заданной в FEN"""
+        board = board_class.from_fen(fen)
+        game = cls(white_player, black_player, board)
+
+        fields = fen.split()
+        try:
+            game._fifty_move_counter = int(fields[4]) if len(fields) > 4 else 0
+            game._fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise InvalidNotationException(f"Некорректные счетчики ходов в FEN: {fen}")
+
+        game._start_fen = fen
+        game._refresh_status()
+        return game
+
+    def to_fen(self):
+        """Текущая позиция партии в FEN"""
+        return self._board.to_fen(self._fifty_move_counter, self._fullmove_number)
 
     def get_board(self):
         return self._board
 
+    def get_start_fen(self):
+        return self._start_fen
+
+    def get_white_player(self):
+        return self._white_player
+
+    def get_black_player(self):
+        return self._black_player
+
+    def get_move_count(self):
+        return self._move_count
+
     def get_current_turn(self):
         return self._current_turn
 
@@ -35,11 +80,67 @@ class ChessGame:
     def get_move_history(self):
         return self._move_history
 
+    def get_position_history(self):
+        return self._position_history
+
+    def set_tablebase(self, tablebase):
+        """Подключить эндшпильные таблицы: теоретическая ничья будет засчитываться сразу"""
+        self._tablebase = tablebase
+
+    def get_tablebase_result(self):
+        """Точный результат позиции по таблицам для стороны, чья очередь, или None"""
+        if self._tablebase is None:
+            return None
+        return self._tablebase.probe(self._board)
+
     def get_current_player(self):
         return self._white_player if self._current_turn == PieceColor.WHITE else self._black_player
 
     def make_move(self, from_pos, to_pos, promotion_piece=None):
         """Сделать ход"""
+        move = self._play_move(from_pos, to_pos, promotion_piece)
+
+        # Проверка на шах/мат
+        opponent_color = self._current_turn.opposite()
+        if self._board.is_in_check(opponent_color):
+            move.set_check(True)
+            if self._is_checkmate(opponent_color):
+                move.set_checkmate(True)
+                self._status = GameStatus.CHECKMATE_WHITE if self._current_turn == PieceColor.WHITE else GameStatus.CHECKMATE_BLACK
+            else:
+                self._status = GameStatus.CHECK
+        else:
+            if self._is_stalemate(opponent_color):
+                self._status = GameStatus.STALEMATE
+            else:
+                self._status = GameStatus.IN_PROGRESS
+
+        # Проверка на ничью
+        self._check_draw_conditions()
+
+        # Смена хода
+        self._current_turn = opponent_color
+
+        return move
+
+    def replay_moves(self, moves):
+        """Воспроизвести последовательность ходов (откуда, куда, превращение).
+
+        Каждый ход проверяется, но мат, пат и ничья определяются один раз
+        после последнего хода, а не после каждого.
+        """
+        for from_pos, to_pos, promotion_piece in moves:
+            move = self._play_move(from_pos, to_pos, promotion_piece)
+            opponent_color = self._current_turn.opposite()
+            move.set_check(self._board.is_in_check(opponent_color))
+            self._current_turn = opponent_color
+
+        self._refresh_status()
+        if self._move_history and self._status in [GameStatus.CHECKMATE_WHITE, GameStatus.CHECKMATE_BLACK]:
+            self._move_history[-1].set_checkmate(True)
+
+    def _play_move(self, from_pos, to_pos, promotion_piece):
+        """Проверить и выполнить ход без определения статуса партии"""
         if self._status not in [GameStatus.IN_PROGRESS, GameStatus.CHECK]:
             raise GameOverException("Игра завершена")
 
@@ -72,8 +173,9 @@ class ChessGame:
                 move_type = MoveType.CASTLING_KINGSIDE if to_col > from_col else MoveType.CASTLING_QUEENSIDE
 
         if piece.get_type() == PieceType.PAWN:
-            if self._board.en_passant_target == to_pos:
+            if self._board.en_passant_target == to_pos and from_col != to_col:
                 move_type = MoveType.EN_PASSANT
+                captured_piece = self._board.get_piece(from_row, to_col)
             if to_row == 0 or to_row == 7:
                 move_type = MoveType.PROMOTION
 
@@ -81,129 +183,46 @@ class ChessGame:
         move = Move(from_pos, to_pos, piece, captured_piece, move_type)
 
         # Выполнение хода
+        self._state_history.append((self._fifty_move_counter, self._fullmove_number, self._status))
         self._execute_move(move, promotion_piece)
+        self._record_position()
 
         # Обновление состояния игры
         self._move_history.append(move)
         self._move_count += 1
-
-        # Проверка на шах/мат
-        opponent_color = self._current_turn.opposite()
-        if self._board.is_in_check(opponent_color):
-            move.set_check(True)
-            if self._is_checkmate(opponent_color):
-                move.set_checkmate(True)
-                self._status = GameStatus.CHECKMATE_WHITE if self._current_turn == PieceColor.WHITE else GameStatus.CHECKMATE_BLACK
-            else:
-                self._status = GameStatus.CHECK
-        else:
-            if self._is_stalemate(opponent_color):
-                self._status = GameStatus.STALEMATE
-            else:
-                self._status = GameStatus.IN_PROGRESS
-
-        # Проверка на ничью
-        self._check_draw_conditions()
-
-        # Смена хода
-        self._current_turn = opponent_color
+        if self._current_turn == PieceColor.BLACK:
+            self._fullmove_number += 1
 
         return move
 
     def _execute_move(self, move, promotion_piece=None):
         """Выполнить ход на доске"""
-        from_pos = move.get_from_pos()
-        to_pos = move.get_to_pos()
         piece = move.get_piece()
-        move_type = move.get_move_type()
-
-        # Обычный ход или взятие
-        if move_type in [MoveType.NORMAL, MoveType.CAPTURE]:
-            self._board.remove_piece(*from_pos)
-
-            if move.get_captured_piece():
-                self._board.capture_piece(move.get_captured_piece())
-                self._fifty_move_counter = 0
-
-            self._board.set_piece(*to_pos, piece)
-            piece.set_moved()
-
-        # Рокировка
-        elif move_type == MoveType.CASTLING_KINGSIDE:
-            row = from_pos[0]
-            self._board.remove_piece(row, 4)  # Король
-            self._board.remove_piece(row, 7)  # Ладья
-            self._board.set_piece(row, 6, piece)  # Король на новое место
-            rook = self._board.get_piece(row, 7) if self._board.get_piece(row, 7) else piece  # Временно
-            self._board.set_piece(row, 5, rook)  # Ладья на новое место
-            piece.set_moved()
-
-        elif move_type == MoveType.CASTLING_QUEENSIDE:
-            row = from_pos[0]
-            self._board.remove_piece(row, 4)
-            self._board.remove_piece(row, 0)
-            self._board.set_piece(row, 2, piece)
-            rook = self._board.get_piece(row, 0) if self._board.get_piece(row, 0) else piece
-            self._board.set_piece(row, 3, rook)
-            piece.set_moved()
-
-        # Взятие на проходе
-        elif move_type == MoveType.EN_PASSANT:
-            self._board.remove_piece(*from_pos)
-            self._board.set_piece(*to_pos, piece)
-            # Убираем взятую пешку
-            captured_row = from_pos[0]
-            captured_col = to_pos[1]
-            captured = self._board.remove_piece(captured_row, captured_col)
-            self._board.capture_piece(captured)
-            piece.set_moved()
-            self._fifty_move_counter = 0
+        undo = self._board.make_move(move.get_from_pos(), move.get_to_pos(), promotion_piece)
+        self._undo_stack.append(undo)
 
-        # Превращение пешки
-        elif move_type == MoveType.PROMOTION:
-            self._board.remove_piece(*from_pos)
-
-            if move.get_captured_piece():
-                self._board.capture_piece(move.get_captured_piece())
-
-            # Создаем новую фигуру
-            promotion_type = promotion_piece or PieceType.QUEEN
-            piece_classes = {
-                PieceType.QUEEN: Queen,
-                PieceType.ROOK: Rook,
-                PieceType.BISHOP: Bishop,
-                PieceType.KNIGHT: Knight
-            }
-
-            new_piece = piece_classes[promotion_type](piece.get_color())
-            self._board.set_piece(*to_pos, new_piece)
-            move.set_promotion_piece(promotion_type)
-            self._fifty_move_counter = 0
+        if undo.captured_piece:
+            self._board.capture_piece(undo.captured_piece)
 
-        # Обновление en passant
-        self._board.en_passant_target = None
-        if piece.get_type() == PieceType.PAWN:
-            if abs(to_pos[0] - from_pos[0]) == 2:
-                en_passant_row = (from_pos[0] + to_pos[0]) // 2
-                self._board.en_passant_target = (en_passant_row, from_pos[1])
-            self._fifty_move_counter = 0
+        if undo.promoted:
+            move.set_promotion_piece(undo.promoted.get_type())
 
         # Правило 50 ходов
-        if piece.get_type() != PieceType.PAWN and not move.get_captured_piece():
+        if piece.get_type() == PieceType.PAWN or undo.captured_piece:
+            self._fifty_move_counter = 0
+        else:
             self._fifty_move_counter += 1
 
-    def _would_be_in_check_after_move(self, from_pos, to_pos):
+    def _would_be_in_check_after_move(self, from_pos, to_pos, color=None):
         """Проверка, будет ли король под шахом после хода"""
-        # Создаем копию доски
-        temp_board = self._board.clone()
+        color = color or self._current_turn
 
-        # Делаем ход на копии
-        piece = temp_board.get_piece(*from_pos)
-        temp_board.remove_piece(*from_pos)
-        temp_board.set_piece(*to_pos, piece)
+        # Делаем ход прямо на доске и сразу откатываем его
+        undo = self._board.make_move(from_pos, to_pos)
+        in_check = self._board.is_in_check(color)
+        self._board.unmake_move(undo)
 
-        # Проверяем шах
-        return temp_board.is_in_check(self._current_turn)
+        return in_check
 
     def _is_checkmate(self, color):
         """Проверка на мат"""
@@ -223,23 +242,75 @@ class ChessGame:
 
     def _get_legal_moves(self, color):
         """Получить все легальные ходы"""
-        legal_moves = []
-        all_moves = self._board.get_all_possible_moves(color)
-
-        for from_pos, to_pos in all_moves:
-            if not self._would_be_in_check_after_move(from_pos, to_pos):
-                legal_moves.append((from_pos, to_pos))
-
-        return legal_moves
+        return self._board.get_legal_moves(color)
 
     def _check_draw_conditions(self):
         """Проверка условий ничьей"""
-        # Правило 50 ходов
-        if self._fifty_move_counter >= 50:
+        # Мат и пат важнее ничьей
+        if self._status not in [GameStatus.IN_PROGRESS, GameStatus.CHECK]:
+            return
+
+        # Правило 50 ходов (счетчик считает полуходы, как в FEN)
+        if self._fifty_move_counter >= 100:
             self._status = GameStatus.DRAW_BY_50_MOVES
 
         # Троекратное повторение позиции
-        # (упрощенная реализация)
+        elif self._position_counts[self._position_history[-1]] >= 3:
+            self._status = GameStatus.DRAW_BY_REPETITION
+
+        # Теоретическая ничья по эндшпильным таблицам
+        elif self._tablebase is not None:
+            result = self._tablebase.probe(self._board)
+            if result is not None and result[0] == DRAW:
+                self._status = GameStatus.DRAW
+
+    def _refresh_status(self):
+        """Определить статус по позиции на доске (для партий, начатых не с начала)"""
+        color = self._current_turn
+        has_moves = bool(self._get_legal_moves(color))
+
+        if self._board.is_in_check(color):
+            if has_moves:
+                self._status = GameStatus.CHECK
+            elif color == PieceColor.WHITE:
+                self._status = GameStatus.CHECKMATE_BLACK
+            else:
+                self._status = GameStatus.CHECKMATE_WHITE
+        else:
+            self._status = GameStatus.IN_PROGRESS if has_moves else GameStatus.STALEMATE
+
+        self._check_draw_conditions()
+
+    def _record_position(self):
+        """Запомнить текущую позицию для проверки повторений"""
+        key = self._board.get_hash()
+        self._position_history.append(key)
+        self._position_counts[key] = self._position_counts.get(key, 0) + 1
+
+    def _forget_position(self):
+        """Убрать последнюю позицию из истории (при отмене хода)"""
+        key = self._position_history.pop()
+        count = self._position_counts[key] - 1
+        if count:
+            self._position_counts[key] = count
+        else:
+            del self._position_counts[key]
+
+    def undo_move(self):
+        """Отменить последний ход"""
+        if not self._undo_stack:
+            raise InvalidMoveException("Нет ходов для отмены")
+
+        self._forget_position()
+        undo = self._undo_stack.pop()
+        self._board.unmake_move(undo)
+        if undo.captured_piece:
+            self._board.release_captured_piece(undo.captured_piece)
+
+        self._move_history.pop()
+        self._move_count -= 1
+        self._fifty_move_counter, self._fullmove_number, self._status = self._state_history.pop()
+        self._current_turn = self._current_turn.opposite()
 
     def offer_draw(self):
         """Предложение ничьей"""
@@ -256,15 +327,20 @@ class ChessGame:
             self._white_player.add_win()
             self._black_player.add_loss()
 
-    def display_status(self):
-        """Отобразить статус игры"""
-        print(f"\n=== Статус игры ===")
-        print(f"Ход: {self._move_count}")
-        print(f"Текущий игрок: {self.get_current_player().get_name()} ({self._current_turn.get_display_name()})")
-        print(f"Статус: {self._status.get_display_name()}")
+    def render_status_lines(self):
+        """Строки статуса игры (без перевода строки в конце)"""
+        lines = ["", "=== Статус игры ===",
+                 f"Ход: {self._move_count}",
+                 f"Текущий игрок: {self.get_current_player().get_name()} ({self._current_turn.get_display_name()})",
+                 f"Статус: {self._status.get_display_name()}"]
 
         if self._move_history:
             last_move = self._move_history[-1]
-            print(f"Последний ход: {last_move.to_algebraic()}")
+            lines.append(f"Последний ход: {last_move.to_algebraic()}")
 
-        print("---\n")
+        lines += ["---", ""]
+        return lines
+
+    def display_status(self):
+        """Отобразить статус игры одной записью в stdout"""
+        sys.stdout.write("\n".join(self.render_status_lines()) + "\n")
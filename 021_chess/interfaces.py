@@ -8,6 +8,8 @@ from abc import ABC, abstractmethod
 class Movable(ABC):
     """Интерфейс для фигур, которые могут двигаться"""
 
+    __slots__ = ()
+
     @abstractmethod
     def get_possible_moves(self, board, position):
         """Получить возможные ходы"""
@@ -22,6 +24,8 @@ class Movable(ABC):
 class Capturable(ABC):
     """Интерфейс для фигур, которые могут быть взяты"""
 
+    __slots__ = ()
+
     @abstractmethod
     def can_be_captured(self):
         """Может ли фигура быть взята"""
@@ -2,8 +2,10 @@
 Главный файл шахматной игры
 """
 
+import argparse
 import sys
 import os
+from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
@@ -11,18 +13,30 @@ from game import ChessGame
 from player import Player
 from ai import ChessAI
 from save_manager import SaveManager
+from renderer import FrameRenderer
+from tablebase import Tablebase
 from enums import PieceColor, PlayerType, GameStatus, PieceType
 from exceptions import ChessException
 from utils import parse_move_input
 
+# Каталог эндшпильных таблиц (строится командой: python tablebase.py generate)
+TABLEBASE_DIR = "tablebases"
+# Процессов поиска у сложного ИИ: по одному на ядро
+AI_WORKERS = os.cpu_count() or 1
+
 
 class ChessUI:
     """Пользовательский интерфейс"""
 
-    def __init__(self):
+    def __init__(self, ansi=False):
         self._game = None
+        # Кадр игры (доска и статус) выводится одной записью, в режиме ANSI - изменениями
+        self._renderer = FrameRenderer(ansi=ansi)
+        # Строки о последнем ходе ИИ под статусом
+        self._ai_notes = []
         self._save_manager = SaveManager()
         self._ai = None
+        self._tablebase = Tablebase(TABLEBASE_DIR) if os.path.isdir(TABLEBASE_DIR) else None
 
     def run(self):
         """Запуск игры"""
@@ -30,6 +44,14 @@ class ChessUI:
         print("║         ШАХМАТНАЯ ИГРА                 ║")
         print("╚════════════════════════════════════════╝\n")
 
+        # Сохранения старого формата (JSON) один раз переносятся в архив
+        try:
+            imported = self._save_manager.archive_saved_games()
+            if imported:
+                print(f"✓ Перенесено в архив старых сохранений: {imported}\n")
+        except ChessException as e:
+            print(f"✗ Ошибка: {str(e)}\n")
+
         while True:
             try:
                 if not self._game:
@@ -47,6 +69,8 @@ class ChessUI:
 
     def _main_menu(self):
         """Главное меню"""
+        self._renderer.reset()
+        self._ai_notes = []
         print("\n=== Главное меню ===")
         print("1. Новая игра (Игрок vs Игрок)")
         print("2. Новая игра (Игрок vs ИИ)")
@@ -74,6 +98,7 @@ class ChessUI:
         black_player = Player(black_name, PieceColor.BLACK)
 
         self._game = ChessGame(white_player, black_player)
+        self._set_ai(None)
         print("\n✓ Игра начата!")
 
     def _new_game_ai(self):
@@ -111,7 +136,8 @@ class ChessUI:
         black_player = ai_player if ai_player.get_color() == PieceColor.BLACK else player
 
         self._game = ChessGame(white_player, black_player)
-        self._ai = ChessAI(difficulty)
+        self._set_ai(ChessAI(difficulty, book=self._save_manager.get_opening_book(),
+                             tablebase=self._tablebase, workers=AI_WORKERS))
         print("\n✓ Игра начата!")
 
     def _load_game(self):
@@ -123,8 +149,10 @@ class ChessUI:
             return
 
         print("\n=== Сохраненные игры ===")
-        for i, game_file in enumerate(saved_games, 1):
-            print(f"{i}. {game_file}")
+        for i, (game_id, record) in enumerate(saved_games, 1):
+            saved_at = datetime.fromtimestamp(record['saved_at']).strftime("%Y-%m-%d %H:%M")
+            print(f"{i}. #{game_id} {record['white_player']['name']} - {record['black_player']['name']}, "
+                  f"ходов: {record['move_count']}, {record['status'].get_display_name()}, {saved_at}")
 
         choice = input("\nВыберите игру (или 0 для отмены): ").strip()
 
@@ -134,14 +162,29 @@ class ChessUI:
         try:
             index = int(choice) - 1
             if 0 <= index < len(saved_games):
-                self._game = self._save_manager.load_game(saved_games[index])
+                self._game = self._save_manager.load_game(saved_games[index][0])
+                self._set_ai(self._create_ai_for(self._game))
         except (ValueError, IndexError):
             print("✗ Некорректный выбор")
 
+    def _create_ai_for(self, game):
+        """ИИ для загруженной партии, если в ней играет компьютер"""
+        for player in (game.get_white_player(), game.get_black_player()):
+            if player.get_player_type() != PlayerType.HUMAN:
+                return ChessAI(player.get_player_type(), book=self._save_manager.get_opening_book(),
+                               tablebase=self._tablebase, workers=AI_WORKERS)
+        return None
+
+    def _set_ai(self, ai):
+        """Заменить ИИ, завершив процессы поиска прежнего"""
+        if self._ai:
+            self._ai.close()
+        self._ai = ai
+
     def _game_loop(self):
         """Основной игровой цикл"""
-        self._game.get_board().display()
-        self._game.display_status()
+        self._renderer.draw(self._game.get_board().render_lines() + self._game.render_status_lines()
+                            + self._ai_notes)
 
         # Проверка окончания игры
         if self._game.get_status() not in [GameStatus.IN_PROGRESS, GameStatus.CHECK]:
@@ -159,21 +202,29 @@ class ChessUI:
                 from_pos, to_pos = move
                 try:
                     made_move = self._game.make_move(from_pos, to_pos)
-                    print(f"Ход: {made_move.to_algebraic()}")
+                    self._ai_notes = [f"Ход {current_player.get_name()}: {made_move.to_algebraic()}"]
+                    stats = self._ai.get_last_stats()
+                    if stats:
+                        self._ai_notes.append(f"  ({stats})")
                 except ChessException as e:
                     print(f"ИИ ошибка: {str(e)}")
             return
 
         # Ход игрока
         print(f"\nХод: {current_player.get_name()} ({current_player.get_color().get_display_name()})")
-        print("Введите ход (например: e2e4) или команду (help, save, resign, draw, back)")
+        print("Введите ход (например: e2e4) или команду (help, save, undo, resign, draw, back)")
 
+        # Пока игрок думает, ИИ обдумывает свой ответ на его ожидаемый ход
+        if self._ai:
+            self._ai.start_pondering(self._game, current_player.get_color().opposite())
         user_input = input("> ").strip().lower()
 
         if user_input == 'help':
             self._show_help()
         elif user_input == 'save':
             self._save_game()
+        elif user_input == 'undo':
+            self._undo_move()
         elif user_input == 'resign':
             self._game.resign(current_player.get_color())
         elif user_input == 'draw':
@@ -181,6 +232,7 @@ class ChessUI:
             if confirm.lower() == 'y':
                 self._game.offer_draw()
         elif user_input == 'back':
+            self._stop_pondering()
             self._game = None
         else:
             from_pos, to_pos = parse_move_input(user_input)
@@ -205,6 +257,20 @@ class ChessUI:
             except ChessException as e:
                 print(f"✗ {str(e)}")
 
+    def _stop_pondering(self):
+        if self._ai:
+            self._ai.stop_pondering()
+
+    def _undo_move(self):
+        """Отменить ход (в игре с ИИ - вместе с ответом компьютера)"""
+        self._game.undo_move()
+
+        current_player = self._game.get_current_player()
+        if self._ai and current_player.get_player_type() != PlayerType.HUMAN and self._game.get_move_history():
+            self._game.undo_move()
+
+        print("\n✓ Ход отменен")
+
     def _ask_promotion(self):
         """Спросить в какую фигуру превратить пешку"""
         print("\nВо что превратить пешку?")
@@ -229,15 +295,12 @@ class ChessUI:
         return promotion_map.get(choice.lower(), PieceType.QUEEN)
 
     def _save_game(self):
-        """Сохранить игру"""
-        filename = input("Имя файла (или Enter для автоматического): ").strip()
-        if filename and not filename.endswith('.json'):
-            filename += '.json'
-
-        self._save_manager.save_game(self._game, filename)
+        """Сохранить игру в архив"""
+        self._save_manager.save_game(self._game)
 
     def _game_over(self):
         """Игра окончена"""
+        self._stop_pondering()
         print("\n" + "=" * 50)
         print("ИГРА ОКОНЧЕНА".center(50))
         print("=" * 50)
@@ -266,6 +329,7 @@ class ChessUI:
         print("\nКоманды:")
         print("  help - показать справку")
         print("  save - сохранить игру")
+        print("  undo - отменить ход")
         print("  resign - сдаться")
         print("  draw - предложить ничью")
         print("  back - вернуться в меню")
@@ -273,7 +337,12 @@ class ChessUI:
 
 
 def main():
-    ui = ChessUI()
+    parser = argparse.ArgumentParser(description="Шахматная игра")
+    parser.add_argument("--ansi", action="store_true",
+                        help="перерисовывать только изменившиеся клетки (ANSI-терминал)")
+    args = parser.parse_args()
+
+    ui = ChessUI(ansi=args.ansi)
     ui.run()
 
 
@@ -2,12 +2,44 @@
 Класс шахматного хода
 """
 
+import time
 from datetime import datetime
 from enums import MoveType, PieceType
+from utils import move_to_uci
+
+
+# Компактная запись хода для генерации и поиска: откуда * 64 + куда (12 бит),
+# клетка - row * 8 + col. Код 0 (a8a8) ходом не бывает и означает его отсутствие.
+# Превращение не кодируется: поиск всегда превращает пешку в ферзя.
+NO_MOVE = 0
+
+# Ход в виде пары позиций по коду; кортежи общие, поэтому не создаются заново
+MOVE_POSITIONS = [((from_square >> 3, from_square & 7), (to_square >> 3, to_square & 7))
+                  for from_square in range(64) for to_square in range(64)]
+
+
+def pack_move(move):
+    """Упаковать ход ((row, col), (row, col)) в 12 бит"""
+    if move is None:
+        return NO_MOVE
+    (from_row, from_col), (to_row, to_col) = move
+    return ((from_row * 8 + from_col) << 6) | (to_row * 8 + to_col)
+
+
+def unpack_move(code):
+    """Распаковать ход из 12 бит (0 означает отсутствие хода)"""
+    return MOVE_POSITIONS[code] if code else None
 
 
 class Move:
-    """Шахматный ход"""
+    """Сыгранный в партии шахматный ход.
+
+    Генерация и поиск работают с кодами ходов (pack_move), объект
+    хода создается только для хода, сделанного в партии.
+    """
+
+    __slots__ = ('_from_pos', '_to_pos', '_piece', '_captured_piece', '_move_type', '_time',
+                 '_promotion_piece', '_is_check', '_is_checkmate')
 
     def __init__(self, from_pos, to_pos, piece, captured_piece=None, move_type=MoveType.NORMAL):
         self._from_pos = from_pos
@@ -15,7 +47,8 @@ class Move:
         self._piece = piece
         self._captured_piece = captured_piece
         self._move_type = move_type
-        self._timestamp = datetime.now()
+        # Время хранится числом, datetime создается только по запросу
+        self._time = time.time()
         self._promotion_piece = None
         self._is_check = False
         self._is_checkmate = False
@@ -36,7 +69,7 @@ class Move:
         return self._move_type
 
     def get_timestamp(self):
-        return self._timestamp
+        return datetime.fromtimestamp(self._time)
 
     def set_promotion_piece(self, piece_type):
         self._promotion_piece = piece_type
@@ -97,5 +130,9 @@ class Move:
 
         return f"{piece_symbol}{from_col}{from_row}{capture_symbol}{to_col}{to_row}{promotion_symbol}{check_symbol}{checkmate_symbol}"
 
+    def to_uci(self):
+        """Ход в координатной записи (e2e4, e7e8q)"""
+        return move_to_uci(self._from_pos, self._to_pos, self._promotion_piece)
+
     def __str__(self):
         return self.to_algebraic()
\ No newline at end of file
@@ -0,0 +1,149 @@
+"""
+Параллельный поиск (Lazy SMP): несколько процессов ищут один корень
+"""
+
+import multiprocessing
+from bitboard import BitBoard
+from search import SearchEngine, MAX_PLY
+from tablebase import Tablebase
+from transposition import SharedTranspositionTable
+
+
+def _helper_main(worker_id, buffer, table_size, max_depth, tablebase_dir, tasks, results, stop_event):
+    """Цикл вспомогательного процесса: искать присланные позиции до сигнала остановки"""
+    table = SharedTranspositionTable(table_size, buffer)
+    tablebase = Tablebase(tablebase_dir) if tablebase_dir else None
+    engine = SearchEngine(max_depth=max_depth, table=table, tablebase=tablebase,
+                          seed=worker_id, stop_event=stop_event)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        fen, color, history = task
+        move = engine.search(BitBoard.from_fen(fen), color, history)
+        results.put((move, engine.get_depth_reached(), engine.get_stats()))
+    if tablebase is not None:
+        tablebase.close()
+
+
+class ParallelSearchEngine:
+    """Поиск на нескольких процессах с общей таблицей транспозиций.
+
+    Основной поиск идет в текущем процессе с обычными ограничениями,
+    вспомогательные процессы ищут тот же корень без лимита времени,
+    каждый со своим порядком равноценных ходов, и заполняют общую
+    таблицу. Когда основной поиск закончен, вспомогательные
+    останавливаются, и берется ход самой глубокой завершенной итерации.
+    Интерфейс совпадает с SearchEngine.
+    """
+
+    def __init__(self, workers, max_depth=MAX_PLY, time_limit=None, max_nodes=None,
+                 table_size=SharedTranspositionTable.DEFAULT_SIZE, tablebase=None, info_callback=None):
+        self._workers = max(1, workers)
+        self._max_depth = max_depth
+        self._table = SharedTranspositionTable(table_size)
+        self._tablebase = tablebase
+        # Основной движок открывает ту же память, но поколения меняет только владелец
+        self._engine = SearchEngine(max_depth=max_depth, time_limit=time_limit, max_nodes=max_nodes,
+                                    table=SharedTranspositionTable(self._table.get_size(),
+                                                                   self._table.get_buffer()),
+                                    tablebase=tablebase, info_callback=info_callback)
+        self._context = multiprocessing.get_context()
+        self._stop_event = self._context.Event()
+        self._results = None
+        self._helpers = []
+        self._nodes = 0
+        self._depth_reached = 0
+        self._helper_stats = []
+        self._stats = None
+
+    def get_workers(self):
+        return self._workers
+
+    def get_max_depth(self):
+        return self._max_depth
+
+    def get_time_limit(self):
+        return self._engine.get_time_limit()
+
+    def set_time_limit(self, time_limit):
+        self._engine.set_time_limit(time_limit)
+
+    def get_nodes(self):
+        return self._nodes
+
+    def get_depth_reached(self):
+        return self._depth_reached
+
+    def get_stats(self):
+        """Статистика поиска, давшего выбранный ход; узлы всех процессов - get_nodes"""
+        return self._stats
+
+    def get_helper_stats(self):
+        """Статистика вспомогательных процессов за последний поиск"""
+        return self._helper_stats
+
+    def get_table(self):
+        return self._table
+
+    def get_tablebase(self):
+        return self._tablebase
+
+    def stop(self):
+        """Прервать поиск из другого потока"""
+        self._engine.stop()
+        self._stop_event.set()
+
+    def search(self, board, color, history=()):
+        """Найти лучший ход (пара позиций) для цвета или None"""
+        self._start_helpers()
+        self._stop_event.clear()
+        self._table.new_search()
+
+        history = tuple(history)
+        fen = board.to_fen()
+        for tasks, _ in self._helpers:
+            tasks.put((fen, color, history))
+
+        best_move = self._engine.search(board, color, history)
+        best_depth = self._engine.get_depth_reached()
+        best_stats = self._engine.get_stats()
+        nodes = self._engine.get_nodes()
+
+        self._stop_event.set()
+        self._helper_stats = []
+        for _ in self._helpers:
+            move, depth, stats = self._results.get()
+            nodes += stats.get_nodes()
+            self._helper_stats.append(stats)
+            # При равной глубине доверяем основному поиску
+            if move is not None and depth > best_depth:
+                best_move, best_depth, best_stats = move, depth, stats
+
+        self._nodes = nodes
+        self._stats = best_stats
+        self._depth_reached = best_depth
+        return best_move
+
+    def close(self):
+        """Завершить вспомогательные процессы"""
+        for tasks, _ in self._helpers:
+            tasks.put(None)
+        for _, process in self._helpers:
+            process.join()
+        self._helpers = []
+
+    def _start_helpers(self):
+        if self._helpers or self._workers == 1:
+            return
+        self._results = self._context.Queue()
+        tablebase_dir = self._tablebase.get_directory() if self._tablebase else None
+        for worker_id in range(1, self._workers):
+            tasks = self._context.Queue()
+            process = self._context.Process(
+                target=_helper_main,
+                args=(worker_id, self._table.get_buffer(), self._table.get_size(), self._max_depth,
+                      tablebase_dir, tasks, self._results, self._stop_event),
+                daemon=True)
+            process.start()
+            self._helpers.append((tasks, process))
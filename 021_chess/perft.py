@@ -0,0 +1,201 @@
+"""
+Perft: подсчет узлов дерева ходов для проверки и замера генератора ходов
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from board import Board
+from bitboard import BitBoard
+from enums import PieceType
+from move import MOVE_POSITIONS
+from utils import move_to_uci
+
+
+PROMOTION_PIECES = [PieceType.QUEEN, PieceType.ROOK, PieceType.BISHOP, PieceType.KNIGHT]
+
+BOARD_CLASSES = {
+    'board': Board,
+    'bitboard': BitBoard
+}
+
+# Эталонные позиции с известным числом узлов по глубинам (1, 2, 3, ...)
+STANDARD_POSITIONS = [
+    ("Начальная позиция",
+     "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609]),
+    ("Kiwipete",
+     "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("Эндшпиль с взятием на проходе",
+     "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("Превращения и рокировки",
+     "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("Позиция 5",
+     "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("Позиция 6",
+     "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594])
+]
+
+
+def legal_moves(board):
+    """Легальные ходы стороны, чья очередь: (откуда, куда, превращение)"""
+    moves = []
+    for code in board.get_legal_move_codes(board.side_to_move):
+        from_pos, to_pos = MOVE_POSITIONS[code]
+        if (to_pos[0] == 0 or to_pos[0] == 7) and board.get_piece_type_at(code >> 6) == PieceType.PAWN:
+            for promotion in PROMOTION_PIECES:
+                moves.append((from_pos, to_pos, promotion))
+        else:
+            moves.append((from_pos, to_pos, None))
+    return moves
+
+
+# Коды ходов, которые по клеткам могут быть превращением пешки
+_PROMOTION_SHAPES = [abs(from_pos[1] - to_pos[1]) <= 1
+                     and (from_pos[0] == 1 and to_pos[0] == 0 or from_pos[0] == 6 and to_pos[0] == 7)
+                     for from_pos, to_pos in MOVE_POSITIONS]
+
+
+def _count_promotions(board, codes):
+    """Число ходов-превращений среди кодов ходов"""
+    count = 0
+    for code in filter(_PROMOTION_SHAPES.__getitem__, codes):
+        if board.get_piece_type_at(code >> 6) == PieceType.PAWN:
+            count += 1
+    return count
+
+
+def perft(board, depth):
+    """Число листьев дерева легальных ходов заданной глубины"""
+    if depth == 0:
+        return 1
+    if depth == 1:
+        # Листья только считаются: превращение дает четыре хода
+        codes = board.get_legal_move_codes(board.side_to_move)
+        return len(codes) + 3 * _count_promotions(board, codes)
+
+    nodes = 0
+    for from_pos, to_pos, promotion in legal_moves(board):
+        undo = board.make_move(from_pos, to_pos, promotion)
+        nodes += perft(board, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+def divide(board, depth):
+    """Число узлов под каждым ходом корня: {ход: узлы}"""
+    result = {}
+    for from_pos, to_pos, promotion in legal_moves(board):
+        undo = board.make_move(from_pos, to_pos, promotion)
+        nodes = perft(board, depth - 1) if depth > 1 else 1
+        board.unmake_move(undo)
+        result[move_to_uci(from_pos, to_pos, promotion)] = nodes
+    return result
+
+
+def run_perft(fen, depth, board_class=BitBoard, show_divide=False):
+    """Посчитать perft для позиции и вывести узлы и скорость по глубинам"""
+    board = board_class.from_fen(fen)
+    results = []
+
+    for current_depth in range(1, depth + 1):
+        start = time.perf_counter()
+        if show_divide and current_depth == depth:
+            split = divide(board, current_depth)
+            for move, nodes in sorted(split.items()):
+                print(f"  {move}: {nodes}")
+            nodes = sum(split.values())
+        else:
+            nodes = perft(board, current_depth)
+        elapsed = time.perf_counter() - start
+
+        nps = nodes / elapsed if elapsed > 0 else 0
+        print(f"  Глубина {current_depth}: {nodes} узлов, {elapsed:.2f} с, {nps:,.0f} узлов/с")
+        results.append(nodes)
+
+    return results
+
+
+def run_suite(max_depth, board_class=BitBoard, max_nodes=None):
+    """Прогнать эталонные позиции и сверить число узлов.
+
+    Возвращает (ошибок, узлов, секунд) для сравнения реализаций доски.
+    """
+    failures = 0
+    total_nodes = 0
+    start = time.perf_counter()
+
+    for name, fen, expected in STANDARD_POSITIONS:
+        print(f"\n{name}: {fen}")
+        board = board_class.from_fen(fen)
+
+        for depth, expected_nodes in enumerate(expected[:max_depth], 1):
+            if max_nodes and expected_nodes > max_nodes:
+                break
+            nodes = perft(board, depth)
+            total_nodes += nodes
+            mark = "✓" if nodes == expected_nodes else "✗"
+            print(f"  {mark} Глубина {depth}: {nodes} (ожидается {expected_nodes})")
+            if nodes != expected_nodes:
+                failures += 1
+
+    elapsed = time.perf_counter() - start
+    nps = total_nodes / elapsed if elapsed > 0 else 0
+    print(f"\nИтого: {total_nodes} узлов за {elapsed:.2f} с ({nps:,.0f} узлов/с), ошибок: {failures}")
+    return failures, total_nodes, elapsed
+
+
+def compare_boards(max_depth, board_names, max_nodes=None):
+    """Прогнать эталон на каждой реализации доски и вывести сравнение скорости"""
+    results = []
+    for name in board_names:
+        print(f"\n=== Доска: {name} ===")
+        results.append((name, run_suite(max_depth, BOARD_CLASSES[name], max_nodes)))
+
+    print(f"\nСравнение досок (время относительно {results[0][0]}):")
+    base_elapsed = results[0][1][2]
+    for name, (failures, nodes, elapsed) in results:
+        nps = nodes / elapsed if elapsed > 0 else 0
+        ratio = elapsed / base_elapsed if base_elapsed > 0 else 0
+        print(f"  {name:<10} {elapsed:8.2f} с {nps:>12,.0f} узлов/с  x{ratio:.1f}  ошибок: {failures}")
+    return sum(failures for _, (failures, _, _) in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft для шахматного генератора ходов")
+    parser.add_argument("--fen", help="позиция в FEN (по умолчанию - прогон эталонных позиций)")
+    parser.add_argument("--depth", type=int, default=3, help="глубина (по умолчанию 3)")
+    parser.add_argument("--divide", action="store_true", help="разбивка узлов по ходам корня")
+    parser.add_argument("--board", choices=sorted(BOARD_CLASSES), default="bitboard",
+                        help="реализация доски (эталон прогоняется на ней первой)")
+    parser.add_argument("--max-nodes", type=int, default=None,
+                        help="пропускать глубины эталона с большим числом узлов")
+    parser.add_argument("--no-compare", action="store_true",
+                        help="прогнать эталон только на выбранной доске, без сравнения")
+    args = parser.parse_args()
+
+    board_class = BOARD_CLASSES[args.board]
+
+    if args.fen:
+        print(f"{args.fen}")
+        run_perft(args.fen, args.depth, board_class, args.divide)
+    else:
+        if args.no_compare:
+            failures = run_suite(args.depth, board_class, args.max_nodes)[0]
+        else:
+            others = sorted(name for name in BOARD_CLASSES if name != args.board)
+            failures = compare_boards(args.depth, [args.board] + others, args.max_nodes)
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""
+Чтение и запись партий в формате PGN
+"""
+
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from archive import GameArchive
+from bitboard import BitBoard
+from enums import PieceColor, PieceType, PlayerType, GameStatus
+from exceptions import InvalidNotationException
+from game import ChessGame
+from player import Player
+from utils import position_to_notation, notation_to_position
+
+PGN_SUFFIX = ".pgn"
+LINE_WIDTH = 80
+
+_PIECE_LETTERS = {
+    PieceType.KNIGHT: 'N',
+    PieceType.BISHOP: 'B',
+    PieceType.ROOK: 'R',
+    PieceType.QUEEN: 'Q',
+    PieceType.KING: 'K'
+}
+_PIECES_BY_LETTER = {letter: piece_type for piece_type, letter in _PIECE_LETTERS.items()}
+
+_RESULT_STATUSES = {
+    "1-0": GameStatus.CHECKMATE_WHITE,
+    "0-1": GameStatus.CHECKMATE_BLACK,
+    "1/2-1/2": GameStatus.DRAW,
+    "*": GameStatus.IN_PROGRESS
+}
+_DRAW_STATUSES = [GameStatus.STALEMATE, GameStatus.DRAW, GameStatus.DRAW_BY_AGREEMENT,
+                  GameStatus.DRAW_BY_REPETITION, GameStatus.DRAW_BY_50_MOVES]
+
+# Обязательные теги в обязательном порядке (Seven Tag Roster)
+_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+_ROSTER_DEFAULTS = {"Event": "?", "Site": "?", "Date": "????.??.??", "Round": "?"}
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+# Лексемы текста ходов; номера ходов и оценки ($1, !?) отбрасываются
+_MOVETEXT_TOKEN = re.compile(
+    r'\s+|(\{)|;(.*)|(\()|(\))|\$\d+|\d+\.+|(1-0|0-1|1/2-1/2|\*)(?![^\s{}();])|([^\s{}();.$][^\s{}();$]*)')
+
+
+def status_from_result(result):
+    """Статус партии по результату PGN (1-0, 0-1, 1/2-1/2, *)"""
+    return _RESULT_STATUSES.get(result, GameStatus.IN_PROGRESS)
+
+
+def result_from_status(status):
+    """Результат PGN по статусу партии"""
+    if status == GameStatus.CHECKMATE_WHITE:
+        return "1-0"
+    if status == GameStatus.CHECKMATE_BLACK:
+        return "0-1"
+    if status in _DRAW_STATUSES:
+        return "1/2-1/2"
+    return "*"
+
+
+def move_to_san(board, from_pos, to_pos, promotion_piece=None):
+    """Ход в стандартной алгебраической нотации (Nbd7, exd5, e8=Q+, O-O#).
+
+    Ход должен быть легальным в позиции board для стороны, чья очередь.
+    Доска после вызова остается в исходной позиции.
+    """
+    piece = board.get_piece(*from_pos)
+    color = piece.get_color()
+    piece_type = piece.get_type()
+
+    if piece_type == PieceType.KING and abs(to_pos[1] - from_pos[1]) == 2:
+        san = "O-O" if to_pos[1] > from_pos[1] else "O-O-O"
+    elif piece_type == PieceType.PAWN:
+        san = ""
+        if from_pos[1] != to_pos[1]:
+            san = f"{position_to_notation(from_pos)[0]}x"
+        san += position_to_notation(to_pos)
+        if to_pos[0] in (0, 7):
+            san += "=" + _PIECE_LETTERS[promotion_piece or PieceType.QUEEN]
+    else:
+        san = _PIECE_LETTERS[piece_type] + _disambiguation(board, color, piece_type, from_pos, to_pos)
+        if board.get_piece(*to_pos) is not None:
+            san += "x"
+        san += position_to_notation(to_pos)
+
+    undo = board.make_move(from_pos, to_pos, promotion_piece)
+    opponent = color.opposite()
+    if board.is_in_check(opponent):
+        san += "#" if not board.get_legal_moves(opponent) else "+"
+    board.unmake_move(undo)
+    return san
+
+
+def _disambiguation(board, color, piece_type, from_pos, to_pos):
+    """Уточнение исходной клетки, если на поле может пойти еще одна такая же фигура"""
+    rivals = [other for other, target in board.get_legal_moves(color)
+              if target == to_pos and other != from_pos and board.get_piece(*other).get_type() == piece_type]
+    if not rivals:
+        return ""
+    notation = position_to_notation(from_pos)
+    if all(other[1] != from_pos[1] for other in rivals):
+        return notation[0]
+    if all(other[0] != from_pos[0] for other in rivals):
+        return notation[1]
+    return notation
+
+
+def parse_san(board, san):
+    """Разобрать ход в SAN для стороны, чья очередь: (откуда, куда, превращение).
+
+    Ход проверяется на легальность и однозначность, иначе
+    InvalidNotationException.
+    """
+    text = san.rstrip("+#!?")
+    color = board.side_to_move
+    legal_moves = board.get_legal_moves(color)
+
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        row = 7 if color == PieceColor.WHITE else 0
+        to_col = 6 if len(text) == 3 else 2
+        move = ((row, 4), (row, to_col))
+        piece = board.get_piece(row, 4)
+        if move not in legal_moves or piece is None or piece.get_type() != PieceType.KING:
+            raise InvalidNotationException(f"Рокировка невозможна: {san}")
+        return move[0], move[1], None
+
+    match = _SAN.match(text)
+    if not match:
+        raise InvalidNotationException(f"Некорректный ход в SAN: {san}")
+    letter, from_file, from_rank, target, promotion_letter = match.groups()
+    piece_type = _PIECES_BY_LETTER[letter] if letter else PieceType.PAWN
+    to_pos = notation_to_position(target)
+    from_col = ord(from_file) - ord('a') if from_file else None
+    from_row = 8 - int(from_rank) if from_rank else None
+
+    candidates = [from_pos for from_pos, move_to in legal_moves
+                  if move_to == to_pos
+                  and board.get_piece(*from_pos).get_type() == piece_type
+                  and (from_col is None or from_pos[1] == from_col)
+                  and (from_row is None or from_pos[0] == from_row)]
+    if len(candidates) != 1:
+        reason = "Нелегальный" if not candidates else "Неоднозначный"
+        raise InvalidNotationException(f"{reason} ход в SAN: {san}")
+
+    promotion_piece = None
+    if piece_type == PieceType.PAWN and to_pos[0] in (0, 7):
+        promotion_piece = _PIECES_BY_LETTER[promotion_letter] if promotion_letter else PieceType.QUEEN
+        if promotion_piece == PieceType.KING:
+            raise InvalidNotationException(f"Некорректное превращение: {san}")
+    elif promotion_letter:
+        raise InvalidNotationException(f"Превращение не на последней горизонтали: {san}")
+    return candidates[0], to_pos, promotion_piece
+
+
+def _tokens(lines):
+    """Разбить строки PGN на лексемы (вид, значение).
+
+    Виды: 'tag' (имя, значение), 'comment', 'open' и 'close' (скобки
+    вариантов), 'result', 'san'. Комментарии в фигурных скобках могут
+    занимать несколько строк.
+    """
+    comment = None
+    for line in lines:
+        if comment is None:
+            if line.startswith('%'):
+                continue
+            stripped = line.strip()
+            if stripped.startswith('['):
+                match = _TAG.match(stripped)
+                if match:
+                    value = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+                    yield 'tag', (match.group(1), value)
+                    continue
+
+        position = 0
+        while position < len(line):
+            if comment is not None:
+                end = line.find('}', position)
+                if end < 0:
+                    comment.append(line[position:])
+                    break
+                comment.append(line[position:end])
+                yield 'comment', " ".join("".join(comment).split())
+                comment = None
+                position = end + 1
+                continue
+
+            match = _MOVETEXT_TOKEN.match(line, position)
+            if match is None:
+                # Одиночный непонятный символ (например, точка) пропускаем
+                position += 1
+                continue
+            position = match.end()
+            brace, line_comment, open_paren, close_paren, result, san = match.groups()
+            if brace:
+                comment = []
+            elif line_comment is not None:
+                yield 'comment', line_comment.strip()
+            elif open_paren:
+                yield 'open', None
+            elif close_paren:
+                yield 'close', None
+            elif result:
+                yield 'result', result
+            elif san:
+                yield 'san', san
+    if comment is not None:
+        yield 'comment', " ".join("".join(comment).split())
+
+
+class _GameReader:
+    """Собирает одну партию из лексем и разыгрывает ее ходы на доске"""
+
+    def __init__(self):
+        self.tags = {}
+        self.comments = {}
+        self.moves = []
+        self.result = None
+        self.error = None
+        self.started = False
+        self.variation_depth = 0
+        self._board = None
+
+    def add_move(self, san):
+        self.started = True
+        if self.error is not None:
+            return
+        if self._board is None:
+            fen = self.tags.get("FEN")
+            self._board = BitBoard.from_fen(fen) if fen else BitBoard()
+        move = parse_san(self._board, san)
+        self._board.make_move(*move)
+        self.moves.append(move)
+
+    def add_comment(self, text):
+        # Комментарий относится к позиции после сделанных ходов
+        ply = len(self.moves)
+        self.comments[ply] = f"{self.comments[ply]} {text}" if ply in self.comments else text
+
+    def build_record(self):
+        """Запись партии в формате архива (см. GameArchive.iter_records) с тегами и комментариями"""
+        tags = self.tags
+        result = self.result or tags.get("Result", "*")
+        start_fen = tags.get("FEN", "")
+        if start_fen == ChessGame.STANDARD_START_FEN:
+            start_fen = ""
+        return {
+            'white_player': _player_record(tags, "White"),
+            'black_player': _player_record(tags, "Black"),
+            'status': status_from_result(result),
+            'start_fen': start_fen,
+            'moves': self.moves,
+            'tags': tags,
+            'comments': self.comments
+        }
+
+
+def _player_record(tags, side):
+    rating = tags.get(side + "Elo", "")
+    return {
+        'name': tags.get(side, "?"),
+        'rating': int(rating) if rating.isdigit() else Player.DEFAULT_RATING,
+        'type': PlayerType.HUMAN
+    }
+
+
+def read_pgn(lines, skip_invalid=False):
+    """Потоково прочитать партии из строк PGN (например, открытого файла).
+
+    Генератор отдает по одной записи партии в формате архива с
+    дополнительными полями 'tags' и 'comments' (номер полухода ->
+    текст), поэтому в памяти находится только текущая партия.
+    Варианты в скобках пропускаются. Партия с некорректным ходом
+    пропускается при skip_invalid, иначе InvalidNotationException.
+    """
+    game = _GameReader()
+    game_number = 1
+    for kind, value in _tokens(lines):
+        if kind == 'tag':
+            # Тег после ходов без результата - начало следующей партии
+            if game.started:
+                record = _finish_game(game, game_number, skip_invalid)
+                if record is not None:
+                    yield record
+                game = _GameReader()
+                game_number += 1
+            game.tags[value[0]] = value[1]
+        elif kind == 'open':
+            game.variation_depth += 1
+        elif kind == 'close':
+            game.variation_depth = max(game.variation_depth - 1, 0)
+        elif game.variation_depth:
+            continue
+        elif kind == 'comment':
+            game.add_comment(value)
+        elif kind == 'san':
+            try:
+                game.add_move(value)
+            except InvalidNotationException as e:
+                game.error = e
+        elif kind == 'result':
+            game.result = value
+            record = _finish_game(game, game_number, skip_invalid)
+            if record is not None:
+                yield record
+            game = _GameReader()
+            game_number += 1
+
+    if game.started or game.tags:
+        record = _finish_game(game, game_number, skip_invalid)
+        if record is not None:
+            yield record
+
+
+def _finish_game(game, game_number, skip_invalid):
+    if game.error is not None:
+        if skip_invalid:
+            return None
+        raise InvalidNotationException(f"Партия {game_number}: {str(game.error)}")
+    return game.build_record()
+
+
+def game_to_record(game):
+    """Запись партии ChessGame в формате read_pgn (для format_pgn)"""
+    tags = {}
+    move_history = game.get_move_history()
+    if move_history:
+        tags["Date"] = move_history[0].get_timestamp().strftime("%Y.%m.%d")
+    start_fen = game.get_start_fen()
+    return {
+        'white_player': _player_data(game.get_white_player()),
+        'black_player': _player_data(game.get_black_player()),
+        'status': game.get_status(),
+        'start_fen': "" if start_fen == ChessGame.STANDARD_START_FEN else start_fen,
+        'moves': [(move.get_from_pos(), move.get_to_pos(), move.get_promotion_piece()) for move in move_history],
+        'tags': tags,
+        'comments': {}
+    }
+
+
+def _player_data(player):
+    return {'name': player.get_name(), 'rating': player.get_rating(), 'type': player.get_player_type()}
+
+
+def format_pgn(record, line_width=LINE_WIDTH):
+    """Партия в тексте PGN: теги, ходы в SAN с номерами и комментариями, результат"""
+    tags = dict(record.get('tags') or {})
+    result = result_from_status(record['status'])
+    tags["White"] = record['white_player']['name']
+    tags["Black"] = record['black_player']['name']
+    tags["Result"] = result
+    for side in ("White", "Black"):
+        # Рейтинг по умолчанию означает, что он неизвестен
+        rating = record[side.lower() + '_player']['rating']
+        if rating != Player.DEFAULT_RATING or side + "Elo" in tags:
+            tags[side + "Elo"] = str(rating)
+    if record['start_fen']:
+        tags["SetUp"] = "1"
+        tags["FEN"] = record['start_fen']
+    else:
+        tags.pop("SetUp", None)
+        tags.pop("FEN", None)
+
+    lines = []
+    for name in _ROSTER:
+        lines.append(_format_tag(name, tags.pop(name, _ROSTER_DEFAULTS.get(name, "?"))))
+    for name, value in tags.items():
+        lines.append(_format_tag(name, value))
+    lines.append("")
+
+    board = BitBoard.from_fen(record['start_fen']) if record['start_fen'] else BitBoard()
+    fen_fields = (record['start_fen'] or ChessGame.STANDARD_START_FEN).split()
+    move_number = int(fen_fields[5]) if len(fen_fields) > 5 and fen_fields[5].isdigit() else 1
+    comments = record.get('comments') or {}
+
+    tokens = []
+    if 0 in comments:
+        tokens.append(_format_comment(comments[0]))
+    need_number = True
+    for ply, (from_pos, to_pos, promotion_piece) in enumerate(record['moves'], 1):
+        white_to_move = board.side_to_move == PieceColor.WHITE
+        san = move_to_san(board, from_pos, to_pos, promotion_piece)
+        # Номер хода не отрывается от хода при переносе строки
+        if white_to_move:
+            san = f"{move_number}. {san}"
+        elif need_number:
+            san = f"{move_number}... {san}"
+        tokens.append(san)
+        board.make_move(from_pos, to_pos, promotion_piece)
+        if not white_to_move:
+            move_number += 1
+        need_number = ply in comments
+        if need_number:
+            tokens.append(_format_comment(comments[ply]))
+    tokens.append(result)
+
+    lines.extend(_wrap(tokens, line_width))
+    return "\n".join(lines) + "\n"
+
+
+def _format_tag(name, value):
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'[{name} "{value}"]'
+
+
+def _format_comment(text):
+    return "{" + text.replace("}", ")") + "}"
+
+
+def _wrap(tokens, line_width):
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > line_width:
+            yield line
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    if line:
+        yield line
+
+
+def write_pgn(records, output):
+    """Потоково записать партии в открытый файл, вернуть их число"""
+    count = 0
+    for record in records:
+        if count:
+            output.write("\n")
+        output.write(format_pgn(record))
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт и экспорт партий в PGN")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="добавить партии из PGN в архив")
+    import_parser.add_argument("pgn", help="файл PGN")
+    import_parser.add_argument("archive", help="путь к архиву без расширения, например saved_games/archive")
+    import_parser.add_argument("--strict", action="store_true",
+                               help="останавливаться на некорректной партии вместо пропуска")
+
+    export_parser = subparsers.add_parser("export", help="выгрузить архив в PGN")
+    export_parser.add_argument("archive", help="путь к архиву без расширения")
+    export_parser.add_argument("pgn", help="файл PGN")
+    args = parser.parse_args()
+
+    archive = GameArchive(args.archive)
+    if args.command == "import":
+        with open(args.pgn, 'r', encoding='utf-8', errors='replace') as pgn_file:
+            records = read_pgn(pgn_file, skip_invalid=not args.strict)
+            game_ids = archive.append_records(records)
+        print(f"Импортировано партий: {len(game_ids)}, всего в архиве: {len(archive)}")
+    else:
+        with open(args.pgn, 'w', encoding='utf-8') as pgn_file:
+            count = write_pgn((record for _, record in archive.iter_records()), pgn_file)
+        print(f"Выгружено партий: {count}")
+
+
+if __name__ == "__main__":
+    main()
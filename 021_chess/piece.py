@@ -10,6 +10,8 @@ from interfaces import Movable, Capturable
 class Piece(Movable, Capturable, ABC):
     """Базовый класс шахматной фигуры"""
 
+    __slots__ = ('_color', '_type', '_has_moved', '_move_count')
+
     def __init__(self, color, piece_type):
         self._color = color
         self._type = piece_type
@@ -29,6 +31,11 @@ class Piece(Movable, Capturable, ABC):
         self._has_moved = True
         self._move_count += 1
 
+    def restore_moved(self, had_moved):
+        """Откатить set_moved при отмене хода"""
+        self._has_moved = had_moved
+        self._move_count -= 1
+
     def get_move_count(self):
         return self._move_count
 
@@ -56,13 +63,17 @@ class Piece(Movable, Capturable, ABC):
 class Pawn(Piece):
     """Пешка"""
 
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(color, PieceType.PAWN)
 
     def get_possible_moves(self, board, position):
         moves = []
         row, col = position
-        direction = 1 if self._color == PieceColor.WHITE else -1
+        # Белые стоят на рядах 6-7 и идут к ряду 0, черные - наоборот
+        direction = -1 if self._color == PieceColor.WHITE else 1
+        start_row = 6 if self._color == PieceColor.WHITE else 1
 
         # Ход вперед на одну клетку
         new_row = row + direction
@@ -70,7 +81,7 @@ class Pawn(Piece):
             moves.append((new_row, col))
 
             # Ход вперед на две клетки (начальная позиция)
-            if not self._has_moved:
+            if row == start_row:
                 new_row2 = row + 2 * direction
                 if 0 <= new_row2 < 8 and board.is_empty(new_row2, col):
                     moves.append((new_row2, col))
@@ -93,6 +104,8 @@ class Pawn(Piece):
 class Knight(Piece):
     """Конь"""
 
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(color, PieceType.KNIGHT)
 
@@ -119,6 +132,8 @@ class Knight(Piece):
 class Bishop(Piece):
     """Слон"""
 
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(color, PieceType.BISHOP)
 
@@ -156,6 +171,8 @@ class Bishop(Piece):
 class Rook(Piece):
     """Ладья"""
 
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(color, PieceType.ROOK)
 
@@ -193,6 +210,8 @@ class Rook(Piece):
 class Queen(Piece):
     """Ферзь"""
 
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(color, PieceType.QUEEN)
 
@@ -215,6 +234,8 @@ class Queen(Piece):
 class King(Piece):
     """Король"""
 
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(color, PieceType.KING)
 
@@ -241,7 +262,8 @@ class King(Piece):
                     moves.append((new_row, new_col))
 
         # Рокировка
-        if not self._has_moved and not board.is_in_check(self._color):
+        can_castle = board.has_castling_right(self._color, True) or board.has_castling_right(self._color, False)
+        if can_castle and not board.is_in_check(self._color):
             # Королевская рокировка
             if self._can_castle_kingside(board, position):
                 moves.append((row, col + 2))
@@ -255,13 +277,16 @@ class King(Piece):
     def _can_castle_kingside(self, board, position):
         row, col = position
 
+        if col != 4 or not board.has_castling_right(self._color, True):
+            return False
+
         # Проверка что между королем и ладьей пусто
         if not board.is_empty(row, col + 1) or not board.is_empty(row, col + 2):
             return False
 
-        # Проверка что ладья на месте и не ходила
+        # Проверка что своя ладья на месте (право рокировки пропадает, если она ходила)
         rook = board.get_piece(row, 7)
-        if not rook or rook.get_type() != PieceType.ROOK or rook.has_moved():
+        if not rook or rook.get_type() != PieceType.ROOK or rook.get_color() != self._color:
             return False
 
         # Проверка что король не проходит через битое поле
@@ -273,13 +298,16 @@ class King(Piece):
     def _can_castle_queenside(self, board, position):
         row, col = position
 
+        if col != 4 or not board.has_castling_right(self._color, False):
+            return False
+
         # Проверка что между королем и ладьей пусто
         if not board.is_empty(row, col - 1) or not board.is_empty(row, col - 2) or not board.is_empty(row, col - 3):
             return False
 
-        # Проверка что ладья на месте и не ходила
+        # Проверка что своя ладья на месте (право рокировки пропадает, если она ходила)
         rook = board.get_piece(row, 0)
-        if not rook or rook.get_type() != PieceType.ROOK or rook.has_moved():
+        if not rook or rook.get_type() != PieceType.ROOK or rook.get_color() != self._color:
             return False
 
         # Проверка что король не проходит через битое поле
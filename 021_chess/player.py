@@ -8,11 +8,13 @@ from enums import PieceColor, PlayerType
 class Player:
     """Шахматный игрок"""
 
+    DEFAULT_RATING = 1200
+
     def __init__(self, name, color, player_type=PlayerType.HUMAN):
         self._name = name
         self._color = color
         self._player_type = player_type
-        self._rating = 1200
+        self._rating = self.DEFAULT_RATING
         self._wins = 0
         self._losses = 0
         self._draws = 0
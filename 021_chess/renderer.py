@@ -0,0 +1,82 @@
+"""
+Вывод кадров игры в терминал: одной записью или изменениями через ANSI
+"""
+
+import sys
+
+CLEAR_SCREEN = "\x1b[H\x1b[2J"
+CLEAR_LINE_END = "\x1b[K"
+CLEAR_BELOW = "\x1b[J"
+
+
+def _move_cursor(row, col):
+    """Переместить курсор (нумерация с нуля, в ANSI - с единицы)"""
+    return f"\x1b[{row + 1};{col + 1}H"
+
+
+class FrameRenderer:
+    """Вывод кадра (списка строк) одной записью в поток.
+
+    В режиме ANSI первый кадр рисуется на очищенном экране, а в
+    следующих переписываются только изменившиеся участки строк, для
+    доски - клетки сходившей фигуры. Текст под кадром (приглашения,
+    сообщения) очищается, только если кадр изменился. Считается, что
+    каждый символ кадра занимает одну позицию терминала.
+    """
+
+    def __init__(self, output=None, ansi=False):
+        self._output = output or sys.stdout
+        self._ansi = ansi
+        self._previous = None
+
+    def is_ansi(self):
+        return self._ansi
+
+    def reset(self):
+        """Следующий кадр нарисовать целиком (после меню и другого вывода)"""
+        self._previous = None
+
+    def draw(self, lines):
+        """Вывести кадр"""
+        if not self._ansi:
+            self._write("\n".join(lines) + "\n")
+            return
+
+        if self._previous is None:
+            self._write(CLEAR_SCREEN + "\n".join(lines) + "\n")
+        else:
+            changes = self._diff(self._previous, lines)
+            if changes:
+                self._write(changes + _move_cursor(len(lines), 0) + CLEAR_BELOW)
+        self._previous = list(lines)
+
+    def _diff(self, previous, lines):
+        """ANSI-последовательность, превращающая прежний кадр в новый"""
+        parts = []
+        for row in range(max(len(previous), len(lines))):
+            old = previous[row] if row < len(previous) else ""
+            new = lines[row] if row < len(lines) else ""
+            if old == new:
+                continue
+            if len(old) != len(new):
+                # Строка сдвинулась: переписать ее от первого отличия до конца
+                col = 0
+                while col < min(len(old), len(new)) and old[col] == new[col]:
+                    col += 1
+                parts.append(_move_cursor(row, col) + new[col:] + CLEAR_LINE_END)
+                continue
+            col = 0
+            while col < len(new):
+                if old[col] == new[col]:
+                    col += 1
+                    continue
+                end = col + 1
+                while end < len(new) and old[end] != new[end]:
+                    end += 1
+                parts.append(_move_cursor(row, col) + new[col:end])
+                col = end
+        return "".join(parts)
+
+    def _write(self, text):
+        self._output.write(text)
+        self._output.flush()
@@ -4,87 +4,180 @@
 
 import json
 import os
+import re
 from datetime import datetime
 from exceptions import SaveGameException
+from archive import GameArchive
+from book import OpeningBook, build_book
+from pgn import read_pgn, write_pgn
+from game import ChessGame
+from player import Player
+from enums import PieceColor, PieceType, PlayerType, GameStatus
+from utils import notation_to_position, parse_uci_move
+
+
+# Старые сохранения содержат только нотацию вида Ng1f3, e7xe8=Q+ или O-O
+_LEGACY_NOTATION = re.compile(r'^[NBRQK]?([a-h][1-8])x?([a-h][1-8])(?:=([QRBN]))?[+#]*$')
+
+_LEGACY_PROMOTIONS = {
+    'Q': PieceType.QUEEN,
+    'R': PieceType.ROOK,
+    'B': PieceType.BISHOP,
+    'N': PieceType.KNIGHT
+}
 
 
 class SaveManager:
     """Менеджер сохранения партий"""
 
     SAVE_DIR = "saved_games"
+    ARCHIVE_NAME = "archive"
+    BOOK_NAME = "book.bin"
+    # Суффикс JSON-сохранений, уже перенесенных в архив
+    IMPORTED_SUFFIX = ".imported"
 
     def __init__(self):
         if not os.path.exists(self.SAVE_DIR):
             os.makedirs(self.SAVE_DIR)
+        self._archive = None
+        self._book = None
 
-    def save_game(self, game, filename=None):
-        """Сохранить игру"""
-        if not filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"chess_game_{timestamp}.json"
-
-        filepath = os.path.join(self.SAVE_DIR, filename)
+    def get_archive(self):
+        """Двоичный архив партий (создается при первом обращении)"""
+        if self._archive is None:
+            self._archive = GameArchive(os.path.join(self.SAVE_DIR, self.ARCHIVE_NAME))
+        return self._archive
 
+    def save_game(self, game):
+        """Дописать партию в архив и вернуть ее номер"""
         try:
-            game_data = self._serialize_game(game)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(game_data, f, ensure_ascii=False, indent=2)
-
-            print(f"\n✓ Игра сохранена: {filename}")
-            return filepath
-
-        except Exception as e:
+            game_id = self.get_archive().append_game(game)
+        except (OSError, ValueError) as e:
             raise SaveGameException(f"Ошибка сохранения игры: {str(e)}")
 
-    def load_game(self, filename):
-        """Загрузить игру"""
-        filepath = os.path.join(self.SAVE_DIR, filename)
-
-        if not os.path.exists(filepath):
-            raise SaveGameException(f"Файл не найден: {filename}")
+        print(f"\n✓ Игра сохранена в архив под номером {game_id}")
+        return game_id
 
+    def load_game(self, game_id):
+        """Загрузить партию из архива по номеру"""
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                game_data = json.load(f)
-
-            game = self._deserialize_game(game_data)
-            print(f"\n✓ Игра загружена: {filename}")
-            return game
-
-        except Exception as e:
+            game = self.get_archive().load_game(game_id)
+        except (OSError, ValueError, KeyError) as e:
             raise SaveGameException(f"Ошибка загрузки игры: {str(e)}")
 
+        print(f"\n✓ Игра загружена: {game_id}")
+        return game
+
     def list_saved_games(self):
-        """Список сохраненных игр"""
-        files = [f for f in os.listdir(self.SAVE_DIR) if f.endswith('.json')]
-        return sorted(files, reverse=True)
-
-    def _serialize_game(self, game):
-        """Сериализация игры в JSON"""
-        moves_data = []
-        for move in game.get_move_history():
-            moves_data.append({
-                'notation': move.to_algebraic(),
-                'timestamp': move.get_timestamp().isoformat()
-            })
+        """Партии архива (номер, запись без ходов), последние сохраненные - первыми.
+
+        Записи читаются по индексу архива, ходы при этом не распаковываются.
+        """
+        try:
+            saved_games = list(self.get_archive().iter_records(with_moves=False))
+        except (OSError, ValueError) as e:
+            raise SaveGameException(f"Ошибка чтения архива: {str(e)}")
+        saved_games.reverse()
+        return saved_games
+
+    def archive_saved_games(self):
+        """Перенести JSON-сохранения старого формата в архив, вернуть их число.
+
+        Файлы читаются напрямую, без переигрывания и сообщений: в архив
+        попадают начальная позиция и все записанные ходы. Перенесенный
+        файл переименовывается с суффиксом IMPORTED_SUFFIX, поэтому
+        повторный вызов не дублирует партии.
+        """
+        filenames = sorted(f for f in os.listdir(self.SAVE_DIR) if f.endswith('.json'))
+        records = [self._read_record(filename) for filename in filenames]
+        self.get_archive().append_records(records)
+        for filename in filenames:
+            filepath = os.path.join(self.SAVE_DIR, filename)
+            os.replace(filepath, filepath + self.IMPORTED_SUFFIX)
+        return len(records)
+
+    def _read_record(self, filename):
+        """Запись архива по JSON-сохранению"""
+        try:
+            with open(os.path.join(self.SAVE_DIR, filename), 'r', encoding='utf-8') as f:
+                game_data = json.load(f)
 
+            start_fen = game_data.get('start_fen') or ChessGame.STANDARD_START_FEN
+            start_color = PieceColor.BLACK if start_fen.split()[1:2] == ['b'] else PieceColor.WHITE
+            saved_at = game_data.get('saved_at')
+            return {
+                'white_player': self._read_player(game_data['white_player']),
+                'black_player': self._read_player(game_data['black_player']),
+                'status': GameStatus[game_data.get('status', GameStatus.IN_PROGRESS.name)],
+                'start_fen': start_fen,
+                'saved_at': int(datetime.fromisoformat(saved_at).timestamp()) if saved_at else None,
+                'moves': self._parse_moves(game_data.get('moves', []), start_color)
+            }
+        except (OSError, ValueError, KeyError) as e:
+            raise SaveGameException(f"Ошибка чтения сохранения {filename}: {str(e)}")
+
+    def _read_player(self, player_data):
         return {
-            'white_player': {
-                'name': game._white_player.get_name(),
-                'rating': game._white_player.get_rating()
-            },
-            'black_player': {
-                'name': game._black_player.get_name(),
-                'rating': game._black_player.get_rating()
-            },
-            'moves': moves_data,
-            'status': game.get_status().name,
-            'move_count': game._move_count,
-            'saved_at': datetime.now().isoformat()
+            'name': player_data['name'],
+            'rating': player_data.get('rating', Player.DEFAULT_RATING),
+            'type': PlayerType[player_data.get('type', PlayerType.HUMAN.name)]
         }
 
-    def _deserialize_game(self, game_data):
-        """Десериализация игры из JSON"""
-        # Упрощенная реализация
-        # В полной версии нужно восстановить позицию на доске
-        return None
\ No newline at end of file
+    def import_pgn(self, path, skip_invalid=True):
+        """Дописать в архив партии из файла PGN, вернуть их число.
+
+        Файл читается потоком, поэтому размер базы не ограничен памятью;
+        ходы уже проверены при разборе SAN и повторно не переигрываются.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as pgn_file:
+                return len(self.get_archive().append_records(read_pgn(pgn_file, skip_invalid)))
+        except OSError as e:
+            raise SaveGameException(f"Ошибка импорта PGN: {str(e)}")
+
+    def export_pgn(self, path):
+        """Выгрузить все партии архива в файл PGN, вернуть их число"""
+        try:
+            with open(path, 'w', encoding='utf-8') as pgn_file:
+                return write_pgn((record for _, record in self.get_archive().iter_records()), pgn_file)
+        except OSError as e:
+            raise SaveGameException(f"Ошибка экспорта PGN: {str(e)}")
+
+    def get_opening_book(self):
+        """Дебютная книга из каталога сохранений или None, если она еще не собрана"""
+        path = os.path.join(self.SAVE_DIR, self.BOOK_NAME)
+        if self._book is None and os.path.exists(path):
+            self._book = OpeningBook(path)
+        return self._book
+
+    def build_opening_book(self, max_plies=OpeningBook.DEFAULT_MAX_PLIES):
+        """Собрать дебютную книгу по архиву партий, вернуть число позиций"""
+        if self._book is not None:
+            self._book.close()
+            self._book = None
+        records = (record for _, record in self.get_archive().iter_records())
+        return build_book(records, os.path.join(self.SAVE_DIR, self.BOOK_NAME), max_plies)
+
+    def _parse_moves(self, moves_data, color):
+        """Перевести записи ходов в тройки (откуда, куда, превращение)"""
+        moves = []
+        for move_data in moves_data:
+            move = parse_uci_move(move_data['uci']) if 'uci' in move_data else \
+                self._parse_legacy_notation(move_data['notation'], color)
+            if move is None:
+                raise SaveGameException(f"Не удалось разобрать ход: {move_data}")
+            moves.append(move)
+            color = color.opposite()
+        return moves
+
+    def _parse_legacy_notation(self, notation, color):
+        if notation.startswith("O-O"):
+            row = 7 if color == PieceColor.WHITE else 0
+            to_col = 2 if notation.rstrip("+#") == "O-O-O" else 6
+            return (row, 4), (row, to_col), None
+
+        match = _LEGACY_NOTATION.match(notation)
+        if not match:
+            return None
+        from_notation, to_notation, promotion = match.groups()
+        return notation_to_position(from_notation), notation_to_position(to_notation), _LEGACY_PROMOTIONS.get(promotion)
\ No newline at end of file
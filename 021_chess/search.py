@@ -0,0 +1,498 @@
+"""
+Поиск лучшего хода: негамакс с альфа-бета отсечением
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bitboard import BitBoard
+from enums import PieceColor, PieceType
+from move import MOVE_POSITIONS, NO_MOVE
+from search_stats import IterationInfo, SearchStats
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from tablebase import WIN, LOSS
+
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_PLY = 64
+
+PIECE_VALUES = {
+    PieceType.PAWN: 100,
+    PieceType.KNIGHT: 320,
+    PieceType.BISHOP: 330,
+    PieceType.ROOK: 500,
+    PieceType.QUEEN: 900,
+    PieceType.KING: 0
+}
+
+# Порядок атакующих для MVV-LVA: чем дешевле атакующий, тем раньше ход
+_ATTACKER_ORDER = {
+    PieceType.PAWN: 0,
+    PieceType.KNIGHT: 1,
+    PieceType.BISHOP: 2,
+    PieceType.ROOK: 3,
+    PieceType.QUEEN: 4,
+    PieceType.KING: 5
+}
+
+_TT_MOVE_SCORE = 1 << 30
+_CAPTURE_SCORE = 1 << 20
+_KILLER_SCORES = (1 << 19, (1 << 19) - 1)
+
+
+def _popcount(bitboard):
+    return bin(bitboard).count("1")
+
+
+class SearchEngine:
+    """Альфа-бета поиск с итеративным углублением.
+
+    Работает на собственной копии-BitBoard и ограничивается
+    глубиной, временем и числом узлов. Ходы упорядочиваются по MVV-LVA,
+    ходам-убийцам и истории отсечений, на листьях - поиск взятий.
+
+    После поиска get_stats возвращает его статистику, а info_callback,
+    если задан, получает IterationInfo после каждой завершенной итерации.
+    """
+
+    # Шум истории у движков с seed: меньше прибавки за отсечение на глубине 1,
+    # поэтому меняет порядок только ходов с равной историей
+    _HISTORY_NOISE = 1
+
+    def __init__(self, max_depth=MAX_PLY, time_limit=None, max_nodes=None, table=None, tablebase=None,
+                 seed=None, stop_event=None, info_callback=None):
+        self._max_depth = max_depth
+        # Таблица транспозиций живет между поисками и переиспользуется
+        self._table = table if table is not None else TranspositionTable()
+        self._time_limit = time_limit
+        self._max_nodes = max_nodes
+        # Эндшпильные таблицы: точный результат вместо поиска при малом материале
+        self._tablebase = tablebase
+        self._tablebase_pieces = tablebase.get_max_pieces() if tablebase else 0
+        self._nodes = 0
+        self._depth_reached = 0
+        self._start_time = 0.0
+        self._info_callback = info_callback
+        self._stats = None
+        self._reset_counters()
+        self._stopped = False
+        # Просьба остановиться из другого потока (см. stop)
+        self._stop_requested = False
+        # Общий для процессов сигнал остановки (multiprocessing.Event)
+        self._stop_event = stop_event
+        # Движки с seed упорядочивают равноценные тихие ходы по-своему,
+        # чтобы параллельные процессы расходились по разным вариантам
+        self._random = random.Random(seed) if seed is not None else None
+        self._killers = [[NO_MOVE, NO_MOVE] for _ in range(MAX_PLY + 1)]
+        self._history = self._new_history()
+        self._seen = set()
+
+    def get_max_depth(self):
+        return self._max_depth
+
+    def get_nodes(self):
+        return self._nodes
+
+    def get_depth_reached(self):
+        return self._depth_reached
+
+    def get_stats(self):
+        """Статистика последнего поиска (SearchStats) или None"""
+        return self._stats
+
+    def get_table(self):
+        return self._table
+
+    def get_tablebase(self):
+        return self._tablebase
+
+    def get_time_limit(self):
+        return self._time_limit
+
+    def set_time_limit(self, time_limit):
+        """Задать лимит времени идущему поиску, отсчет начинается заново.
+
+        Так поиск без лимита (обдумывание на время соперника)
+        превращается в обычный, когда соперник сыграл ожидаемый ход.
+        """
+        self._start_time = time.perf_counter()
+        self._time_limit = time_limit
+
+    def stop(self):
+        """Прервать поиск из другого потока: search вернет лучший найденный ход"""
+        self._stop_requested = True
+
+    def search(self, board, color, history=()):
+        """Найти лучший ход (пара позиций) для цвета или None.
+
+        history - хеши уже сыгранных позиций: повтор любой из них
+        (как и повтор внутри варианта) оценивается как ничья.
+        """
+        # Ищем на собственной копии, чтобы не трогать доску партии
+        board = BitBoard.from_board(board)
+        board.side_to_move = color
+
+        self._nodes = 0
+        self._depth_reached = 0
+        self._reset_counters()
+        self._stopped = False
+        self._start_time = time.perf_counter()
+        # Отсчет для статистики: _start_time сдвигается при set_time_limit
+        self._clock_start = self._start_time
+        self._killers = [[NO_MOVE, NO_MOVE] for _ in range(MAX_PLY + 1)]
+        self._history = self._new_history()
+        self._table.new_search()
+        self._seen = set(history)
+        self._seen.add(board.get_hash())
+
+        try:
+            best_move = self._iterative_deepening(board, color)
+            self._stats = SearchStats(best_move, self._nodes, self._qnodes,
+                                      time.perf_counter() - self._clock_start, self._seldepth,
+                                      self._tt_probes, self._tt_hits, self._tt_cutoffs,
+                                      self._searched_nodes, self._cutoffs, self._first_move_cutoffs,
+                                      self._iterations)
+            return best_move
+        finally:
+            # Просьба остановиться, пришедшая до начала поиска, тоже учитывается
+            self._stop_requested = False
+
+    def _iterative_deepening(self, board, color):
+        # Внутри поиска ходы - коды (move.pack_move), наружу отдается пара позиций
+        root_moves = board.get_legal_move_codes(color)
+        if not root_moves:
+            return None
+        if len(root_moves) == 1:
+            return MOVE_POSITIONS[root_moves[0]]
+        if self._in_tablebase(board):
+            move = self._tablebase.get_best_move(board)
+            if move is not None:
+                return move
+
+        entry = self._table.probe(board.get_hash())
+        best_move = entry[3] if entry and entry[3] in root_moves else NO_MOVE
+        for depth in range(1, self._max_depth + 1):
+            score, move = self._search_root(board, color, depth, root_moves, best_move)
+
+            if self._stopped:
+                # Прерванная итерация полностью перебрала найденный ход, и он
+                # лучше прежнего на этой глубине - отдаем его, а чтобы вариант
+                # совпадал с ходом, записываем и эту итерацию
+                if move and move != best_move:
+                    best_move = move
+                    self._record_iteration(board, color, depth, score, move)
+                break
+            best_move = move
+            self._depth_reached = depth
+            self._record_iteration(board, color, depth, score, move)
+
+            if abs(score) >= MATE_SCORE - MAX_PLY:
+                break
+            # Следующая итерация дольше всех предыдущих вместе - не начинаем ее
+            if self._time_limit and time.perf_counter() - self._start_time > self._time_limit / 2:
+                break
+
+        return MOVE_POSITIONS[best_move] if best_move else None
+
+    def _reset_counters(self):
+        self._qnodes = 0
+        self._seldepth = 0
+        self._tt_probes = 0
+        self._tt_hits = 0
+        self._tt_cutoffs = 0
+        self._searched_nodes = 0
+        self._cutoffs = 0
+        self._first_move_cutoffs = 0
+        self._iterations = []
+        self._clock_start = time.perf_counter()
+
+    def _record_iteration(self, board, color, depth, score, root_move):
+        elapsed = time.perf_counter() - self._clock_start
+        previous = self._iterations[-1] if self._iterations else None
+        mate_in = None
+        if score >= MATE_SCORE - MAX_PLY:
+            mate_in = (MATE_SCORE - score + 1) // 2
+        elif score <= -MATE_SCORE + MAX_PLY:
+            mate_in = -((MATE_SCORE + score + 1) // 2)
+        iteration = IterationInfo(
+            depth, self._seldepth, score, mate_in, self._nodes,
+            self._nodes - (previous.get_nodes() if previous else 0),
+            elapsed, elapsed - (previous.get_elapsed() if previous else 0.0),
+            self._principal_variation(board, color, depth, root_move))
+        self._iterations.append(iteration)
+        if self._info_callback is not None:
+            self._info_callback(iteration)
+
+    def _principal_variation(self, board, color, depth, root_move):
+        """Главный вариант: ход корня, дальше лучшие ходы из таблицы транспозиций"""
+        seen = {board.get_hash()}
+        pv = [MOVE_POSITIONS[root_move]]
+        undos = [board.make_move(*pv[0])]
+        color = color.opposite()
+        while len(pv) < depth:
+            key = board.get_hash()
+            entry = self._table.probe(key)
+            if not entry or key in seen or entry[3] not in board.get_legal_move_codes(color):
+                break
+            seen.add(key)
+            move = MOVE_POSITIONS[entry[3]]
+            pv.append(move)
+            undos.append(board.make_move(*move))
+            color = color.opposite()
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+        return pv
+
+    def _search_root(self, board, color, depth, root_moves, previous_best):
+        alpha, beta = -INFINITY, INFINITY
+        best_move = NO_MOVE
+        opponent = color.opposite()
+
+        for move in self._order_moves(board, color, root_moves, 0, previous_best):
+            undo = board.make_move(*MOVE_POSITIONS[move])
+            score = -self._negamax(board, opponent, depth - 1, -beta, -alpha, 1)
+            board.unmake_move(undo)
+
+            if self._stopped:
+                break
+            if score > alpha:
+                alpha = score
+                best_move = move
+
+        if best_move and not self._stopped:
+            self._table.store(board.get_hash(), depth, self._score_to_table(alpha, 0), EXACT, best_move)
+        return alpha, best_move
+
+    def _negamax(self, board, color, depth, alpha, beta, ply):
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiescence(board, color, alpha, beta, ply)
+
+        self._count_node()
+        if self._stopped:
+            return 0
+
+        key = board.get_hash()
+        if key in self._seen:
+            return 0
+
+        if self._in_tablebase(board):
+            result = self._tablebase.probe(board)
+            if result is not None:
+                return self._tablebase_score(result, ply)
+
+        entry = self._table.probe(key)
+        self._tt_probes += 1
+        table_move = NO_MOVE
+        if entry:
+            self._tt_hits += 1
+            table_depth, table_score, flag, table_move = entry
+            if table_depth >= depth:
+                table_score = self._score_from_table(table_score, ply)
+                if flag == EXACT or (flag == LOWER_BOUND and table_score >= beta) \
+                        or (flag == UPPER_BOUND and table_score <= alpha):
+                    self._tt_cutoffs += 1
+                    return table_score
+
+        in_check = board.is_in_check(color)
+        if in_check:
+            depth += 1
+
+        opponent = color.opposite()
+        moves = self._order_moves(board, color, board.get_legal_move_codes(color), ply, table_move)
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = NO_MOVE
+        self._seen.add(key)
+        self._searched_nodes += 1
+
+        for index, move in enumerate(moves):
+            undo = board.make_move(*MOVE_POSITIONS[move])
+            score = -self._negamax(board, opponent, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move(undo)
+
+            if self._stopped:
+                break
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self._cutoffs += 1
+                if not index:
+                    self._first_move_cutoffs += 1
+                if board.get_piece_type_at(move & 63) is None:
+                    self._store_quiet_cutoff(color, move, depth, ply)
+                break
+
+        self._seen.discard(key)
+        if self._stopped:
+            return 0
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self._table.store(key, depth, self._score_to_table(best_score, ply), flag, best_move)
+        return best_score
+
+    def _quiescence(self, board, color, alpha, beta, ply):
+        self._count_node()
+        if self._stopped:
+            return 0
+        self._qnodes += 1
+        if ply > self._seldepth:
+            self._seldepth = ply
+
+        stand_pat = self._evaluate(board, color)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        opponent = color.opposite()
+        for move in self._order_captures(board, board.get_capture_move_codes(color)):
+            undo = board.make_move(*MOVE_POSITIONS[move])
+            if board.is_in_check(color):
+                board.unmake_move(undo)
+                continue
+            score = -self._quiescence(board, opponent, -beta, -alpha, ply + 1)
+            board.unmake_move(undo)
+
+            if self._stopped:
+                return 0
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        return alpha
+
+    def _in_tablebase(self, board):
+        return self._tablebase_pieces and _popcount(board.get_occupancy()) <= self._tablebase_pieces
+
+    @staticmethod
+    def _tablebase_score(result, ply):
+        # Мат по таблице оценивается так же, как найденный поиском
+        outcome, distance = result
+        if outcome == WIN:
+            return MATE_SCORE - ply - distance
+        if outcome == LOSS:
+            return -MATE_SCORE + ply + distance
+        return 0
+
+    @staticmethod
+    def _score_to_table(score, ply):
+        # Матовые оценки хранятся относительно узла, а не корня
+        if score >= MATE_SCORE - MAX_PLY:
+            return score + ply
+        if score <= -MATE_SCORE + MAX_PLY:
+            return score - ply
+        return score
+
+    @staticmethod
+    def _score_from_table(score, ply):
+        if score >= MATE_SCORE - MAX_PLY:
+            return score - ply
+        if score <= -MATE_SCORE + MAX_PLY:
+            return score + ply
+        return score
+
+    def _new_history(self):
+        # История отсечений по коду хода: список на все 4096 кодов
+        if self._random is None:
+            return {color: [0] * 4096 for color in PieceColor}
+        return {color: [self._random.random() * self._HISTORY_NOISE for _ in range(4096)]
+                for color in PieceColor}
+
+    def _count_node(self):
+        self._nodes += 1
+        if self._nodes & 255 == 0:
+            if self._stop_requested or (self._stop_event is not None and self._stop_event.is_set()):
+                self._stopped = True
+            elif self._max_nodes and self._nodes >= self._max_nodes:
+                self._stopped = True
+            elif self._time_limit and time.perf_counter() - self._start_time >= self._time_limit:
+                self._stopped = True
+
+    def _order_moves(self, board, color, moves, ply, best_move):
+        """Сортировка: лучший ход, взятия по MVV-LVA, убийцы, история"""
+        killers = self._killers[ply]
+        history = self._history[color]
+        scored = []
+        for move in moves:
+            if move == best_move:
+                score = _TT_MOVE_SCORE
+            else:
+                victim = board.get_piece_type_at(move & 63)
+                if victim is not None:
+                    attacker = board.get_piece_type_at(move >> 6)
+                    score = _CAPTURE_SCORE + PIECE_VALUES[victim] * 8 - _ATTACKER_ORDER[attacker]
+                elif move == killers[0]:
+                    score = _KILLER_SCORES[0]
+                elif move == killers[1]:
+                    score = _KILLER_SCORES[1]
+                else:
+                    score = history[move]
+            scored.append((score, move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def _order_captures(self, board, moves):
+        scored = []
+        for move in moves:
+            victim = board.get_piece_type_at(move & 63)
+            victim_value = PIECE_VALUES[victim] if victim is not None else PIECE_VALUES[PieceType.PAWN]
+            attacker = board.get_piece_type_at(move >> 6)
+            scored.append((victim_value * 8 - _ATTACKER_ORDER[attacker], move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def _store_quiet_cutoff(self, color, move, depth, ply):
+        killers = self._killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self._history[color][move] += depth * depth
+
+    def _evaluate(self, board, color):
+        """Оценка позиции с точки зрения цвета: материал и таблицы полей"""
+        return board.get_evaluation(color)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Анализ позиции поиском со статистикой")
+    parser.add_argument("--fen", default=None, help="позиция (по умолчанию - начальная)")
+    parser.add_argument("--time", type=float, default=5.0, help="лимит времени, с")
+    parser.add_argument("--depth", type=int, default=MAX_PLY, help="максимальная глубина")
+    parser.add_argument("--json", action="store_true", help="вывести итоговую статистику в JSON")
+    args = parser.parse_args()
+
+    board = BitBoard.from_fen(args.fen) if args.fen else BitBoard()
+    # Строки info печатаются по мере завершения итераций, как у UCI-движков
+    engine = SearchEngine(max_depth=args.depth, time_limit=args.time,
+                          info_callback=lambda iteration: print(iteration.to_uci(), flush=True))
+    move = engine.search(board, board.side_to_move)
+    stats = engine.get_stats()
+    print(f"bestmove {stats.to_dict()['best_move'] or '(none)'}")
+    if args.json:
+        print(json.dumps(stats.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print(stats)
+    return move
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Статистика поиска: итоги итераций и всего поиска
+"""
+
+from utils import move_to_uci
+
+
+class IterationInfo:
+    """Итог одной завершенной итерации углубления.
+
+    Узлы и время считаются нарастающим итогом от начала поиска,
+    как в строках info протокола UCI.
+    """
+
+    def __init__(self, depth, seldepth, score, mate_in, nodes, iteration_nodes, elapsed, iteration_time, pv):
+        self._depth = depth
+        self._seldepth = seldepth
+        self._score = score
+        # Мат в стольких ходах (отрицательное - нам ставят мат) или None
+        self._mate_in = mate_in
+        self._nodes = nodes
+        self._iteration_nodes = iteration_nodes
+        self._elapsed = elapsed
+        self._iteration_time = iteration_time
+        self._pv = pv
+
+    def get_depth(self):
+        return self._depth
+
+    def get_seldepth(self):
+        return self._seldepth
+
+    def get_score(self):
+        return self._score
+
+    def get_mate_in(self):
+        return self._mate_in
+
+    def get_nodes(self):
+        return self._nodes
+
+    def get_iteration_nodes(self):
+        return self._iteration_nodes
+
+    def get_elapsed(self):
+        return self._elapsed
+
+    def get_iteration_time(self):
+        return self._iteration_time
+
+    def get_pv(self):
+        """Главный вариант: список ходов (откуда, куда)"""
+        return self._pv
+
+    def get_nps(self):
+        return int(self._nodes / self._elapsed) if self._elapsed > 0 else 0
+
+    def to_uci(self):
+        """Строка info в формате UCI"""
+        score = f"mate {self._mate_in}" if self._mate_in is not None else f"cp {self._score}"
+        line = (f"info depth {self._depth} seldepth {self._seldepth} score {score} "
+                f"nodes {self._nodes} nps {self.get_nps()} time {int(self._elapsed * 1000)}")
+        if self._pv:
+            line += " pv " + " ".join(move_to_uci(from_pos, to_pos) for from_pos, to_pos in self._pv)
+        return line
+
+    def to_dict(self):
+        return {
+            'depth': self._depth,
+            'seldepth': self._seldepth,
+            'score': self._score,
+            'mate_in': self._mate_in,
+            'nodes': self._nodes,
+            'iteration_nodes': self._iteration_nodes,
+            'elapsed': self._elapsed,
+            'iteration_time': self._iteration_time,
+            'pv': [move_to_uci(from_pos, to_pos) for from_pos, to_pos in self._pv]
+        }
+
+
+class SearchStats:
+    """Статистика одного поиска.
+
+    Узлы включают узлы поиска взятий (qnodes). Доля попаданий в таблицу
+    транспозиций считается по всем обращениям к ней, доля отсечений - по
+    внутренним узлам, где перебирались ходы; отсечение первым ходом
+    показывает качество упорядочивания.
+    """
+
+    def __init__(self, best_move, nodes, qnodes, elapsed, seldepth, tt_probes, tt_hits, tt_cutoffs,
+                 searched_nodes, cutoffs, first_move_cutoffs, iterations):
+        self._best_move = best_move
+        self._nodes = nodes
+        self._qnodes = qnodes
+        self._elapsed = elapsed
+        self._seldepth = seldepth
+        self._tt_probes = tt_probes
+        self._tt_hits = tt_hits
+        self._tt_cutoffs = tt_cutoffs
+        self._searched_nodes = searched_nodes
+        self._cutoffs = cutoffs
+        self._first_move_cutoffs = first_move_cutoffs
+        self._iterations = iterations
+
+    def get_best_move(self):
+        return self._best_move
+
+    def get_nodes(self):
+        return self._nodes
+
+    def get_qnodes(self):
+        return self._qnodes
+
+    def get_elapsed(self):
+        return self._elapsed
+
+    def get_nps(self):
+        return int(self._nodes / self._elapsed) if self._elapsed > 0 else 0
+
+    def get_depth(self):
+        """Глубина последней завершенной итерации"""
+        return self._iterations[-1].get_depth() if self._iterations else 0
+
+    def get_seldepth(self):
+        return self._seldepth
+
+    def get_tt_probes(self):
+        return self._tt_probes
+
+    def get_tt_hit_rate(self):
+        return self._tt_hits / self._tt_probes if self._tt_probes else 0.0
+
+    def get_tt_cutoffs(self):
+        return self._tt_cutoffs
+
+    def get_cutoffs(self):
+        return self._cutoffs
+
+    def get_cutoff_rate(self):
+        return self._cutoffs / self._searched_nodes if self._searched_nodes else 0.0
+
+    def get_first_move_cutoff_rate(self):
+        return self._first_move_cutoffs / self._cutoffs if self._cutoffs else 0.0
+
+    def get_branching_factor(self):
+        """Эффективный коэффициент ветвления: рост числа узлов от итерации к итерации"""
+        ratios = [current.get_iteration_nodes() / previous.get_iteration_nodes()
+                  for previous, current in zip(self._iterations, self._iterations[1:])
+                  if previous.get_iteration_nodes()]
+        return sum(ratios) / len(ratios) if ratios else 0.0
+
+    def get_iterations(self):
+        return self._iterations
+
+    def get_iteration_times(self):
+        return [iteration.get_iteration_time() for iteration in self._iterations]
+
+    def to_dict(self):
+        """Статистика в виде словаря (для JSON и журналов)"""
+        return {
+            'best_move': move_to_uci(*self._best_move) if self._best_move else None,
+            'nodes': self._nodes,
+            'qnodes': self._qnodes,
+            'elapsed': self._elapsed,
+            'nps': self.get_nps(),
+            'depth': self.get_depth(),
+            'seldepth': self._seldepth,
+            'tt_hit_rate': self.get_tt_hit_rate(),
+            'tt_cutoffs': self._tt_cutoffs,
+            'cutoff_rate': self.get_cutoff_rate(),
+            'first_move_cutoff_rate': self.get_first_move_cutoff_rate(),
+            'branching_factor': self.get_branching_factor(),
+            'iterations': [iteration.to_dict() for iteration in self._iterations]
+        }
+
+    def __str__(self):
+        return (f"глубина {self.get_depth()}/{self._seldepth}, узлов {self._nodes} "
+                f"(взятия {self._qnodes}), {self.get_nps()} узлов/с, "
+                f"ТТ {self.get_tt_hit_rate():.0%}, отсечения {self.get_cutoff_rate():.0%} "
+                f"(первым ходом {self.get_first_move_cutoff_rate():.0%}), "
+                f"ветвление {self.get_branching_factor():.1f}")
@@ -0,0 +1,659 @@
+"""
+Эндшпильные таблицы: ретроградный анализ малого материала и проба позиций
+"""
+
+import argparse
+import mmap
+import os
+import sys
+import time
+from itertools import product
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bitboard import (KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, FULL_MASK,
+                      rook_attacks, bishop_attacks, iterate_squares)
+from board import Board
+from enums import PieceColor, PieceType
+from exceptions import TablebaseException
+from utils import move_to_uci
+
+
+# Результат для стороны, чья очередь хода
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# Байт таблицы: 0 - ничья, 255 - позиция невозможна, иначе число полуходов до мата + 1.
+# Нечетное число полуходов - выигрывает сторона, чья очередь, четное - проигрывает.
+_DRAW_CODE = 0
+_INVALID_CODE = 255
+_MAX_DISTANCE = 253
+
+TABLE_SUFFIX = ".tb"
+DEFAULT_SIGNATURES = ["KQvK", "KRvK", "KPvK"]
+
+_PIECE_ORDER = [PieceType.KING, PieceType.QUEEN, PieceType.ROOK,
+                PieceType.BISHOP, PieceType.KNIGHT, PieceType.PAWN]
+_LETTERS = {
+    PieceType.KING: 'K',
+    PieceType.QUEEN: 'Q',
+    PieceType.ROOK: 'R',
+    PieceType.BISHOP: 'B',
+    PieceType.KNIGHT: 'N',
+    PieceType.PAWN: 'P'
+}
+_TYPES_BY_LETTER = {letter: piece_type for piece_type, letter in _LETTERS.items()}
+_PROMOTION_TYPES = [PieceType.QUEEN, PieceType.ROOK, PieceType.BISHOP, PieceType.KNIGHT]
+
+# Ничья при любой расстановке: короли и не больше одной легкой фигуры
+_INSUFFICIENT_MATERIAL = {"KvK", "KBvK", "KvKB", "KNvK", "KvKN"}
+
+
+def _build_transforms():
+    """Восемь симметрий доски: отражения по вертикали, горизонтали и диагонали"""
+    transforms = []
+    for flags in range(8):
+        table = []
+        for square in range(64):
+            row, col = square >> 3, square & 7
+            if flags & 4:
+                row, col = 7 - col, 7 - row
+            if flags & 1:
+                col = 7 - col
+            if flags & 2:
+                row = 7 - row
+            table.append(row * 8 + col)
+        transforms.append(table)
+    return transforms
+
+
+_ALL_TRANSFORMS = _build_transforms()
+# С пешками доску можно только отразить слева направо
+_PAWN_TRANSFORMS = _ALL_TRANSFORMS[:2]
+
+# Первый король таблицы приводится в треугольник a1-d1-d4 (без пешек) или на вертикали a-d
+_PAWNLESS_REGION = [row * 8 + col for row in range(8) for col in range(4) if 7 - row <= col]
+_PAWN_REGION = [row * 8 + col for row in range(8) for col in range(4)]
+_DIAGONAL = {row * 8 + col for row in range(8) for col in range(8) if 7 - row == col}
+
+
+def _attacks(piece_type, color, square, occupied):
+    if piece_type == PieceType.KING:
+        return KING_ATTACKS[square]
+    if piece_type == PieceType.KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if piece_type == PieceType.BISHOP:
+        return bishop_attacks(square, occupied)
+    if piece_type == PieceType.ROOK:
+        return rook_attacks(square, occupied)
+    if piece_type == PieceType.QUEEN:
+        return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+    return PAWN_ATTACKS[color][square]
+
+
+def _is_attacked(material, squares, target, by_color, occupied, skip=-1):
+    """Бьет ли клетку target какая-либо фигура цвета by_color (кроме фигуры с номером skip)"""
+    for index, (color, piece_type) in enumerate(material):
+        if color == by_color and index != skip:
+            if _attacks(piece_type, color, squares[index], occupied) >> target & 1:
+                return True
+    return False
+
+
+def _king_index(material, color):
+    return material.index((color, PieceType.KING))
+
+
+def _children(material, squares, color):
+    """Позиции после каждого легального хода цвета: список (материал, клетки).
+
+    При взятии фигура исчезает из материала, при превращении пешка
+    меняет тип - такие позиции относятся к другим таблицам.
+    """
+    occupied = own = 0
+    for index, square in enumerate(squares):
+        occupied |= 1 << square
+        if material[index][0] == color:
+            own |= 1 << square
+    enemy = occupied ^ own
+    opponent = color.opposite()
+    king_index = _king_index(material, color)
+    children = []
+
+    for index, (piece_color, piece_type) in enumerate(material):
+        if piece_color != color:
+            continue
+        square = squares[index]
+        if piece_type == PieceType.PAWN:
+            step = -8 if color == PieceColor.WHITE else 8
+            targets = PAWN_ATTACKS[color][square] & enemy
+            if not occupied >> (square + step) & 1:
+                targets |= 1 << (square + step)
+                start_row = 6 if color == PieceColor.WHITE else 1
+                if square >> 3 == start_row and not occupied >> (square + 2 * step) & 1:
+                    targets |= 1 << (square + 2 * step)
+        else:
+            targets = _attacks(piece_type, color, square, occupied) & ~own
+
+        for target in iterate_squares(targets):
+            new_squares = list(squares)
+            new_squares[index] = target
+            captured = squares.index(target) if enemy >> target & 1 else -1
+            new_occupied = (occupied & ~(1 << square)) | (1 << target)
+            if _is_attacked(material, new_squares, new_squares[king_index], opponent, new_occupied, captured):
+                continue
+
+            child_material = material
+            if captured >= 0:
+                child_material = material[:captured] + material[captured + 1:]
+                del new_squares[captured]
+            if piece_type == PieceType.PAWN and target >> 3 in (0, 7):
+                pawn_index = index if captured < 0 or captured > index else index - 1
+                for promotion in _PROMOTION_TYPES:
+                    promoted = list(child_material)
+                    promoted[pawn_index] = (color, promotion)
+                    children.append((tuple(promoted), tuple(new_squares)))
+            else:
+                children.append((child_material, tuple(new_squares)))
+    return children
+
+
+def _unmoves(material, squares, color):
+    """Позиции, из которых фигура цвета могла прийти в данную тихим ходом"""
+    occupied = 0
+    for square in squares:
+        occupied |= 1 << square
+    empty = FULL_MASK & ~occupied
+
+    for index, (piece_color, piece_type) in enumerate(material):
+        if piece_color != color:
+            continue
+        square = squares[index]
+        if piece_type == PieceType.PAWN:
+            # Белые пешки идут к ряду 0, поэтому пришли с ряда ниже
+            step = 8 if color == PieceColor.WHITE else -8
+            start_row = 6 if color == PieceColor.WHITE else 1
+            source = square + step
+            sources = 0
+            if 0 < source >> 3 < 7 and empty >> source & 1:
+                sources |= 1 << source
+                if (source + step) >> 3 == start_row and empty >> (source + step) & 1:
+                    sources |= 1 << (source + step)
+        else:
+            sources = _attacks(piece_type, color, square, occupied) & empty
+
+        for source in iterate_squares(sources):
+            yield squares[:index] + (source,) + squares[index + 1:]
+
+
+def _has_pawns_on_both_sides(material):
+    """Пешки у обеих сторон: возможно взятие на проходе, которого генератор не моделирует"""
+    pawn_colors = {color for color, piece_type in material if piece_type == PieceType.PAWN}
+    return len(pawn_colors) == 2
+
+
+def _material_name(types):
+    return ''.join(_LETTERS[piece_type] for piece_type in sorted(types, key=_PIECE_ORDER.index))
+
+
+def _strength(name):
+    # Больше фигур - сильнее, при равенстве сравниваются сами фигуры
+    return len(name), [-_PIECE_ORDER.index(_TYPES_BY_LETTER[letter]) for letter in name]
+
+
+def table_signature(white_types, black_types):
+    """Имя таблицы для материала (сильнейшая сторона - первой) и признак смены цветов"""
+    white_name = _material_name(white_types)
+    black_name = _material_name(black_types)
+    if _strength(black_name) > _strength(white_name):
+        return f"{black_name}v{white_name}", True
+    return f"{white_name}v{black_name}", False
+
+
+def parse_signature(signature):
+    """Материал таблицы: кортеж (цвет, тип) в порядке индекса - сначала белые, король первым"""
+    try:
+        white_name, black_name = signature.upper().split('V')
+        sides = [(PieceColor.WHITE, white_name), (PieceColor.BLACK, black_name)]
+        material = []
+        for color, name in sides:
+            types = sorted((_TYPES_BY_LETTER[letter] for letter in name), key=_PIECE_ORDER.index)
+            if types.count(PieceType.KING) != 1:
+                raise ValueError(signature)
+            material.extend((color, piece_type) for piece_type in types)
+    except (KeyError, ValueError):
+        raise TablebaseException(f"Некорректное имя таблицы: {signature}")
+    return tuple(material)
+
+
+class _Layout:
+    """Нумерация позиций таблицы.
+
+    Первый (белый) король симметрией приводится в каноническую область,
+    остальные фигуры нумеруются всеми 64 клетками, очередь хода делит
+    таблицу пополам. Из позиций, переходящих друг в друга симметрией,
+    хранится одна - с наименьшим кортежем клеток.
+    """
+
+    def __init__(self, material):
+        self.material = material
+        self.has_pawns = any(piece_type == PieceType.PAWN for _, piece_type in material)
+        self.region = _PAWN_REGION if self.has_pawns else _PAWNLESS_REGION
+        self.transforms = _PAWN_TRANSFORMS if self.has_pawns else _ALL_TRANSFORMS
+        self.region_index = {square: index for index, square in enumerate(self.region)}
+        self.stride = 64 ** (len(material) - 1)
+        self.half_size = len(self.region) * self.stride
+        self.size = 2 * self.half_size
+
+    def index(self, squares, color):
+        index = self.region_index[squares[0]]
+        for square in squares[1:]:
+            index = index * 64 + square
+        return index + self.half_size if color == PieceColor.BLACK else index
+
+    def decode(self, index):
+        color = PieceColor.WHITE
+        if index >= self.half_size:
+            index -= self.half_size
+            color = PieceColor.BLACK
+        squares = []
+        for _ in range(len(self.material) - 1):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        squares.append(self.region[index])
+        return tuple(reversed(squares)), color
+
+    def canonical(self, squares):
+        best = None
+        for transform in self.transforms:
+            if transform[squares[0]] in self.region_index:
+                image = tuple(transform[square] for square in squares)
+                if best is None or image < best:
+                    best = image
+        return best
+
+    def is_canonical(self, squares):
+        king = squares[0]
+        if king not in self.region_index:
+            return False
+        if self.has_pawns or king not in _DIAGONAL:
+            return True
+        return squares == self.canonical(squares)
+
+    def images(self, squares):
+        return {tuple(transform[square] for square in squares) for transform in self.transforms}
+
+
+class Tablebase:
+    """Каталог таблиц: проба позиций и выбор лучшего хода.
+
+    Таблицы отображаются в память при первом обращении. Позиции с
+    правом рокировки или возможным взятием на проходе не пробуются.
+    Материал с пешками у обеих сторон не поддерживается: генератор не
+    знает взятия на проходе, и результаты таких таблиц были бы неверны.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._tables = {}
+        self._layouts = {}
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def get_directory(self):
+        return self._directory
+
+    def get_signatures(self):
+        """Имена таблиц, которые есть в каталоге"""
+        return sorted(filename[:-len(TABLE_SUFFIX)] for filename in os.listdir(self._directory)
+                      if filename.endswith(TABLE_SUFFIX))
+
+    def get_max_pieces(self):
+        """Наибольшее число фигур (с королями), для которого есть таблица"""
+        counts = [len(signature) - 1 for signature in self.get_signatures()]
+        return max(counts + [3])
+
+    def has_table(self, signature):
+        return signature in _INSUFFICIENT_MATERIAL or os.path.exists(self._table_path(signature))
+
+    def close(self):
+        for table, table_file in self._tables.values():
+            if table is not None:
+                table.close()
+                table_file.close()
+        self._tables = {}
+
+    def probe(self, board):
+        """Результат позиции для стороны, чья очередь: (WIN/DRAW/LOSS, полуходов до мата).
+
+        Возвращает None, если таблицы для такого материала нет или
+        позиция невозможна (под шахом сторона, сделавшая ход).
+        """
+        if board.castling_rights:
+            return None
+        if board.en_passant_target and board._can_capture_en_passant():
+            return None
+
+        material = []
+        squares = []
+        for row in range(8):
+            for col in range(8):
+                piece = board.get_piece(row, col)
+                if piece is not None:
+                    material.append((piece.get_color(), piece.get_type()))
+                    squares.append(row * 8 + col)
+        if len(material) > 4:
+            return None
+
+        code = self._probe_code(material, squares, board.side_to_move)
+        if code is None or code == _INVALID_CODE:
+            return None
+        return self._decode_result(code)
+
+    def get_best_move(self, board):
+        """Лучший ход по таблицам для стороны, чья очередь, или None.
+
+        Выигрывая, выбираем самый быстрый мат, проигрывая - самый долгий.
+        None возвращается, если хотя бы одну позицию после хода не удалось
+        найти в таблицах.
+        """
+        best_move = None
+        best_key = None
+        for move in board.get_legal_moves(board.side_to_move):
+            undo = board.make_move(*move)
+            result = self.probe(board)
+            board.unmake_move(undo)
+            if result is None:
+                return None
+
+            outcome, distance = result
+            if outcome == LOSS:
+                key = (2, -distance)
+            elif outcome == DRAW:
+                key = (1, 0)
+            else:
+                key = (0, distance)
+            if best_key is None or key > best_key:
+                best_key = key
+                best_move = move
+        return best_move
+
+    @staticmethod
+    def _decode_result(code):
+        if code == _DRAW_CODE:
+            return DRAW, 0
+        distance = code - 1
+        return (WIN if distance % 2 else LOSS), distance
+
+    def _table_path(self, signature):
+        return os.path.join(self._directory, signature + TABLE_SUFFIX)
+
+    def _get_layout(self, signature):
+        if signature not in self._layouts:
+            self._layouts[signature] = _Layout(parse_signature(signature))
+        return self._layouts[signature]
+
+    def _get_table(self, signature):
+        if signature not in self._tables:
+            path = self._table_path(signature)
+            if not os.path.exists(path):
+                return None
+            table_file = open(path, 'rb')
+            table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(table) != self._get_layout(signature).size:
+                table.close()
+                table_file.close()
+                raise TablebaseException(f"Поврежденная таблица: {path}")
+            self._tables[signature] = (table, table_file)
+        return self._tables[signature][0]
+
+    def _probe_code(self, material, squares, color):
+        """Байт таблицы для позиции с произвольным порядком фигур или None"""
+        white = sorted(((piece_type, square) for (piece_color, piece_type), square in zip(material, squares)
+                        if piece_color == PieceColor.WHITE), key=lambda item: _PIECE_ORDER.index(item[0]))
+        black = sorted(((piece_type, square) for (piece_color, piece_type), square in zip(material, squares)
+                        if piece_color == PieceColor.BLACK), key=lambda item: _PIECE_ORDER.index(item[0]))
+        signature, flipped = table_signature([piece_type for piece_type, _ in white],
+                                             [piece_type for piece_type, _ in black])
+        if signature in _INSUFFICIENT_MATERIAL:
+            return _DRAW_CODE
+        if _has_pawns_on_both_sides(material):
+            return None
+
+        table = self._get_table(signature)
+        if table is None:
+            return None
+        if flipped:
+            # Сильнейшая сторона в таблице - белые: меняем цвета и отражаем доску
+            ordered = [square ^ 56 for _, square in black] + [square ^ 56 for _, square in white]
+            color = color.opposite()
+        else:
+            ordered = [square for _, square in white] + [square for _, square in black]
+
+        layout = self._get_layout(signature)
+        return table[layout.index(layout.canonical(ordered), color)]
+
+    def generate(self, signature, report=None):
+        """Построить таблицу (и недостающие таблицы для взятий и превращений)"""
+        signature = _normalize(parse_signature(signature))
+        material = parse_signature(signature)
+        if _has_pawns_on_both_sides(material):
+            raise TablebaseException(f"Таблицы с пешками у обеих сторон не поддерживаются: {signature}")
+        if self.has_table(signature):
+            return
+
+        for dependency in _dependencies(material):
+            self.generate(dependency, report)
+
+        start = time.perf_counter()
+        data = _TableGenerator(self, material).run()
+        path = self._table_path(signature)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as table_file:
+            table_file.write(data)
+        os.replace(temp_path, path)
+        if report:
+            report(signature, len(data), time.perf_counter() - start)
+
+
+def _dependencies(material):
+    """Таблицы, в которые ведут взятия и превращения"""
+    dependencies = set()
+    variants = []
+    for index, (color, piece_type) in enumerate(material):
+        if piece_type != PieceType.KING:
+            variants.append(material[:index] + material[index + 1:])
+        if piece_type == PieceType.PAWN:
+            for promotion in _PROMOTION_TYPES:
+                variants.append(material[:index] + ((color, promotion),) + material[index + 1:])
+    for variant in variants:
+        dependencies.add(_normalize(variant))
+    return sorted(dependencies, key=len)
+
+
+def _normalize(material):
+    """Имя таблицы, в которой хранится материал"""
+    return table_signature([piece_type for color, piece_type in material if color == PieceColor.WHITE],
+                           [piece_type for color, piece_type in material if color == PieceColor.BLACK])[0]
+
+
+class _TableGenerator:
+    """Ретроградный анализ одной таблицы.
+
+    Сначала для каждой позиции считаются легальные ходы: маты получают
+    расстояние 0, ходы в другие таблицы (взятия, превращения) сразу
+    дают результат по этим таблицам. Затем от позиций с известным
+    результатом по уровням расстояния идем к предшественникам: позиция,
+    из которой есть ход в проигрыш соперника, выиграна, а позиция, все
+    ходы из которой ведут в выигрыш соперника, проиграна.
+    """
+
+    def __init__(self, tablebase, material):
+        self._tablebase = tablebase
+        self._material = material
+        self._layout = _Layout(material)
+        size = self._layout.size
+        self._values = bytearray(size)
+        # Ходы, которые еще не оказались выигрышными для соперника
+        self._remaining = bytearray(size)
+        # Самый долгий проигрыш среди ходов в другие таблицы
+        self._loss_floor = {}
+        # Позиции, чей результат известен заранее: расстояние -> номера
+        self._pending = {}
+
+    def run(self):
+        self._initialize()
+        self._propagate()
+        return bytes(self._values)
+
+    def _initialize(self):
+        layout = self._layout
+        material = self._material
+        values = self._values
+        rest = range(64)
+
+        for king_index, king in enumerate(layout.region):
+            for others in product(rest, repeat=len(material) - 1):
+                squares = (king,) + others
+                base = layout.index(squares, PieceColor.WHITE)
+                if not self._is_possible(squares):
+                    values[base] = values[base + layout.half_size] = _INVALID_CODE
+                    continue
+                for color, index in ((PieceColor.WHITE, base), (PieceColor.BLACK, base + layout.half_size)):
+                    self._initialize_position(squares, color, index)
+
+    def _is_possible(self, squares):
+        if len(set(squares)) != len(squares):
+            return False
+        for (_, piece_type), square in zip(self._material, squares):
+            if piece_type == PieceType.PAWN and square >> 3 in (0, 7):
+                return False
+        return self._layout.is_canonical(squares)
+
+    def _initialize_position(self, squares, color, index):
+        material = self._material
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+
+        # Сторона, только что сделавшая ход, не может стоять под шахом
+        opponent = color.opposite()
+        if _is_attacked(material, squares, squares[_king_index(material, opponent)], color, occupied):
+            self._values[index] = _INVALID_CODE
+            return
+
+        children = _children(material, squares, color)
+        if not children:
+            if _is_attacked(material, squares, squares[_king_index(material, color)], opponent, occupied):
+                self._pending.setdefault(0, []).append(index)
+            return
+
+        remaining = 0
+        best_win = None
+        loss_floor = 0
+        for child_material, child_squares in children:
+            if child_material is material:
+                remaining += 1
+                continue
+            code = self._tablebase._probe_code(child_material, child_squares, opponent)
+            if not code or code == _INVALID_CODE:
+                remaining += 1
+            elif (code - 1) % 2 == 0:
+                # Соперник проигрывает после хода: этот ход выигрывает
+                remaining += 1
+                if best_win is None or code < best_win:
+                    best_win = code
+            else:
+                loss_floor = max(loss_floor, code)
+
+        self._remaining[index] = remaining
+        if best_win is not None:
+            self._pending.setdefault(best_win, []).append(index)
+        elif remaining == 0:
+            self._pending.setdefault(loss_floor, []).append(index)
+        elif loss_floor:
+            self._loss_floor[index] = loss_floor
+
+    def _propagate(self):
+        values = self._values
+        remaining = self._remaining
+        pending = self._pending
+        current = []
+        distance = 0
+
+        while current or pending:
+            for index in pending.pop(distance, ()):
+                if not values[index]:
+                    values[index] = distance + 1
+                    current.append(index)
+            if distance >= _MAX_DISTANCE:
+                break
+
+            following = []
+            winning = distance % 2 == 1
+            for index in current:
+                for previous in self._predecessors(index):
+                    if values[previous]:
+                        continue
+                    if not winning:
+                        values[previous] = distance + 2
+                        following.append(previous)
+                        continue
+                    remaining[previous] -= 1
+                    if not remaining[previous]:
+                        floor = self._loss_floor.pop(previous, 0)
+                        if floor <= distance + 1:
+                            values[previous] = distance + 2
+                            following.append(previous)
+                        else:
+                            pending.setdefault(floor, []).append(previous)
+            current = following
+            distance += 1
+
+    def _predecessors(self, index):
+        layout = self._layout
+        squares, color = layout.decode(index)
+        opponent = color.opposite()
+        for image in layout.images(squares):
+            for source in _unmoves(self._material, image, opponent):
+                if layout.is_canonical(source):
+                    yield layout.index(source, opponent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Эндшпильные таблицы")
+    parser.add_argument("--dir", default="tablebases", help="каталог таблиц")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="построить таблицы")
+    generate_parser.add_argument("signatures", nargs="*", default=DEFAULT_SIGNATURES,
+                                 help="материал, например KQvK KRvK KPvK KQvKR (до 4 фигур, пешки - только у одной стороны)")
+
+    probe_parser = subparsers.add_parser("probe", help="результат позиции и лучший ход")
+    probe_parser.add_argument("fen", help="позиция в FEN")
+    args = parser.parse_args()
+
+    tablebase = Tablebase(args.dir)
+    if args.command == "generate":
+        for signature in args.signatures:
+            if len(signature) - 1 > 4:
+                raise TablebaseException(f"Поддерживаются таблицы до 4 фигур: {signature}")
+            tablebase.generate(signature, lambda name, size, seconds:
+                               print(f"{name}: {size} позиций, {seconds:.1f} с"))
+    else:
+        board = Board.from_fen(args.fen)
+        result = tablebase.probe(board)
+        if result is None:
+            print("Позиции нет в таблицах")
+            return
+        outcome, distance = result
+        names = {WIN: "выигрыш", DRAW: "ничья", LOSS: "проигрыш"}
+        print(f"Результат: {names[outcome]}" + (f", мат через {distance} полуходов" if outcome != DRAW else ""))
+        move = tablebase.get_best_move(board)
+        if move:
+            print(f"Лучший ход: {move_to_uci(*move)}")
+
+
+if __name__ == "__main__":
+    main()
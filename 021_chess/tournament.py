@@ -0,0 +1,273 @@
+"""
+Пакетные партии ИИ против ИИ на нескольких процессах
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from itertools import combinations
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ai import ChessAI
+from bitboard import BitBoard
+from book import OpeningBook
+from tablebase import Tablebase, WIN, DRAW
+from game import ChessGame
+from player import Player
+from enums import PieceColor, PlayerType, GameStatus
+
+DIFFICULTIES = {
+    'easy': PlayerType.AI_EASY,
+    'medium': PlayerType.AI_MEDIUM,
+    'hard': PlayerType.AI_HARD
+}
+
+ELO_K_FACTOR = 32
+
+_ACTIVE_STATUSES = [GameStatus.IN_PROGRESS, GameStatus.CHECK]
+
+# Книги и таблицы открываются один раз на процесс пула и переиспользуются между партиями
+_open_books = {}
+_open_tablebases = {}
+
+
+class EngineConfig:
+    """Участник турнира: имя, уровень ИИ, лимит времени на ход и дебютная книга"""
+
+    def __init__(self, name, difficulty, time_limit=1.0, book_path=None):
+        self.name = name
+        self.difficulty = difficulty
+        self.time_limit = time_limit
+        self.book_path = book_path
+
+
+def _get_book(path):
+    if path is None:
+        return None
+    if path not in _open_books:
+        _open_books[path] = OpeningBook(path)
+    return _open_books[path]
+
+
+def _get_tablebase(directory):
+    if directory is None:
+        return None
+    if directory not in _open_tablebases:
+        _open_tablebases[directory] = Tablebase(directory)
+    return _open_tablebases[directory]
+
+
+def play_game(task):
+    """Сыграть одну партию (выполняется в процессе пула).
+
+    task - кортеж (номер, белые, черные, случайных полуходов в дебюте,
+    лимит полуходов, зерно, каталог эндшпильных таблиц). Возвращает
+    словарь с итогом партии.
+    """
+    game_number, white, black, random_plies, max_plies, seed, tablebase_dir = task
+    rng = random.Random(seed)
+    random.seed(seed)
+    tablebase = _get_tablebase(tablebase_dir)
+
+    game = ChessGame(Player(white.name, PieceColor.WHITE, white.difficulty),
+                     Player(black.name, PieceColor.BLACK, black.difficulty),
+                     BitBoard())
+    game.set_tablebase(tablebase)
+    engines = {
+        PieceColor.WHITE: ChessAI(white.difficulty, time_limit=white.time_limit,
+                                  book=_get_book(white.book_path), tablebase=tablebase),
+        PieceColor.BLACK: ChessAI(black.difficulty, time_limit=black.time_limit,
+                                  book=_get_book(black.book_path), tablebase=tablebase)
+    }
+    start_time = time.perf_counter()
+
+    # Случайный дебют, чтобы партии между одними и теми же движками различались
+    for _ in range(random_plies):
+        if game.get_status() not in _ACTIVE_STATUSES:
+            break
+        legal_moves = game._get_legal_moves(game.get_current_turn())
+        game.make_move(*rng.choice(legal_moves))
+
+    # Выигрыш по таблицам засчитывается сразу, не доигрывая эндшпиль
+    tablebase_result = None
+    while game.get_status() in _ACTIVE_STATUSES and game.get_move_count() < max_plies:
+        tablebase_result = game.get_tablebase_result()
+        if tablebase_result is not None and tablebase_result[0] != DRAW:
+            break
+        color = game.get_current_turn()
+        move = engines[color].get_best_move(game, color)
+        if move is None:
+            break
+        game.make_move(*move)
+
+    status = game.get_status()
+    if status == GameStatus.CHECKMATE_WHITE:
+        score = 1.0
+    elif status == GameStatus.CHECKMATE_BLACK:
+        score = 0.0
+    elif status in _ACTIVE_STATUSES and tablebase_result is not None and tablebase_result[0] != DRAW:
+        white_wins = (tablebase_result[0] == WIN) == (game.get_current_turn() == PieceColor.WHITE)
+        score = 1.0 if white_wins else 0.0
+    else:
+        score = 0.5
+
+    if status not in _ACTIVE_STATUSES:
+        status_name = status.name
+    elif score != 0.5:
+        status_name = "TABLEBASE_WIN_WHITE" if score == 1.0 else "TABLEBASE_WIN_BLACK"
+    else:
+        status_name = "ADJUDICATED_DRAW"
+
+    return {
+        'game_number': game_number,
+        'white': white.name,
+        'black': black.name,
+        'score': score,
+        'status': status_name,
+        'plies': game.get_move_count(),
+        'moves': [move.to_uci() for move in game.get_move_history()],
+        'seconds': time.perf_counter() - start_time
+    }
+
+
+def elo_delta(rating, opponent_rating, score, k_factor=ELO_K_FACTOR):
+    """Изменение рейтинга Эло по итогу партии (score: 1, 0.5 или 0)"""
+    expected = 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+    return round(k_factor * (score - expected))
+
+
+class Tournament:
+    """Круговой турнир между движками с подсчетом очков и рейтингов"""
+
+    def __init__(self, engines, games_per_pair=2, random_plies=4, max_plies=300, seed=None,
+                 tablebase_dir=None):
+        self._engines = engines
+        self._tablebase_dir = tablebase_dir
+        self._games_per_pair = games_per_pair
+        self._random_plies = random_plies
+        self._max_plies = max_plies
+        self._seed = seed if seed is not None else random.randrange(1 << 30)
+        self._players = {engine.name: Player(engine.name, PieceColor.WHITE, engine.difficulty)
+                         for engine in engines}
+        self._results = []
+
+    def get_players(self):
+        return self._players
+
+    def get_results(self):
+        return self._results
+
+    def _build_tasks(self):
+        tasks = []
+        pairs = combinations(self._engines, 2) if len(self._engines) > 1 else [(self._engines[0],) * 2]
+        for first, second in pairs:
+            for game_index in range(self._games_per_pair):
+                # Цвета чередуются, чтобы оба движка играли белыми поровну
+                white, black = (first, second) if game_index % 2 == 0 else (second, first)
+                game_number = len(tasks)
+                tasks.append((game_number, white, black, self._random_plies,
+                              self._max_plies, self._seed + game_number, self._tablebase_dir))
+        return tasks
+
+    def run(self, workers=None, on_result=None):
+        """Сыграть все партии на пуле процессов (по умолчанию - на всех ядрах)"""
+        tasks = self._build_tasks()
+        workers = workers or os.cpu_count() or 1
+
+        with Pool(processes=min(workers, len(tasks))) as pool:
+            # Итоги учитываются в порядке номеров партий, а не завершения:
+            # рейтинг Эло зависит от порядка, и при том же зерне турнир
+            # должен давать ту же таблицу
+            for result in pool.imap(play_game, tasks):
+                self._record_result(result)
+                if on_result:
+                    on_result(result)
+
+        return self._results
+
+    def _record_result(self, result):
+        self._results.append(result)
+        white = self._players[result['white']]
+        black = self._players[result['black']]
+        score = result['score']
+
+        if white is not black:
+            white_delta = elo_delta(white.get_rating(), black.get_rating(), score)
+            black_delta = elo_delta(black.get_rating(), white.get_rating(), 1 - score)
+            white.update_rating(white_delta)
+            black.update_rating(black_delta)
+
+        if score == 1.0:
+            white.add_win()
+            black.add_loss()
+        elif score == 0.0:
+            white.add_loss()
+            black.add_win()
+        else:
+            white.add_draw()
+            black.add_draw()
+
+    def display_standings(self):
+        """Отобразить таблицу результатов"""
+        print("\n=== Итоги турнира ===")
+        print(f"{'Движок':<20}{'Рейтинг':>8}{'Побед':>7}{'Пораж.':>8}{'Ничьих':>8}{'Очки':>7}")
+        standings = sorted(self._players.values(), key=lambda player: player.get_rating(), reverse=True)
+        for player in standings:
+            stats = player.get_statistics()
+            points = stats['wins'] + stats['draws'] / 2
+            print(f"{player.get_name():<20}{player.get_rating():>8}{stats['wins']:>7}"
+                  f"{stats['losses']:>8}{stats['draws']:>8}{points:>7.1f}")
+        print("---")
+
+
+def _parse_engine(spec, index):
+    """Описание движка: уровень[:секунд_на_ход][:имя], например hard:0.5"""
+    parts = spec.split(':')
+    if parts[0] not in DIFFICULTIES:
+        raise argparse.ArgumentTypeError(f"Неизвестный уровень: {parts[0]}")
+    time_limit = float(parts[1]) if len(parts) > 1 and parts[1] else None
+    name = parts[2] if len(parts) > 2 else f"{parts[0]}-{index + 1}"
+    return EngineConfig(name, DIFFICULTIES[parts[0]], time_limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Турнир шахматных ИИ на всех ядрах")
+    parser.add_argument("engines", nargs="+",
+                        help="движки: уровень[:секунд_на_ход][:имя], например medium hard:0.5")
+    parser.add_argument("--games", type=int, default=2, help="партий на каждую пару движков")
+    parser.add_argument("--time", type=float, default=1.0, help="секунд на ход по умолчанию")
+    parser.add_argument("--random-plies", type=int, default=4, help="случайных полуходов в дебюте")
+    parser.add_argument("--max-plies", type=int, default=300, help="лимит полуходов (дальше - ничья)")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию - все ядра)")
+    parser.add_argument("--seed", type=int, default=None, help="зерно для воспроизводимости")
+    parser.add_argument("--book", default=None, help="дебютная книга для всех движков")
+    parser.add_argument("--tablebases", default=None,
+                        help="каталог эндшпильных таблиц: выигранные по таблицам партии засчитываются сразу")
+    args = parser.parse_args()
+
+    engines = [_parse_engine(spec, index) for index, spec in enumerate(args.engines)]
+    for engine in engines:
+        if engine.time_limit is None:
+            engine.time_limit = args.time
+        engine.book_path = args.book
+
+    tournament = Tournament(engines, args.games, args.random_plies, args.max_plies, args.seed,
+                            args.tablebases)
+
+    def report(result):
+        print(f"Партия {result['game_number'] + 1}: {result['white']} - {result['black']} "
+              f"{result['score']:g}:{1 - result['score']:g} ({result['status']}, "
+              f"{result['plies']} полуходов, {result['seconds']:.1f} с)")
+
+    start = time.perf_counter()
+    tournament.run(args.workers, report)
+    print(f"\nВремя: {time.perf_counter() - start:.1f} с")
+    tournament.display_standings()
+
+
+if __name__ == "__main__":
+    main()
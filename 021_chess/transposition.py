@@ -0,0 +1,174 @@
+"""
+Таблица транспозиций для поиска
+"""
+
+import ctypes
+import multiprocessing
+from move import NO_MOVE
+
+# Тип оценки в записи
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+_SCORE_OFFSET = 1 << 20
+
+
+class TranspositionTable:
+    """Хеш-таблица фиксированного размера с корзинами по две записи.
+
+    Первая запись корзины хранит самый глубокий результат (заменяется,
+    если новый поиск не мельче или запись осталась от прошлых ходов),
+    вторая перезаписывается всегда. Запись упакована в одно целое:
+    код хода (см. move.pack_move), тип оценки, глубина, поколение и оценка.
+    """
+
+    DEFAULT_SIZE = 1 << 18
+
+    def __init__(self, size=DEFAULT_SIZE):
+        # Размер округляется до степени двойки, чтобы индекс брался маской
+        size = max(2, 1 << (size - 1).bit_length())
+        self._size = size
+        self._mask = (size - 1) & ~1
+        self._keys = [0] * size
+        self._data = [0] * size
+        self._generation = 0
+
+    def get_size(self):
+        return self._size
+
+    def new_search(self):
+        """Начать новое поколение: старые записи вытесняются в первую очередь"""
+        self._generation = (self._generation + 1) & 0x3F
+
+    def clear(self):
+        self._keys = [0] * self._size
+        self._data = [0] * self._size
+        self._generation = 0
+
+    def probe(self, key):
+        """Найти запись: (глубина, оценка, тип, код хода) или None"""
+        index = key & self._mask
+        keys = self._keys
+        if keys[index] == key:
+            data = self._data[index]
+        elif keys[index + 1] == key:
+            data = self._data[index + 1]
+        else:
+            return None
+        return ((data >> 18) & 0xFF, (data >> 32) - _SCORE_OFFSET,
+                (data >> 16) & 0x3, data & 0xFFFF)
+
+    def store(self, key, depth, score, flag, move):
+        """Сохранить результат поиска позиции; move - код хода или NO_MOVE"""
+        index = key & self._mask
+        keys = self._keys
+        data = self._data
+
+        if keys[index] != key and keys[index + 1] == key:
+            slot = index + 1
+        else:
+            old = data[index]
+            old_depth = (old >> 18) & 0xFF
+            old_generation = (old >> 26) & 0x3F
+            if keys[index] == key or depth >= old_depth or old_generation != self._generation:
+                slot = index
+            else:
+                slot = index + 1
+
+        if move == NO_MOVE and keys[slot] == key:
+            # Не теряем лучший ход, если новый результат его не знает
+            move = data[slot] & 0xFFFF
+
+        keys[slot] = key
+        data[slot] = (move | (flag << 16) | (max(depth, 0) << 18)
+                      | (self._generation << 26) | ((score + _SCORE_OFFSET) << 32))
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """Таблица транспозиций в разделяемой памяти для поиска в нескольких процессах.
+
+    Владелец создает буфер, остальные процессы получают его через
+    get_buffer и открывают таблицу поверх того же буфера. Записи
+    пишутся без блокировок: вместо ключа хранится ключ XOR данные,
+    поэтому запись, разорванная одновременной записью другого
+    процесса, просто не находится. Поколение хранится в буфере и
+    меняется только владельцем.
+    """
+
+    def __init__(self, size=TranspositionTable.DEFAULT_SIZE, buffer=None):
+        size = max(2, 1 << (size - 1).bit_length())
+        self._owner = buffer is None
+        if buffer is None:
+            buffer = multiprocessing.RawArray(ctypes.c_uint64, 2 * size + 1)
+        elif len(buffer) != 2 * size + 1:
+            raise ValueError(f"Размер буфера не соответствует таблице на {size} записей")
+        self._buffer = buffer
+        self._size = size
+        self._mask = (size - 1) & ~1
+        view = memoryview(buffer).cast('B').cast('Q')
+        self._keys = view[:size]
+        self._data = view[size:2 * size]
+        self._header = view[2 * size:]
+        self._generation = self._header[0]
+
+    def get_buffer(self):
+        return self._buffer
+
+    def is_owner(self):
+        return self._owner
+
+    def new_search(self):
+        """Владелец начинает новое поколение, остальные процессы подхватывают его"""
+        if self._owner:
+            self._header[0] = (self._header[0] + 1) & 0x3F
+        self._generation = self._header[0]
+
+    def clear(self):
+        ctypes.memset(self._buffer, 0, ctypes.sizeof(self._buffer))
+        self._generation = 0
+
+    def probe(self, key):
+        index = key & self._mask
+        keys = self._keys
+        data = self._data
+        # Каждое слово данных читается один раз: проверяется и возвращается одно и то же значение,
+        # даже если другой процесс перезаписывает ячейку между чтениями
+        value = data[index]
+        if keys[index] ^ value != key:
+            value = data[index + 1]
+            if keys[index + 1] ^ value != key:
+                return None
+        if not value:
+            return None
+        return ((value >> 18) & 0xFF, (value >> 32) - _SCORE_OFFSET,
+                (value >> 16) & 0x3, value & 0xFFFF)
+
+    def store(self, key, depth, score, flag, move):
+        index = key & self._mask
+        keys = self._keys
+        data = self._data
+        first = data[index]
+        second = data[index + 1]
+        first_key = keys[index] ^ first
+
+        if first_key != key and keys[index + 1] ^ second == key:
+            slot = index + 1
+        else:
+            old = first
+            old_depth = (old >> 18) & 0xFF
+            old_generation = (old >> 26) & 0x3F
+            if first_key == key or depth >= old_depth or old_generation != self._generation:
+                slot = index
+            else:
+                slot = index + 1
+
+        if move == NO_MOVE:
+            current = first if slot == index else second
+            if keys[slot] ^ current == key:
+                move = current & 0xFFFF
+
+        value = (move | (flag << 16) | (max(depth, 0) << 18)
+                 | (self._generation << 26) | ((score + _SCORE_OFFSET) << 32))
+        data[slot] = value
+        keys[slot] = key ^ value
@@ -2,6 +2,18 @@
 Утилиты для шахматной игры
 """
 
+from enums import PieceType
+
+
+PROMOTION_LETTERS = {
+    PieceType.QUEEN: 'q',
+    PieceType.ROOK: 'r',
+    PieceType.BISHOP: 'b',
+    PieceType.KNIGHT: 'n'
+}
+
+_PROMOTION_BY_LETTER = {letter: piece_type for piece_type, letter in PROMOTION_LETTERS.items()}
+
 
 def position_to_notation(position):
     """Преобразовать позицию в шахматную нотацию"""
@@ -47,4 +59,44 @@ def parse_move_input(move_str):
     from_pos = notation_to_position(from_notation)
     to_pos = notation_to_position(to_notation)
 
-    return from_pos, to_pos
\ No newline at end of file
+    return from_pos, to_pos
+
+def move_to_uci(from_pos, to_pos, promotion_piece=None):
+    """Ход в координатной записи: e2e4, e7e8q"""
+    suffix = PROMOTION_LETTERS[promotion_piece] if promotion_piece else ""
+    return f"{position_to_notation(from_pos)}{position_to_notation(to_pos)}{suffix}"
+
+
+def parse_uci_move(move_str):
+    """Разбор координатной записи: (откуда, куда, превращение) или None"""
+    move_str = move_str.strip().lower()
+    if len(move_str) not in (4, 5):
+        return None
+
+    from_pos = notation_to_position(move_str[:2])
+    to_pos = notation_to_position(move_str[2:4])
+    if from_pos is None or to_pos is None:
+        return None
+
+    promotion_piece = None
+    if len(move_str) == 5:
+        promotion_piece = _PROMOTION_BY_LETTER.get(move_str[4])
+        if promotion_piece is None:
+            return None
+
+    return from_pos, to_pos, promotion_piece
+
+
+def read_fen_file(filepath):
+    """Построчно читать позиции из файла FEN/EPD (пустые строки и # пропускаются)"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            # В EPD после четырех полей позиции идут операции - отбрасываем их
+            fields = line.split(';')[0].split()
+            if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+                yield " ".join(fields[:6])
+            else:
+                yield " ".join(fields[:4])
@@ -0,0 +1,25 @@
+"""
+Ключи Зобриста для хеширования шахматных позиций
+"""
+
+import random
+from enums import PieceColor, PieceType
+
+
+# Фиксированное зерно: ключи одинаковы во всех процессах и запусках,
+# поэтому хеши можно сохранять в файлы и передавать между процессами
+_ZOBRIST_SEED = 20240229
+
+_random = random.Random(_ZOBRIST_SEED)
+
+PIECE_KEYS = {
+    color: {piece_type: [_random.getrandbits(64) for _ in range(64)] for piece_type in PieceType}
+    for color in PieceColor
+}
+
+CASTLING_KEYS = [_random.getrandbits(64) for _ in range(16)]
+CASTLING_KEYS[0] = 0
+
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+SIDE_KEY = _random.getrandbits(64)